@@ -1,17 +1,76 @@
-import subprocess
 import os
-import shutil
+import sys
 import re
+import time
+import json
+import argparse
 import datetime
+import math
+import copy
+import contextlib
+import functools
+import io
+
+# subprocess, asyncio, concurrent.futures, ctypes, tomllib e os demais módulos pesados são
+# importados nas funções que os usam, para que o 'check' (executado por um timer) inicie rápido.
 
 SYSCTL_CONF = "/etc/sysctl.conf"
+# Precisa ordenar depois de 99-sysctl.conf para prevalecer no boot.
+SYSCTL_DROPIN = "/etc/sysctl.d/99-zz-ghenotweaks.conf"
+PROC_SYS = "/proc/sys"
+PROC_ROOT = "/proc"
+SYSFS_ROOT = "/sys"
+STATE_DIR = "/var/lib/ghenotweaks"
+BENCH_DIR = os.path.join(STATE_DIR, "bench")
+CGROUP_ROOT = "/sys/fs/cgroup"
+SYSTEMD_SYSTEM_DIR = "/etc/systemd/system"
+# Onde o systemd procura arquivos de unidade, do mais prioritário para o menos.
+UNIT_FILE_DIRS = (SYSTEMD_SYSTEM_DIR, "/lib/systemd/system", "/usr/lib/systemd/system")
+ZRAM_UNIT_NAME = "ghenotweaks-zram.service"
+ZRAM_UNIT = os.path.join(SYSTEMD_SYSTEM_DIR, ZRAM_UNIT_NAME)
+ZRAM_WRITEBACK_NAME = "ghenotweaks-zram-writeback"
+BLOCK_UDEV_RULES = "/etc/udev/rules.d/60-ghenotweaks-block.rules"
+CPU_TMPFILES = "/etc/tmpfiles.d/ghenotweaks-cpu.conf"
+MM_TMPFILES = "/etc/tmpfiles.d/ghenotweaks-mm.conf"
+NET_UDEV_RULES = "/etc/udev/rules.d/60-ghenotweaks-net.rules"
+NET_MODULES_LOAD = "/etc/modules-load.d/ghenotweaks-net.conf"
+MODULES_ROOT = "/lib/modules"
+DEV_ROOT = "/dev"
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+CHECK_TIMER_NAME = "ghenotweaks-check"
+DAEMON_UNIT_NAME = "ghenotweaks-daemon.service"
+PRELOAD_LIST = os.path.join(STATE_DIR, "preload.list")
+PRELOAD_UNIT_NAME = "ghenotweaks-preload.service"
 GRUB_DEFAULT = "/etc/default/grub"
+GRUB_DEFAULT_DIR = "/etc/default/grub.d"
+GRUB_CFG = "/boot/grub/grub.cfg"
 FSTAB = "/etc/fstab"
 BACKUP_BASE_DIR = "/var/backups/ghenotweaks_ubuntu/"
+EVENTS_LOG = "/var/log/ghenotweaks/events.jsonl"
+METRICS_FILE = os.path.join(STATE_DIR, "metrics.json")
+# Diretório do textfile collector do pacote prometheus-node-exporter do Ubuntu.
+PROM_TEXTFILE_DIR = "/var/lib/prometheus/node-exporter"
+PROM_TEXTFILE = os.path.join(PROM_TEXTFILE_DIR, "ghenotweaks.prom")
 GLOSSARY_LINK = "https://github.com/ghenosec/ghenotweaks-ubuntu/blob/main/optimization_terms.md"
+# Comandos que só fazem sentido no sistema em execução e ficam pendentes ao ajustar uma imagem.
+OFFLINE_PENDING_COMMANDS = ("update-grub", "apt", "apt-get")
+
+# Raiz do sistema de arquivos sendo ajustado. Diferente de "/" no modo --root, em que os
+# caminhos acima continuam lógicos e só são traduzidos ao ler e escrever arquivos.
+_target_root = "/"
+
+
+def offline_mode():
+    return _target_root != "/"
 
 
-def run_command(command, check=True, shell=False, show_output=True):
+def target_path(path):
+    if not offline_mode():
+        return path
+    return os.path.join(_target_root, os.path.relpath(path, "/"))
+
+
+def run_command(command, check=True, shell=False, show_output=True, env=None):
     """
     Função auxiliar para executar comandos de shell.
 
@@ -19,13 +78,19 @@ def run_command(command, check=True, shell=False, show_output=True):
         check (bool): Se True, levanta CalledProcessError para códigos de saída diferentes de zero.
         shell (bool): Se True, o comando é interpretado por um shell.
         show_output (bool): Se False, não imprime stdout/stderr para erros.
+        env (dict): Variáveis de ambiente acrescentadas às do processo (ex: {"LC_ALL": "C"}).
     Returns:
         str: A saída padrão do comando, ou None em caso de erro.
     """
+    import subprocess
+    start = time.monotonic()
+    exit_code = None
     try:
         result = subprocess.run(
-            command, check=check, shell=shell, capture_output=True, text=True
+            command, check=check, shell=shell, capture_output=True, text=True,
+            env=dict(os.environ, **env) if env else None,
         )
+        exit_code = result.returncode
         if show_output:
             if result.stdout:
                 print(result.stdout.strip())
@@ -33,6 +98,7 @@ def run_command(command, check=True, shell=False, show_output=True):
                 print(result.stderr.strip())
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
+        exit_code = e.returncode
         print(f"\nErro ao executar comando: {' '.join(command) if not shell else command}")
         print(f"Código de saída: {e.returncode}")
         if show_output:
@@ -40,30 +106,556 @@ def run_command(command, check=True, shell=False, show_output=True):
             print(f"Stderr: {e.stderr.strip()}")
         return None
     except FileNotFoundError:
+        exit_code = 127
         print(f"\nComando não encontrado: {' '.join(command) if not shell else command}")
         return None
     except Exception as e:
         print(f"\nOcorreu um erro inesperado ao executar o comando: {e}")
         return None
+    finally:
+        record_command(command, exit_code, time.monotonic() - start)
 
 
-def create_backup(filepath):
-    if not os.path.exists(filepath):
-        print(f"Aviso: Arquivo não encontrado para backup: {filepath}")
-        return False
+# Ajustes em andamento (o mais interno por último). Comandos, escritas e valores alterados
+# são somados a todos eles, e cada um vira um evento 'tweak' ao terminar.
+_tweak_steps = []
+# Ajustes concluídos nesta execução; as métricas são gravadas de uma só vez ao sair.
+_finished_steps = []
+_events_enabled = True
 
-    os.makedirs(BACKUP_BASE_DIR, exist_ok=True)
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_name = f"{os.path.basename(filepath)}_{timestamp}.ghenotweaks_bak"
-    backup_path = os.path.join(BACKUP_BASE_DIR, backup_name)
+
+def log_event(kind, /, **fields):
+    """
+    Acrescenta um evento JSON (uma linha) a EVENTS_LOG. Sem permissão de escrita, por exemplo
+    em uso sem root, o registro é desligado em silêncio para o resto da execução.
+    """
+    global _events_enabled
+    event = {"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "event": kind, "pid": os.getpid()}
+    if _tweak_steps:
+        event["tweak"] = _tweak_steps[-1]["tweak"]
+    if offline_mode():
+        event["root"] = _target_root
+    event.update(fields)
+    if not _events_enabled:
+        return event
+    # Uma única escrita com O_APPEND: linhas de execuções simultâneas não se misturam.
+    line = (json.dumps(event, sort_keys=True, default=str) + "\n").encode()
+    try:
+        os.makedirs(os.path.dirname(EVENTS_LOG), exist_ok=True)
+        fd = os.open(EVENTS_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        _events_enabled = False
+    return event
+
+
+def record_command(command, exit_code, duration):
+    for step in _tweak_steps:
+        step["commands"] += 1
+        step["command_seconds"] += duration
+        if exit_code != 0:
+            step["failed_commands"] += 1
+    log_event("command", command=command, exit_code=exit_code, duration=round(duration, 6))
+
+
+def record_write(path, size, before, after):
+    for step in _tweak_steps:
+        step["bytes_written"] += size
+        if path not in step["files"]:
+            step["files"].append(path)
+    log_event("write", path=path, bytes=size, before_sha256=before, after_sha256=after)
+
+
+def record_change(kind, target, before, after):
+    change = {"kind": kind, "target": target, "before": before, "after": after}
+    for step in _tweak_steps:
+        step["changes"].append(change)
+    log_event("change", **change)
+    record_live_original(kind, target, before)
+
+
+def record_live_original(kind, target, before):
+    """
+    Guarda no manifesto da execução atual o valor de sysctl/sysfs anterior à primeira mudança,
+    para que o rollback também desfaça o estado em memória, e não só os arquivos.
+    """
+    run = _backup_run
+    if run is None or before is None:
+        return
+    live = run.setdefault("live", {}).setdefault(kind, {})
+    if target in live:
+        return
+    # Arquivos como queue/scheduler listam as opções com a atual entre colchetes.
+    live[target] = next((token.strip("[]") for token in before.split() if token.startswith("[")), before)
+    try:
+        save_backup_run(run)
+    except OSError as e:
+        print(f"Aviso: não foi possível registrar o valor original de '{target}': {e}")
+
+
+@contextlib.contextmanager
+def tweak_step(name):
+    """
+    Mede um ajuste: duração, comandos executados, bytes escritos e valores alterados.
+    Um ajuste aninhado com o mesmo nome é somado ao que já está em andamento.
+
+        name (str): Nome do ajuste, usado como rótulo nas métricas.
+    Yields:
+        dict: O registro do ajuste; defina step["success"] = False para marcar falha.
+    """
+    for step in _tweak_steps:
+        if step["tweak"] == name:
+            yield step
+            return
+
+    step = {
+        "tweak": name, "success": True, "commands": 0, "failed_commands": 0, "command_seconds": 0.0,
+        "bytes_written": 0, "files": [], "changes": [], "started": time.time(),
+    }
+    _tweak_steps.append(step)
+    start = time.monotonic()
+    try:
+        yield step
+    except BaseException:
+        step["success"] = False
+        raise
+    finally:
+        step["duration"] = time.monotonic() - start
+        _tweak_steps.remove(step)
+        log_event(
+            "tweak", tweak=name, success=step["success"], duration=round(step["duration"], 6),
+            commands=step["commands"], failed_commands=step["failed_commands"],
+            command_seconds=round(step["command_seconds"], 6), bytes_written=step["bytes_written"],
+            files=step["files"], changes=step["changes"],
+        )
+        # As métricas descrevem este host, não as imagens ajustadas com --root.
+        if not offline_mode():
+            queue_tweak_metrics(step)
+
+
+def instrumented(name):
+    """
+    Decorador de tweak_step para as funções de ajuste; um retorno False conta como falha.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tweak_step(name) as step:
+                result = function(*args, **kwargs)
+                if result is False:
+                    step["success"] = False
+                return result
+        return wrapper
+    return decorator
+
+
+def queue_tweak_metrics(step):
+    """
+    Guarda o ajuste para flush_tweak_metrics. Um ajuste que não alterou nada, não executou
+    comandos e não falhou não gera métricas.
+    """
+    if step["success"] and not (step["changes"] or step["files"] or step["commands"]):
+        return
+    if not _finished_steps:
+        import atexit
+        atexit.register(flush_tweak_metrics)
+    _finished_steps.append(step)
+
+
+def flush_tweak_metrics(path=METRICS_FILE):
+    """
+    Grava em uma única escrita as métricas de todos os ajustes desta execução, e em seguida o
+    arquivo do node_exporter.
+    """
+    steps = list(_finished_steps)
+    _finished_steps.clear()
+    if not steps:
+        return
+    try:
+        with open(path, 'r') as f:
+            metrics = json.load(f)
+    except (OSError, ValueError):
+        metrics = {}
+    for step in steps:
+        previous = metrics.get(step["tweak"], {})
+        metrics[step["tweak"]] = {
+            "duration": step["duration"],
+            "timestamp": step["started"],
+            "success": step["success"],
+            "commands": step["commands"],
+            "failed_commands": step["failed_commands"],
+            "command_seconds": step["command_seconds"],
+            "bytes_written": step["bytes_written"],
+            "changes": len(step["changes"]),
+            "runs": previous.get("runs", 0) + 1,
+            "duration_total": previous.get("duration_total", 0.0) + step["duration"],
+        }
+    try:
+        write_if_changed(path, json.dumps(metrics, indent=2, sort_keys=True), backup=False)
+    except OSError:
+        return
+    write_prom_textfile(metrics)
+
+
+def prom_number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# (nome, tipo, ajuda, campo em metrics.json)
+PROM_TWEAK_METRICS = (
+    ("ghenotweaks_tweak_duration_seconds", "gauge", "Duração da última execução do ajuste.", "duration"),
+    ("ghenotweaks_tweak_last_run_timestamp_seconds", "gauge", "Início da última execução do ajuste.", "timestamp"),
+    ("ghenotweaks_tweak_success", "gauge", "1 se a última execução do ajuste terminou sem erros.", "success"),
+    ("ghenotweaks_tweak_commands", "gauge", "Comandos executados na última execução.", "commands"),
+    ("ghenotweaks_tweak_failed_commands", "gauge", "Comandos com código de saída diferente de zero.", "failed_commands"),
+    ("ghenotweaks_tweak_command_duration_seconds", "gauge", "Tempo gasto em comandos externos.", "command_seconds"),
+    ("ghenotweaks_tweak_bytes_written", "gauge", "Bytes de configuração escritos na última execução.", "bytes_written"),
+    ("ghenotweaks_tweak_changes", "gauge", "Valores de sysctl/sysfs alterados na última execução.", "changes"),
+    ("ghenotweaks_tweak_runs_total", "counter", "Execuções do ajuste.", "runs"),
+    ("ghenotweaks_tweak_duration_seconds_total", "counter", "Tempo total gasto no ajuste.", "duration_total"),
+)
+
+
+def render_prom_metrics(metrics, state=None):
+    """
+    Gera o texto no formato do textfile collector do node_exporter: métricas por ajuste e o
+    último estado aplicado (parâmetros sysctl numéricos e a impressão digital do estado).
+    """
+    lines = []
+    for name, kind, help_text, field in PROM_TWEAK_METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for tweak in sorted(metrics):
+            value = metrics[tweak].get(field, 0)
+            lines.append(f'{name}{{tweak="{prom_escape(tweak)}"}} {prom_number(value)}')
+
+    if state:
+        lines.append("# HELP ghenotweaks_sysctl_applied_value Valor do parâmetro sysctl no último estado aplicado.")
+        lines.append("# TYPE ghenotweaks_sysctl_applied_value gauge")
+        for param, value in sorted(state.get("sysctl", {}).items()):
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            lines.append(f'ghenotweaks_sysctl_applied_value{{param="{prom_escape(param)}"}} {prom_number(number)}')
+        lines.append("# HELP ghenotweaks_state_info Impressão digital do último estado aplicado.")
+        lines.append("# TYPE ghenotweaks_state_info gauge")
+        lines.append(f'ghenotweaks_state_info{{fingerprint="{prom_escape(state.get("fingerprint", ""))}"}} 1')
+        if state.get("applied"):
+            applied = datetime.datetime.fromisoformat(state["applied"]).timestamp()
+            lines.append("# HELP ghenotweaks_state_applied_timestamp_seconds Momento em que o estado foi aplicado.")
+            lines.append("# TYPE ghenotweaks_state_applied_timestamp_seconds gauge")
+            lines.append(f"ghenotweaks_state_applied_timestamp_seconds {prom_number(applied)}")
+        lines.append("# HELP ghenotweaks_state_items Itens gerenciados no último estado aplicado.")
+        lines.append("# TYPE ghenotweaks_state_items gauge")
+        for key in ("sysctl", "sysfs", "files", "disabled_units", "enabled_units"):
+            lines.append(f'ghenotweaks_state_items{{kind="{key}"}} {len(state.get(key, ()))}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prom_textfile(metrics, path=PROM_TEXTFILE):
+    # Só escreve se o node_exporter estiver instalado; o rename atômico evita coletas pela metade.
+    if not os.path.isdir(os.path.dirname(path)):
+        return
+    try:
+        write_if_changed(path, render_prom_metrics(metrics, load_state()), backup=False, mode=0o644)
+    except OSError as e:
+        print(f"Aviso: não foi possível atualizar as métricas em '{path}': {e}")
+
+
+BACKUP_OBJECTS_DIR = os.path.join(BACKUP_BASE_DIR, "objects")
+BACKUP_RUNS_DIR = os.path.join(BACKUP_BASE_DIR, "runs")
+# Execução atual: cada execução do GhenoTweaks grava um manifesto com o estado original
+# de todos os arquivos que alterou, para que possa ser desfeita de uma só vez.
+_backup_run = None
+
+
+def atomic_write(path, content, backup=True, mode=None, uid=None, gid=None):
+    """
+    Escreve um arquivo de forma atômica: arquivo temporário no mesmo diretório, fsync e rename.
+    Leitores nunca veem o arquivo pela metade, e uma queda de energia deixa o conteúdo antigo ou o novo.
+
+        path (str): Arquivo de destino.
+        content (str ou bytes): Novo conteúdo.
+        backup (bool): Se True, registra o conteúdo original no backup da execução atual.
+        mode, uid, gid: Permissões do novo arquivo; por padrão, as do arquivo existente.
+    Returns:
+        int: Número de bytes escritos.
+    """
+    import hashlib
+    import tempfile
+    if backup and not create_backup(path):
+        raise OSError(f"não foi possível criar o backup de '{path}'")
+    previous = file_fingerprint(path) if backup else None
+
+    data = content.encode() if isinstance(content, str) else content
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    try:
+        stat = os.stat(path)
+        mode = stat.st_mode & 0o7777 if mode is None else mode
+        uid = stat.st_uid if uid is None else uid
+        gid = stat.st_gid if gid is None else gid
+    except FileNotFoundError:
+        mode = 0o644 if mode is None else mode
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        if uid is not None and gid is not None and (uid, gid) != (os.getuid(), os.getgid()):
+            os.chown(tmp_path, uid, gid)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    # Só as escritas com backup são configuração do sistema; manifestos e estado não contam.
+    if backup:
+        record_write(path, len(data), previous and previous["sha256"], hashlib.sha256(data).hexdigest())
+    return len(data)
+
+
+def write_if_changed(path, content, **kwargs):
+    """
+    atomic_write que não toca no arquivo se ele já tiver exatamente este conteúdo.
+
+    Returns:
+        int: Número de bytes escritos (0 se o arquivo já estava igual).
+    """
+    data = content.encode() if isinstance(content, str) else content
     try:
-        shutil.copy2(filepath, backup_path)
-        print(f"Backup de '{filepath}' criado em '{backup_path}'.")
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return 0
+    except OSError:
+        pass
+    return atomic_write(path, data, **kwargs)
+
+
+def backup_object_path(digest):
+    return os.path.join(BACKUP_OBJECTS_DIR, digest[:2], digest)
+
+
+def store_backup_object(data):
+    """
+    Guarda um conteúdo no repositório endereçado pelo hash; conteúdos iguais são guardados uma só vez.
+    """
+    import hashlib
+    digest = hashlib.sha256(data).hexdigest()
+    path = backup_object_path(digest)
+    if not os.path.exists(path):
+        atomic_write(path, data, backup=False, mode=0o600)
+    return digest
+
+
+def begin_backup_run(kind="run"):
+    global _backup_run
+    timestamp = datetime.datetime.now()
+    run_id = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    suffix = 1
+    while os.path.exists(os.path.join(BACKUP_RUNS_DIR, f"{run_id}.json")):
+        suffix += 1
+        run_id = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{suffix}"
+    _backup_run = {
+        "run_id": run_id,
+        "kind": kind,
+        "created": timestamp.isoformat(timespec="seconds"),
+        "command": " ".join(sys.argv),
+        "files": {},
+    }
+    return _backup_run
+
+
+def save_backup_run(run):
+    atomic_write(
+        os.path.join(BACKUP_RUNS_DIR, f"{run['run_id']}.json"),
+        json.dumps(run, indent=2, sort_keys=True),
+        backup=False,
+    )
+
+
+def create_backup(filepath):
+    """
+    Registra o estado original de 'filepath' na execução atual, uma única vez por execução.
+    Arquivos inexistentes também são registrados, para que o rollback os remova.
+    """
+    run = _backup_run or begin_backup_run()
+    if filepath in run["files"]:
         return True
-    except Exception as e:
+
+    entry = {"sha256": None}
+    try:
+        if os.path.exists(filepath):
+            stat = os.stat(filepath)
+            with open(filepath, 'rb') as f:
+                digest = store_backup_object(f.read())
+            entry = {"sha256": digest, "mode": stat.st_mode & 0o7777, "uid": stat.st_uid, "gid": stat.st_gid}
+        run["files"][filepath] = entry
+        save_backup_run(run)
+    except OSError as e:
+        run["files"].pop(filepath, None)
         print(f"Erro ao criar backup de '{filepath}': {e}")
         return False
 
+    if len(run["files"]) == 1:
+        print(f"Backups desta execução: '{run['run_id']}' (desfaça com: sudo python3 optimizer.py rollback {run['run_id']}).")
+    return True
+
+
+def list_backup_runs():
+    runs = []
+    for path in listdir_paths(BACKUP_RUNS_DIR):
+        if path.endswith(".json"):
+            try:
+                with open(path, 'r') as f:
+                    runs.append(json.load(f))
+            except (OSError, ValueError):
+                print(f"Aviso: manifesto de backup ilegível: '{path}'.")
+    return sorted(runs, key=lambda run: (run["created"], run["run_id"]))
+
+
+def print_backup_runs(runs):
+    if not runs:
+        print("Nenhuma execução com backup encontrada.")
+        return
+    print(f"\n{'Execução':<26} {'Tipo':<9} {'Data':<20} {'Arquivos':>8}  Estado")
+    for run in runs:
+        state = "desfeita" if run.get("rolled_back") else ""
+        print(f"{run['run_id']:<26} {run['kind']:<9} {run['created']:<20} {len(run['files']):>8}  {state}")
+
+
+# Comandos que recarregam cada arquivo restaurado, executados uma vez ao final do rollback.
+ROLLBACK_RELOADS = (
+    ((SYSCTL_CONF, SYSCTL_DROPIN), ["sysctl", "--system"]),
+    ((GRUB_DEFAULT,), ["update-grub"]),
+    (("/etc/udev/rules.d/",), ["udevadm", "control", "--reload"]),
+    (("/etc/systemd/system/",), ["systemctl", "daemon-reload"]),
+    (("/etc/tmpfiles.d/",), ["systemd-tmpfiles", "--create"]),
+)
+
+
+@instrumented("rollback")
+def rollback_run(run_id=None):
+    import hashlib
+    runs = list_backup_runs()
+    if run_id is None:
+        candidates = [r for r in runs if r["kind"] == "run" and not r.get("rolled_back")]
+        if not candidates:
+            print("Nenhuma execução para desfazer.")
+            return False
+        run = candidates[-1]
+    else:
+        run = next((r for r in runs if r["run_id"] == run_id), None)
+        if run is None:
+            print(f"Execução '{run_id}' não encontrada. Use 'rollback --list'.")
+            return False
+
+    print(f"Desfazendo a execução '{run['run_id']}' ({run['created']}, {len(run['files'])} arquivo(s))...")
+    begin_backup_run(kind="rollback")
+    success = True
+    restored = []
+    for path, entry in run["files"].items():
+        try:
+            if entry["sha256"] is None:
+                if os.path.exists(path):
+                    create_backup(path)
+                    os.remove(path)
+                    print(f"Removido '{path}' (não existia antes).")
+                    restored.append(path)
+                continue
+            with open(backup_object_path(entry["sha256"]), 'rb') as f:
+                data = f.read()
+            if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                raise OSError("o backup está corrompido")
+            if read_bytes_file(path) == data:
+                continue
+            atomic_write(path, data, mode=entry["mode"], uid=entry["uid"], gid=entry["gid"])
+            print(f"Restaurado '{path}'.")
+            restored.append(path)
+        except OSError as e:
+            print(f"Erro ao restaurar '{path}': {e}")
+            success = False
+
+    for prefixes, command in ROLLBACK_RELOADS:
+        if any(path.startswith(prefixes) for path in restored):
+            run_command(command)
+
+    # Depois dos recarregamentos: remover um drop-in não devolve o valor antigo ao /proc/sys.
+    live = run.get("live", {})
+    if live.get("sysctl"):
+        changed = write_sysctl_values(live["sysctl"])
+        if changed:
+            print(f"{len(changed)} parâmetro(s) sysctl restaurado(s) em memória.")
+    if live.get("sysfs"):
+        changed = write_sysfs_values(live["sysfs"])
+        if changed:
+            print(f"{len(changed)} valor(es) do sysfs restaurado(s).")
+
+    # Unidades cujo arquivo foi criado pela execução deixam de existir com o rollback.
+    removed_units = [
+        os.path.basename(path) for path, entry in run["files"].items()
+        if entry["sha256"] is None and os.path.dirname(path) == SYSTEMD_SYSTEM_DIR
+    ]
+    forget_applied_state(run["files"], live.get("sysctl", {}), live.get("sysfs", {}), removed_units)
+
+    if success:
+        run["rolled_back"] = True
+        save_backup_run(run)
+        print("Rollback concluído. Algumas mudanças podem exigir reinicialização.")
+    return success
+
+
+def read_bytes_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@instrumented("compact")
+def compact_backups(keep=10):
+    """
+    Mantém apenas as 'keep' execuções mais recentes e apaga os conteúdos que nenhuma delas usa.
+    """
+    runs = list_backup_runs()
+    removed_runs = runs[:-keep] if keep else runs
+    for run in removed_runs:
+        os.remove(os.path.join(BACKUP_RUNS_DIR, f"{run['run_id']}.json"))
+
+    referenced = {
+        entry["sha256"] for run in runs[len(removed_runs):] for entry in run["files"].values() if entry["sha256"]
+    }
+    removed_objects = freed = 0
+    for directory in listdir_paths(BACKUP_OBJECTS_DIR):
+        for path in listdir_paths(directory):
+            if os.path.basename(path) not in referenced:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed_objects += 1
+    print(f"{len(removed_runs)} execução(ões) e {removed_objects} conteúdo(s) removidos; "
+          f"{format_bytes(freed)} liberados.")
+    return True
+
 
 def check_root():
     if os.geteuid() != 0:
@@ -72,6 +664,9 @@ def check_root():
         exit(1)
 
 
+MENU_LAST_OPTION = 12
+
+
 def display_menu():
     print("\n" * 3) 
 
@@ -83,9 +678,13 @@ def display_menu():
     print("3. Desabilitar Serviços Systemd Desnecessários")
     print("4. Otimizar Configurações do GRUB (Acelerar o boot)")
     print("5. Habilitar 'noatime' em FSTAB (Reduzir escritas em disco para SSDs)")
-    print("6. Limpeza de Pacotes e Caches do APT")
+    print("6. Limpeza de Pacotes e Caches (APT, kernels antigos, journald, snaps)")
     print("7. Configurar ZRAM (Memória RAM Comprimida como SWAP)")
     print("8. Saiba mais sobre os termos de otimização (link externo)")
+    print("9. Otimizar I/O dos Discos (Scheduler, read-ahead e TRIM por tipo de dispositivo)")
+    print("10. Otimizar CPU (Governor, preferência de energia e estados de repouso)")
+    print("11. Hugepages, THP e KSM (Memória para bancos de dados, JVMs e VMs)")
+    print("12. Otimizar Rede (Buffers pelo BDP, BBR, filas e RPS/XPS)")
     print("0. Sair")
     
     print("\n") 
@@ -96,20 +695,174 @@ def display_menu():
 def get_user_choice():
     while True:
         try:
-            choice = input("Escolha uma opção (0-8): ")
+            choice = input(f"Escolha uma opção (0-{MENU_LAST_OPTION}): ")
             if choice.isdigit():
                 choice = int(choice)
-                if 0 <= choice <= 8:
+                if 0 <= choice <= MENU_LAST_OPTION:
                     return choice
-            print("Opção inválida. Por favor, digite um número entre 0 e 8.")
+            print(f"Opção inválida. Por favor, digite um número entre 0 e {MENU_LAST_OPTION}.")
         except ValueError:
             print("Entrada inválida. Por favor, digite um número.")
 
 
+def update_sysctl_lines(lines, values, append=True):
+    """
+    Aplica os pares parâmetro/valor sobre as linhas de um arquivo sysctl.
+
+        lines (list): Linhas atuais do arquivo.
+        values (dict): Parâmetros do sysctl e os valores desejados.
+        append (bool): Se False, parâmetros ausentes não são adicionados ao final.
+    Returns:
+        tuple: (novas linhas, lista dos parâmetros que precisaram ser adicionados).
+    """
+    new_lines = []
+    found = set()
+    for line in lines:
+        key = line.split("=", 1)[0].strip() if "=" in line else None
+        if key in values and not line.strip().startswith("#"):
+            new_lines.append(f"{key}={values[key]}\n")
+            found.add(key)
+        else:
+            new_lines.append(line)
+
+    added = [param for param in values if param not in found]
+    if added and append:
+        if new_lines and not new_lines[-1].endswith("\n"):
+            new_lines[-1] += "\n"
+        new_lines.append("\n# Added by GhenoTweaks\n")
+        for param in added:
+            new_lines.append(f"{param}={values[param]}\n")
+    return new_lines, added
+
+
+def sysctl_path(param, root=PROC_SYS):
+    if "/" not in param:
+        param = param.replace(".", "/")
+    return os.path.join(root, param)
+
+
+def read_sysctl_values(params, root=PROC_SYS):
+    """
+    Lê vários parâmetros diretamente de /proc/sys, sem executar 'sysctl'.
+
+        params (list): Parâmetros no formato do sysctl (ex: vm.swappiness).
+        root (str): Raiz da árvore /proc/sys (útil para testes).
+    Returns:
+        dict: Valor atual de cada parâmetro que pôde ser lido.
+    """
+    values = {}
+    for param in params:
+        try:
+            with open(sysctl_path(param, root), 'r') as f:
+                values[param] = normalize_sysctl_value(f.read())
+        except OSError:
+            continue
+    return values
+
+
+def write_sysctl_values(values, root=PROC_SYS):
+    """
+    Escreve em /proc/sys apenas os parâmetros cujo valor atual é diferente do desejado.
+
+    Returns:
+        list: Parâmetros que foram realmente alterados.
+    """
+    current = read_sysctl_values(list(values), root)
+    changed = []
+    for param, value in values.items():
+        value = normalize_sysctl_value(value)
+        if current.get(param) == value:
+            continue
+        try:
+            with open(sysctl_path(param, root), 'w') as f:
+                f.write(value)
+            changed.append(param)
+            record_change("sysctl", param, current.get(param), value)
+        except OSError as e:
+            print(f"Erro ao escrever '{param}' em {root}: {e}")
+    return changed
+
+
+def normalize_sysctl_value(value):
+    return " ".join(str(value).split())
+
+
+def parse_sysctl_conf(content):
+    values = {}
+    for line in (content or "").splitlines():
+        line = line.strip()
+        if line and not line.startswith(("#", ";")) and "=" in line:
+            key, _, value = line.partition("=")
+            values[key.strip()] = normalize_sysctl_value(value)
+    return values
+
+
+def render_sysctl_dropin(content, values):
+    managed = parse_sysctl_conf(content)
+    for param, value in values.items():
+        managed[param] = normalize_sysctl_value(value)
+
+    lines = ["# Gerado pelo GhenoTweaks. Alterações manuais podem ser sobrescritas.\n"]
+    lines.extend(f"{param} = {value}\n" for param, value in managed.items())
+    return "".join(lines)
+
+
+def conflicting_sysctl_conf_values(content, values):
+    """
+    O 'sysctl --system' lê /etc/sysctl.conf por último, então valores antigos
+    para os mesmos parâmetros ali anulariam o arquivo do GhenoTweaks no boot.
+    """
+    present = parse_sysctl_conf(content)
+    return {
+        param: normalize_sysctl_value(value)
+        for param, value in values.items()
+        if param in present and present[param] != normalize_sysctl_value(value)
+    }
+
+
+def read_text_file(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def persist_sysctl_values(values, dropin=SYSCTL_DROPIN):
+    """
+    Grava os parâmetros do GhenoTweaks no arquivo próprio em /etc/sysctl.d,
+    escrevendo somente se o conteúdo mudar.
+
+    Returns:
+        list: Arquivos que foram alterados.
+    """
+    written = []
+    targets = []
+
+    current = read_text_file(dropin)
+    new_content = render_sysctl_dropin(current, values)
+    if new_content != current:
+        targets.append((dropin, new_content))
+
+    conf = read_text_file(SYSCTL_CONF)
+    conflicts = conflicting_sysctl_conf_values(conf, values)
+    if conflicts:
+        new_lines, _ = update_sysctl_lines(conf.splitlines(True), conflicts, append=False)
+        targets.append((SYSCTL_CONF, "".join(new_lines)))
+
+    for path, content in targets:
+        try:
+            atomic_write(path, content)
+            written.append(path)
+        except IOError as e:
+            print(f"Erro ao modificar '{path}': {e}")
+    return written
+
+
 def apply_sysctl_setting(param, value, description):
     print(f"\n--- {description} ---")
 
-    current_value = run_command(["sysctl", "-n", param], show_output=False)
+    current_value = read_sysctl_values([param]).get(param)
     if current_value is None:
         print(f"Não foi possível ler o valor atual de '{param}'.")
         return
@@ -119,62 +872,690 @@ def apply_sysctl_setting(param, value, description):
 
     confirm = input(f"Deseja alterar '{param}' para '{value}'? (s/n): ").lower()
     if confirm == 's':
-        if not create_backup(SYSCTL_CONF):
-            print("Não foi possível continuar sem backup do sysctl.conf.")
+        changed = write_sysctl_values({param: value})
+        written = persist_sysctl_values({param: value})
+        if not changed and not written:
+            print(f"'{param}' já está configurado como '{value}'. Nada a fazer.")
             return
+        for path in written:
+            print(f"'{param}' gravado como '{value}' em '{path}'.")
+        print(f"Otimização de '{param}' concluída com sucesso.")
+    else:
+        print("Alteração cancelada.")
 
-        try:
-            with open(SYSCTL_CONF, 'r') as f:
-                lines = f.readlines()
-
-            found = False
-            new_lines = []
-            for line in lines:
-                if line.strip().startswith(f"{param}="):
-                    new_lines.append(f"{param}={value}\n")
-                    found = True
-                    print(f"'{param}' atualizado para '{value}' no arquivo.")
-                else:
-                    new_lines.append(line)
 
-            if not found:
-                new_lines.append(f"\n# Added by GhenoTweaks\n{param}={value}\n")
-                print(f"'{param}' adicionado como '{value}' ao arquivo.")
+MEMINFO_FIELDS = (
+    "MemTotal", "MemAvailable", "Cached", "SwapTotal", "SwapFree", "SReclaimable", "SUnreclaim",
+)
+VMSTAT_FIELDS = (
+    "pswpin", "pswpout", "pgmajfault", "slabs_scanned", "pginodesteal", "kswapd_inodesteal",
+    "pgscan_kswapd", "pgscan_direct",
+)
 
-            with open(SYSCTL_CONF, 'w') as f:
-                f.writelines(new_lines)
 
-            run_command(["sysctl", "--system"])
-            print(f"Otimização de '{param}' concluída com sucesso.")
-        except IOError as e:
-            print(f"Erro ao modificar '{SYSCTL_CONF}': {e}")
+def read_key_value_file(path, fields=None):
+    values = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.replace(":", " ").split()
+                if len(parts) >= 2 and (fields is None or parts[0] in fields):
+                    try:
+                        values[parts[0]] = int(parts[1])
+                    except ValueError:
+                        continue
+    except OSError:
+        pass
+    return values
+
+
+def read_pressure(name, proc_root=PROC_ROOT):
+    """
+    Lê /proc/pressure/<name> (PSI). Retorna None se o kernel não suporta PSI.
+    """
+    pressure = {}
+    try:
+        with open(os.path.join(proc_root, "pressure", name), 'r') as f:
+            for line in f:
+                kind, *fields = line.split()
+                pressure[kind] = {
+                    key: float(value) for key, value in (field.split("=") for field in fields)
+                }
+    except OSError:
+        return None
+    return pressure
+
+
+def read_swap_devices(proc_root=PROC_ROOT):
+    devices = []
+    try:
+        with open(os.path.join(proc_root, "swaps"), 'r') as f:
+            for line in f.readlines()[1:]:
+                parts = line.split()
+                if len(parts) >= 5:
+                    devices.append({
+                        "name": parts[0], "type": parts[1], "size_kb": int(parts[2]),
+                        "used_kb": int(parts[3]), "priority": int(parts[4]),
+                    })
+    except OSError:
+        pass
+    return devices
+
+
+def collect_memory_sample(proc_root=PROC_ROOT):
+    return {
+        "time": time.monotonic(),
+        "meminfo": read_key_value_file(os.path.join(proc_root, "meminfo"), MEMINFO_FIELDS),
+        "vmstat": read_key_value_file(os.path.join(proc_root, "vmstat"), VMSTAT_FIELDS),
+        "psi": read_pressure("memory", proc_root),
+        "swaps": [d["name"] for d in read_swap_devices(proc_root)],
+    }
+
+
+def sample_memory_workload(window=60, interval=1.0, proc_root=PROC_ROOT):
+    samples = [collect_memory_sample(proc_root)]
+    deadline = samples[0]["time"] + window
+    while time.monotonic() < deadline:
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        samples.append(collect_memory_sample(proc_root))
+    return samples
+
+
+def save_samples(samples, path):
+    with open(path, 'w') as f:
+        json.dump({"version": 1, "samples": samples}, f, indent=2)
+
+
+def load_samples(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data["samples"] if isinstance(data, dict) else data
+
+
+def summarize_memory_samples(samples):
+    """
+    Converte uma série de amostras em taxas por segundo e médias do período.
+    """
+    first, last = samples[0], samples[-1]
+    elapsed = max(last["time"] - first["time"], 1e-6)
+
+    def rate(field):
+        return max(last["vmstat"].get(field, 0) - first["vmstat"].get(field, 0), 0) / elapsed
+
+    def stall_percent(kind):
+        if not first.get("psi") or not last.get("psi"):
+            return None
+        delta_us = last["psi"][kind]["total"] - first["psi"][kind]["total"]
+        return max(delta_us, 0) / (elapsed * 1e6) * 100
+
+    mem_total = last["meminfo"].get("MemTotal", 0) or 1
+    swap_total = last["meminfo"].get("SwapTotal", 0)
+    return {
+        "elapsed": elapsed,
+        "swapin_rate": rate("pswpin"),
+        "swapout_rate": rate("pswpout"),
+        "majfault_rate": rate("pgmajfault"),
+        "slab_scan_rate": rate("slabs_scanned"),
+        "inode_steal_rate": rate("pginodesteal") + rate("kswapd_inodesteal"),
+        "reclaim_scan_rate": rate("pgscan_kswapd") + rate("pgscan_direct"),
+        "psi_some": stall_percent("some"),
+        "psi_full": stall_percent("full"),
+        "available_ratio": min(s["meminfo"].get("MemAvailable", 0) for s in samples) / mem_total,
+        "slab_ratio": last["meminfo"].get("SReclaimable", 0) / mem_total,
+        "swap_total_kb": swap_total,
+        "swap_used_ratio": (swap_total - last["meminfo"].get("SwapFree", 0)) / swap_total if swap_total else 0.0,
+        "zram_only": bool(last.get("swaps")) and all("zram" in name for name in last["swaps"]),
+    }
+
+
+def recommend_vm_tuning(samples):
+    """
+    Recomenda vm.swappiness e vm.vfs_cache_pressure a partir de amostras gravadas.
+    Função pura: depende apenas das amostras, para poder reproduzir capturas de produção.
+
+    Returns:
+        dict: Para cada parâmetro, {"value": str, "reason": str}.
+    """
+    if len(samples) < 2:
+        raise ValueError("São necessárias pelo menos duas amostras.")
+    m = summarize_memory_samples(samples)
+    pressure = m["psi_some"] or 0.0
+    recommendations = {}
+
+    if m["swap_total_kb"] == 0:
+        swappiness, reason = 10, "sem swap configurada; o valor tem pouco efeito, mantido o padrão do GhenoTweaks"
+    elif m["zram_only"]:
+        swappiness, reason = 150, "a única swap é ZRAM, que é barata; o kernel pode trocar páginas anônimas mais cedo"
+    elif m["swapin_rate"] > 100 and pressure > 5:
+        swappiness, reason = 1, (
+            f"thrashing de swap ({m['swapin_rate']:.0f} páginas/s lidas da swap, {pressure:.1f}% de stall); "
+            "priorizar a descarga do cache de arquivos"
+        )
+    elif m["majfault_rate"] > 200 and m["swapin_rate"] < 10:
+        swappiness, reason = 60, (
+            f"muitas falhas de página de arquivos ({m['majfault_rate']:.0f}/s) com pouca swap; "
+            "preservar o cache de arquivos trocando memória anônima ociosa"
+        )
     else:
-        print("Alteração cancelada.")
+        swappiness, reason = 10, "pressão de memória baixa; manter os processos na RAM o máximo possível"
+    recommendations["vm.swappiness"] = {"value": str(swappiness), "reason": reason}
+
+    if m["slab_ratio"] > 0.15 and (pressure > 1 or m["available_ratio"] < 0.10):
+        cache_pressure, reason = 150, (
+            f"caches de inodes/dentries ocupam {m['slab_ratio'] * 100:.0f}% da RAM sob pressão; "
+            "liberar esses caches mais cedo"
+        )
+    elif m["inode_steal_rate"] > 50 and m["available_ratio"] > 0.20:
+        cache_pressure, reason = 50, (
+            f"o kernel está descartando inodes ({m['inode_steal_rate']:.0f}/s) mesmo com memória livre; "
+            "manter mais metadados em cache"
+        )
+    elif m["available_ratio"] > 0.30 and pressure < 1:
+        cache_pressure, reason = 50, (
+            f"{m['available_ratio'] * 100:.0f}% da RAM disponível; há espaço para manter mais metadados em cache"
+        )
+    else:
+        cache_pressure, reason = 100, "memória disponível limitada; manter o padrão do kernel"
+    recommendations["vm.vfs_cache_pressure"] = {"value": str(cache_pressure), "reason": reason}
+
+    return recommendations
+
+
+def print_vm_recommendations(recommendations):
+    current = read_sysctl_values(list(recommendations))
+    for param, rec in recommendations.items():
+        print(f"\n{param}: atual {current.get(param, '?')} -> recomendado {rec['value']}")
+        print(f"  Motivo: {rec['reason']}")
 
 
+def measured_recommendation(param, default):
+    confirm = input(
+        "Deseja medir a carga de memória por 30 segundos para obter um valor recomendado? (s/n): "
+    ).lower()
+    if confirm != 's':
+        return default
+    print("Coletando amostras de /proc/meminfo, /proc/vmstat e /proc/pressure/memory...")
+    rec = recommend_vm_tuning(sample_memory_workload(window=30))[param]
+    print(f"Recomendado: {rec['value']} ({rec['reason']}).")
+    return rec["value"]
+
+
+def autotune(window=60, interval=1.0, record=None, replay=None, apply=False):
+    if replay:
+        try:
+            samples = load_samples(replay)
+        except (IOError, ValueError, KeyError) as e:
+            print(f"Erro ao ler a captura '{replay}': {e}")
+            return False
+    else:
+        print(f"Coletando amostras de memória por {window} segundos (intervalo de {interval}s)...")
+        samples = sample_memory_workload(window, interval)
+    if record:
+        save_samples(samples, record)
+        print(f"Amostras salvas em '{record}'.")
+
+    try:
+        recommendations = recommend_vm_tuning(samples)
+    except ValueError as e:
+        print(f"Não foi possível gerar uma recomendação: {e}")
+        return False
+    print_vm_recommendations(recommendations)
+
+    if apply:
+        values = {param: rec["value"] for param, rec in recommendations.items()}
+        with tweak_step("autotune"):
+            changed = write_sysctl_values(values)
+            persist_sysctl_values(values)
+        print(f"\nParâmetros alterados: {', '.join(changed) if changed else 'nenhum'}.")
+    return True
+
+
+@instrumented("swappiness")
 def optimize_swappiness():
     print("Controla a frequência com que o kernel usa o espaço de troca (SWAP).")
     print("Valores menores fazem o sistema usar a RAM por mais tempo antes de recorrer à SWAP.")
     print("Recomendado '10' para a maioria dos desktops com mais de 4GB de RAM.")
     apply_sysctl_setting(
-        "vm.swappiness", "10", "Otimizar Swappiness do Kernel"
+        "vm.swappiness", measured_recommendation("vm.swappiness", "10"), "Otimizar Swappiness do Kernel"
     )
 
 
+@instrumented("vfs_cache_pressure")
 def optimize_vfs_cache_pressure():
     print("Controla a agressividade com que o kernel libera memória de caches de diretórios e inodes.")
     print("Um valor menor (ex: 50) faz o kernel manter mais cache, o que pode acelerar operações de arquivo.")
     apply_sysctl_setting(
-        "vm.vfs_cache_pressure", "50", "Otimizar VFS Cache Pressure do Kernel"
+        "vm.vfs_cache_pressure",
+        measured_recommendation("vm.vfs_cache_pressure", "50"),
+        "Otimizar VFS Cache Pressure do Kernel",
     )
 
 
-def disable_systemd_services():
-    print("\n--- Desabilitar Serviços Systemd Desnecessários ---")
-    print("Esta opção permite desabilitar serviços que podem consumir recursos (CPU/RAM).")
-    print("ATENÇÃO: Desabilitar serviços essenciais pode causar instabilidade ou mau funcionamento.")
-    print("Sempre pesquise o serviço antes de desabilitá-lo.")
-    print("\nAlguns serviços comuns que você pode considerar desabilitar (se não os usar):")
+UNIT_SUFFIXES = ("service", "socket", "mount", "device", "target", "timer", "path", "swap", "slice", "scope")
+UNIT_PATTERN = r'[\w@:.\\-]+\.(?:' + "|".join(UNIT_SUFFIXES) + r')'
+# Unidades que nunca devem ser sugeridas para desativação, mesmo no caminho crítico do boot.
+PROTECTED_UNITS = (
+    "dbus.", "systemd-journald", "systemd-udev", "systemd-logind", "systemd-tmpfiles", "systemd-sysctl",
+    "systemd-modules-load", "systemd-remount-fs", "systemd-fsck", "systemd-random-seed",
+    "systemd-user-sessions", "systemd-resolved", "systemd-journal-flush", "user@", "getty@",
+    "gdm.", "gdm3.", "lightdm.", "sddm.", "display-manager.", "NetworkManager.service", "polkit.",
+    "udisks2.", "apparmor.", "keyboard-setup.", "console-setup.", "plymouth-quit-wait.",
+)
+
+
+def parse_systemd_blame(text):
+    """
+    Converte a saída de 'systemd-analyze blame' em {unidade: segundos}.
+    """
+    blame = {}
+    for line in text.splitlines():
+        match = re.match(r'^\s*(.+?)\s+(' + UNIT_PATTERN + r')\s*$', line)
+        if match:
+            seconds = parse_systemd_duration(match.group(1))
+            if seconds is not None:
+                blame[match.group(2)] = seconds
+    return blame
+
+
+def parse_critical_chain(text):
+    """
+    Converte a saída de 'systemd-analyze critical-chain' em uma lista de nós
+    {unit, activated, cost, depth, parent}, mantendo as arestas da árvore de dependências.
+    """
+    nodes = []
+    stack = []
+    for line in text.splitlines():
+        match = re.match(
+            r'^(?P<indent>[\s│├└─|`-]*?)(?P<unit>' + UNIT_PATTERN + r')(?:\s+@(?P<at>[^+]+?))?(?:\s+\+(?P<cost>.+?))?\s*$',
+            line,
+        )
+        if not match:
+            continue
+        depth = len(match.group("indent")) // 2
+        while stack and stack[-1]["depth"] >= depth:
+            stack.pop()
+        node = {
+            "unit": match.group("unit"),
+            "activated": parse_systemd_duration(match.group("at")) if match.group("at") else None,
+            "cost": parse_systemd_duration(match.group("cost")) if match.group("cost") else None,
+            "depth": depth,
+            "parent": stack[-1]["unit"] if stack else None,
+        }
+        nodes.append(node)
+        stack.append(node)
+    return nodes
+
+
+def parse_unit_timestamps(text):
+    """
+    Lê a saída de 'systemctl show --property=Id,After,InactiveExitTimestampMonotonic,
+    ActiveEnterTimestampMonotonic' para várias unidades, com tempos em segundos desde o boot.
+    """
+    units = {}
+    for unit in parse_systemctl_show(text):
+        if "Id" not in unit:
+            continue
+        start = int(unit.get("InactiveExitTimestampMonotonic") or 0) / 1e6
+        ready = int(unit.get("ActiveEnterTimestampMonotonic") or 0) / 1e6
+        units[unit["Id"]] = {"start": start or None, "ready": ready or None, "after": unit.get("After", "").split()}
+    return units
+
+
+def critical_chain_from_timestamps(units, target):
+    """
+    Reconstrói o caminho crítico até 'target' a partir do grafo de dependências 'After=',
+    seguindo sempre a dependência que ficou pronta por último (como o systemd-analyze).
+    """
+    nodes = []
+    current, depth = target, 0
+    while current in units and all(n["unit"] != current for n in nodes):
+        unit = units[current]
+        cost = None
+        if unit["start"] and unit["ready"] and unit["ready"] > unit["start"]:
+            cost = unit["ready"] - unit["start"]
+        nodes.append({
+            "unit": current, "activated": unit["start"] or unit["ready"], "cost": cost, "depth": depth,
+            "parent": nodes[-1]["unit"] if nodes else None,
+        })
+        limit = unit["start"] or unit["ready"]
+        candidates = [
+            dep for dep in unit["after"]
+            if dep in units and units[dep]["ready"] and limit and units[dep]["ready"] <= limit
+        ]
+        if not candidates:
+            break
+        current = max(candidates, key=lambda dep: units[dep]["ready"])
+        depth += 1
+    return nodes
+
+
+def is_protected_unit(unit):
+    return unit.startswith(PROTECTED_UNITS) or not unit.endswith((".service", ".socket", ".timer"))
+
+
+def rank_boot_savings(chain, blame=None):
+    """
+    Ordena as unidades pelo tempo de boot que desativá-las economizaria.
+    Só unidades no caminho crítico encurtam o boot; o custo delas é um limite superior da economia.
+    """
+    blame = blame or {}
+    ranking = []
+    on_path = set()
+    for node in chain:
+        if node["depth"] == 0:
+            continue
+        on_path.add(node["unit"])
+        cost = node["cost"] if node["cost"] is not None else blame.get(node["unit"], 0.0)
+        if cost and not is_protected_unit(node["unit"]):
+            ranking.append({"unit": node["unit"], "critical": True, "cost": cost, "savings": cost})
+    for unit, cost in blame.items():
+        if unit not in on_path and not is_protected_unit(unit):
+            ranking.append({"unit": unit, "critical": False, "cost": cost, "savings": 0.0})
+    ranking.sort(key=lambda r: (r["savings"], r["cost"]), reverse=True)
+    return ranking
+
+
+def parse_startup_times(text):
+    """
+    Extrai as fases de 'Startup finished in 3.1s (firmware) + 2s (loader) + ...' em segundos.
+    """
+    phases = {}
+    first_line = text.splitlines()[0] if text else ""
+    for value, phase in re.findall(r'((?:[\d.]+\s*(?:h|min|ms|us|s)\s*)+)\((\w+)\)', first_line):
+        phases[phase] = parse_systemd_duration(value)
+    return phases
+
+
+def boot_recommendations(phases, grub_content=None):
+    recommendations = []
+    loader = phases.get("loader")
+    if loader and loader > 2:
+        timeout = re.search(r'^GRUB_TIMEOUT=(\d+)', grub_content or "", re.MULTILINE)
+        current = f" (GRUB_TIMEOUT atual: {timeout.group(1)}s)" if timeout else ""
+        recommendations.append(
+            f"O carregador de boot levou {loader:.1f}s{current}. Reduza GRUB_TIMEOUT (opção 4 do menu)."
+        )
+    initrd = phases.get("initrd")
+    if initrd and initrd > 3:
+        recommendations.append(
+            f"O initramfs levou {initrd:.1f}s. Considere MODULES=dep em /etc/initramfs-tools/initramfs.conf "
+            "e 'update-initramfs -u'."
+        )
+    return recommendations
+
+
+def analyze_boot(target="graphical.target", blame_text=None, chain_text=None, analyze_text=None,
+                 timestamps_text=None):
+    """
+    Analisa o boot a partir de saídas salvas (arquivos) ou, se nenhuma for passada, do
+    systemd-analyze. Com saídas salvas, as que faltarem são tratadas como vazias: misturar
+    dados desta máquina com os de outro boot daria um resultado sem sentido.
+    Returns:
+        dict: {"chain", "ranking", "phases", "recommendations"}.
+    """
+    saved = any(text is not None for text in (blame_text, chain_text, analyze_text, timestamps_text))
+    if not saved:
+        blame_text = run_command(["systemd-analyze", "blame"], check=False, show_output=False) or ""
+        chain_text = run_command(
+            ["systemd-analyze", "critical-chain", target], check=False, show_output=False
+        ) or ""
+        analyze_text = run_command(["systemd-analyze"], check=False, show_output=False) or ""
+
+    if timestamps_text is not None:
+        units = parse_unit_timestamps(timestamps_text)
+        if target not in units and "multi-user.target" in units:
+            target = "multi-user.target"
+        chain = critical_chain_from_timestamps(units, target)
+        blame = {
+            name: u["ready"] - u["start"] for name, u in units.items()
+            if u["start"] and u["ready"] and u["ready"] > u["start"]
+        }
+    else:
+        chain = parse_critical_chain(chain_text or "")
+        blame = parse_systemd_blame(blame_text or "")
+
+    phases = parse_startup_times(analyze_text or "")
+    return {
+        "chain": chain,
+        "ranking": rank_boot_savings(chain, blame),
+        "phases": phases,
+        # O GRUB_TIMEOUT atual só faz sentido ao lado das fases do boot desta máquina.
+        "recommendations": boot_recommendations(phases, None if saved else read_text_file(GRUB_DEFAULT)),
+    }
+
+
+def print_boot_analysis(analysis, top=10):
+    if analysis["phases"]:
+        phases = " + ".join(f"{value:.2f}s ({phase})" for phase, value in analysis["phases"].items())
+        print(f"\nFases do boot: {phases}")
+
+    if analysis["chain"]:
+        print("\nCaminho crítico:")
+        for node in analysis["chain"]:
+            cost = f" +{node['cost']:.2f}s" if node["cost"] else ""
+            activated = f" @{node['activated']:.2f}s" if node["activated"] is not None else ""
+            print(f"  {'  ' * node['depth']}{node['unit']}{activated}{cost}")
+
+    ranking = analysis["ranking"][:top]
+    if ranking:
+        print("\nUnidades que mais atrasam o boot (economia estimada ao desabilitar ou mascarar):")
+        for i, entry in enumerate(ranking, 1):
+            where = "caminho crítico" if entry["critical"] else "fora do caminho crítico"
+            print(f"  {i:>2}. {entry['unit']:<45} até {entry['savings']:.2f}s  "
+                  f"(leva {entry['cost']:.2f}s, {where})")
+    else:
+        print("\nNenhuma unidade candidata encontrada no caminho crítico.")
+
+    for recommendation in analysis["recommendations"]:
+        print(f"\nRecomendação: {recommendation}")
+
+
+def boot_command(args):
+    def read_optional(path):
+        if path is None:
+            return None
+        text = read_text_file(path)
+        if text is None:
+            raise IOError(f"arquivo não encontrado: {path}")
+        return text
+
+    try:
+        analysis = analyze_boot(
+            target=args.target,
+            blame_text=read_optional(args.blame),
+            chain_text=read_optional(args.chain),
+            analyze_text=read_optional(args.analyze),
+            timestamps_text=read_optional(args.timestamps),
+        )
+    except IOError as e:
+        print(f"Erro: {e}")
+        return False
+    print_boot_analysis(analysis, args.top)
+    return bool(analysis["chain"] or analysis["ranking"] or analysis["phases"])
+
+
+def format_bytes(value):
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(value) < 1024 or unit == "TiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def read_int_file(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def read_cgroup_unit_stats(path):
+    """
+    Lê memory.current, memory.peak, cpu.stat e io.stat de um cgroup v2.
+    """
+    cpu = read_key_value_file(os.path.join(path, "cpu.stat"), ("usage_usec",))
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(path, "io.stat"), 'r') as f:
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+    except (OSError, ValueError):
+        pass
+    return {
+        "memory_current": read_int_file(os.path.join(path, "memory.current")) or 0,
+        "memory_peak": read_int_file(os.path.join(path, "memory.peak")),
+        "cpu_usec": cpu.get("usage_usec", 0),
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+    }
+
+
+def snapshot_unit_costs(cgroup_root=CGROUP_ROOT):
+    slice_dir = os.path.join(cgroup_root, "system.slice")
+    snapshot = {}
+    try:
+        entries = os.scandir(slice_dir)
+    except OSError:
+        return snapshot
+    with entries:
+        for entry in entries:
+            if entry.name.endswith(".service") and entry.is_dir(follow_symlinks=False):
+                snapshot[entry.name] = read_cgroup_unit_stats(entry.path)
+    return snapshot
+
+
+def unit_costs_between(first, second, elapsed):
+    """
+    Combina duas leituras dos cgroups no custo de cada unidade durante o intervalo.
+    """
+    costs = []
+    for unit, after in second.items():
+        before = first.get(unit)
+        if before is None:
+            continue
+        costs.append({
+            "unit": unit,
+            "memory_current": after["memory_current"],
+            "memory_peak": after["memory_peak"],
+            "cpu_percent": max(after["cpu_usec"] - before["cpu_usec"], 0) / (elapsed * 1e6) * 100,
+            "read_rate": max(after["read_bytes"] - before["read_bytes"], 0) / elapsed,
+            "write_rate": max(after["write_bytes"] - before["write_bytes"], 0) / elapsed,
+        })
+    return costs
+
+
+def sample_unit_costs(interval=5.0, cgroup_root=CGROUP_ROOT):
+    first = snapshot_unit_costs(cgroup_root)
+    start = time.monotonic()
+    time.sleep(interval)
+    second = snapshot_unit_costs(cgroup_root)
+    return unit_costs_between(first, second, max(time.monotonic() - start, 1e-6))
+
+
+UNIT_COST_SORT_KEYS = {
+    "memory": lambda c: c["memory_current"],
+    "peak": lambda c: c["memory_peak"] or c["memory_current"],
+    "cpu": lambda c: c["cpu_percent"],
+    "io": lambda c: c["read_rate"] + c["write_rate"],
+}
+
+
+def rank_unit_costs(costs, sort="memory"):
+    return sorted(costs, key=UNIT_COST_SORT_KEYS[sort], reverse=True)
+
+
+def print_unit_cost_table(ranking, top=20):
+    print(f"\n{'#':>3} {'Serviço':<40} {'Memória':>11} {'Pico':>11} {'CPU %':>7} {'Leitura/s':>11} {'Escrita/s':>11}")
+    for i, cost in enumerate(ranking[:top], 1):
+        peak = format_bytes(cost["memory_peak"]) if cost["memory_peak"] is not None else "-"
+        print(
+            f"{i:>3} {cost['unit']:<40} {format_bytes(cost['memory_current']):>11} {peak:>11} "
+            f"{cost['cpu_percent']:>7.2f} {format_bytes(cost['read_rate']):>11} {format_bytes(cost['write_rate']):>11}"
+        )
+
+
+@instrumented("units")
+def disable_units(units, now=True):
+    """
+    Desabilita (e para, se now=True) várias unidades em uma única chamada ao systemctl.
+    """
+    command = ["systemctl", "disable"] + (["--now"] if now else []) + list(units)
+    return run_command(command) is not None
+
+
+def choose_and_disable_units(ranking, top=20):
+    selection = input(
+        "\nDigite os números dos serviços a desabilitar, separados por vírgula (ou Enter para nenhum): "
+    ).strip()
+    if not selection:
+        return False
+
+    units = []
+    for item in selection.split(","):
+        item = item.strip()
+        if not item.isdigit() or not 1 <= int(item) <= min(top, len(ranking)):
+            print(f"Seleção inválida: '{item}'. Nenhum serviço foi alterado.")
+            return False
+        unit = ranking[int(item) - 1]["unit"]
+        if is_protected_unit(unit):
+            print(f"'{unit}' é essencial para o sistema e não será desabilitado.")
+            continue
+        units.append(unit)
+    if not units:
+        return False
+
+    confirm = input(f"Desabilitar e parar {', '.join(units)}? (s/n): ").lower()
+    if confirm != 's':
+        print("Operação cancelada.")
+        return False
+    if disable_units(units):
+        print(f"Serviços desabilitados e parados: {', '.join(units)}.")
+        return True
+    print("Falha ao desabilitar os serviços. Verifique os erros acima.")
+    return False
+
+
+def units_command(args):
+    print(f"Medindo o consumo dos serviços em system.slice por {args.interval} segundos...")
+    ranking = rank_unit_costs(sample_unit_costs(args.interval, args.cgroup_root), args.sort)
+    if not ranking:
+        print(f"Nenhum serviço encontrado em '{os.path.join(args.cgroup_root, 'system.slice')}' (cgroup v2).")
+        return False
+    print_unit_cost_table(ranking, args.top)
+    if sys.stdin.isatty() and not args.no_prompt:
+        check_root()
+        choose_and_disable_units(ranking, args.top)
+    return True
+
+
+@instrumented("services")
+def disable_systemd_services():
+    print("\n--- Desabilitar Serviços Systemd Desnecessários ---")
+    print("Esta opção permite desabilitar serviços que podem consumir recursos (CPU/RAM).")
+    print("ATENÇÃO: Desabilitar serviços essenciais pode causar instabilidade ou mau funcionamento.")
+    print("Sempre pesquise o serviço antes de desabilitá-lo.")
+
+    confirm_analysis = input("\nDeseja analisar o último boot para ver quais serviços mais o atrasam? (s/n): ").lower()
+    if confirm_analysis == 's':
+        print_boot_analysis(analyze_boot())
+
+    confirm_costs = input("Deseja medir o consumo real de RAM, CPU e disco de cada serviço? (s/n): ").lower()
+    if confirm_costs == 's':
+        print("Medindo por 5 segundos...")
+        ranking = rank_unit_costs(sample_unit_costs(5.0))
+        if ranking:
+            print_unit_cost_table(ranking)
+            if choose_and_disable_units(ranking):
+                return
+        else:
+            print("Não foi possível ler os cgroups dos serviços (requer cgroup v2).")
+
+    print("\nAlguns serviços comuns que você pode considerar desabilitar (se não os usar):")
     print("  - bluetooth.service (se não usa Bluetooth)")
     print("  - avahi-daemon.service (para descoberta de rede mDNS, não essencial para muitos)")
     print("  - cups.service (se não usa impressora local)")
@@ -212,6 +1593,286 @@ def disable_systemd_services():
         print("Operação cancelada.")
 
 
+def set_grub_timeout(content, timeout):
+    if re.search(r'^GRUB_TIMEOUT=\d+', content, re.MULTILINE):
+        return re.sub(r'^GRUB_TIMEOUT=\d+', f'GRUB_TIMEOUT={timeout}', content, flags=re.MULTILINE)
+    return content + f"\nGRUB_TIMEOUT={timeout}\n"
+
+
+# Perfis de linha de comando do kernel. 'preempt=' só tem efeito em kernels com PREEMPT_DYNAMIC
+# (o padrão do Ubuntu desde o 22.04); nos demais o kernel apenas ignora o argumento.
+GRUB_CMDLINE_PROFILES = {
+    "latency": {
+        "description": "menor latência (desktop, áudio, jogos): preempção total, sem watchdog",
+        "add": ["preempt=full", "nowatchdog", "transparent_hugepage=madvise"],
+        "remove": [],
+    },
+    "throughput": {
+        "description": "maior vazão (servidores, compilação): sem preempção, hugepages transparentes sempre",
+        "add": ["preempt=none", "nowatchdog", "transparent_hugepage=always"],
+        "remove": [],
+    },
+    "default": {
+        "description": "remove os argumentos dos outros perfis e reativa as mitigações",
+        "add": [],
+        "remove": ["preempt", "nowatchdog", "transparent_hugepage", "mitigations"],
+    },
+}
+# Desliga as mitigações de vulnerabilidades de CPU. Nunca faz parte de um perfil: só para hosts
+# isolados, que não executam código de terceiros.
+GRUB_MITIGATIONS_OFF = "mitigations=off"
+
+
+def split_cmdline(value):
+    """
+    Separa uma linha de comando do kernel em argumentos, respeitando valores entre aspas
+    (ex: dyndbg="file x.c +p").
+    """
+    return re.findall(r'(?:[^\s"]+|"[^"]*")+', value or "")
+
+
+def cmdline_key(token):
+    return token.split("=", 1)[0]
+
+
+def merge_cmdline(tokens, add_args=(), remove_args=()):
+    """
+    Aplica remoções e adições a uma lista de argumentos do kernel, de forma idempotente.
+
+        tokens (list): Argumentos atuais.
+        add_args (list): 'chave=valor' substitui o valor da mesma chave no lugar; 'flag' é
+            acrescentada se não existir.
+        remove_args (list): 'chave' remove a chave com qualquer valor; 'chave=valor' remove só esse par.
+    Returns:
+        list: Os novos argumentos, na ordem original.
+    """
+    result = []
+    for token in tokens:
+        if token in remove_args or cmdline_key(token) in remove_args:
+            continue
+        result.append(token)
+    for arg in add_args:
+        key = cmdline_key(arg)
+        positions = [i for i, token in enumerate(result) if cmdline_key(token) == key]
+        if not positions:
+            result.append(arg)
+            continue
+        result[positions[0]] = arg
+        for i in reversed(positions[1:]):
+            del result[i]
+    return result
+
+
+def cmdline_profile_args(profiles=(), mitigations_off=False):
+    """
+    Junta os argumentos de um ou mais perfis de GRUB_CMDLINE_PROFILES.
+
+    Returns:
+        tuple: (argumentos a adicionar, argumentos a remover).
+    """
+    if isinstance(profiles, str):
+        profiles = [profiles]
+    add_args, remove_args = [], []
+    for name in profiles:
+        if name not in GRUB_CMDLINE_PROFILES:
+            raise ValueError(f"perfil de linha de comando desconhecido: '{name}'")
+        add_args.extend(GRUB_CMDLINE_PROFILES[name]["add"])
+        remove_args.extend(GRUB_CMDLINE_PROFILES[name]["remove"])
+    if mitigations_off:
+        add_args.append(GRUB_MITIGATIONS_OFF)
+    return add_args, remove_args
+
+
+GRUB_ASSIGNMENT = re.compile(r'^[ \t]*(?:export[ \t]+)?([A-Za-z_]\w*)=(.*)$', re.MULTILINE)
+
+
+def parse_shell_value(text, variables):
+    """
+    Interpreta o lado direito de uma atribuição de shell simples, como o grub-mkconfig faz ao
+    carregar /etc/default/grub: aspas simples, aspas duplas com $VAR e valores sem aspas.
+    """
+    value = ""
+    i = 0
+    while i < len(text) and not text[i].isspace() and text[i] != "#":
+        if text[i] == "'":
+            end = text.find("'", i + 1)
+            end = len(text) if end < 0 else end
+            value += text[i + 1:end]
+            i = end + 1
+        elif text[i] == '"':
+            end = i + 1
+            while end < len(text) and text[end] != '"':
+                end += 2 if text[end] == "\\" else 1
+            value += expand_shell_variables(text[i + 1:end], variables)
+            i = end + 1
+        else:
+            match = re.match(r'[^\s\'"#]+', text[i:])
+            value += expand_shell_variables(match.group(0), variables)
+            i += match.end()
+    return value
+
+
+def expand_shell_variables(text, variables):
+    return re.sub(
+        r'\$(?:\{(\w+)\}|(\w+))',
+        lambda m: variables.get(m.group(1) or m.group(2), ""),
+        text,
+    ).replace('\\"', '"')
+
+
+def parse_grub_defaults(content, variables=None):
+    """
+    Lê as variáveis de um arquivo no formato de /etc/default/grub.
+
+        content (str): Conteúdo do arquivo.
+        variables (dict): Valores já definidos (ex: de /etc/default/grub antes dos drop-ins).
+    Returns:
+        dict: Variáveis após o arquivo.
+    """
+    variables = dict(variables or {})
+    for match in GRUB_ASSIGNMENT.finditer(content or ""):
+        variables[match.group(1)] = parse_shell_value(match.group(2), variables)
+    return variables
+
+
+def read_grub_dropins(directory=GRUB_DEFAULT_DIR):
+    dropins = []
+    for path in listdir_paths(directory):
+        if path.endswith(".cfg"):
+            dropins.append((path, read_text_file(path)))
+    return dropins
+
+
+def effective_grub_defaults(content, dropins=()):
+    """
+    Variáveis que o grub-mkconfig realmente usa: /etc/default/grub e depois cada
+    /etc/default/grub.d/*.cfg, em ordem alfabética.
+    """
+    variables = parse_grub_defaults(content)
+    for _, dropin in dropins:
+        variables = parse_grub_defaults(dropin, variables)
+    return variables
+
+
+def grub_dropin_overrides(dropins, names=("GRUB_TIMEOUT", "GRUB_CMDLINE_LINUX_DEFAULT")):
+    """
+    Drop-ins que redefinem as variáveis editadas pelo GhenoTweaks sem partir do valor anterior
+    (ex: 50-cloudimg-settings.cfg em imagens de nuvem), anulando a edição de /etc/default/grub.
+    """
+    overrides = []
+    for path, dropin in dropins:
+        for match in GRUB_ASSIGNMENT.finditer(dropin or ""):
+            name, value = match.group(1), match.group(2)
+            if name in names and f"${name}" not in value and f"${{{name}}}" not in value:
+                overrides.append((path, name))
+    return overrides
+
+
+def get_grub_cmdline(content):
+    return split_cmdline(parse_grub_defaults(content).get("GRUB_CMDLINE_LINUX_DEFAULT", ""))
+
+
+def edit_grub_cmdline(content, add_args=(), remove_args=()):
+    """
+    Edita GRUB_CMDLINE_LINUX_DEFAULT com merge_cmdline, preservando o resto do arquivo.
+    A linha é criada se não existir e nada mudar se o resultado for o mesmo.
+    """
+    matches = [m for m in GRUB_ASSIGNMENT.finditer(content) if m.group(1) == "GRUB_CMDLINE_LINUX_DEFAULT"]
+    tokens = get_grub_cmdline(content)
+    new_tokens = merge_cmdline(tokens, add_args, remove_args)
+    if new_tokens == tokens:
+        return content
+
+    # A atribuição fica entre aspas simples se algum argumento tiver aspas duplas.
+    value = " ".join(new_tokens)
+    quote = "'" if '"' in value else '"'
+    new_line = f"GRUB_CMDLINE_LINUX_DEFAULT={quote}{value}{quote}"
+    if not matches:
+        return content + ("" if content.endswith("\n") or not content else "\n") + new_line + "\n"
+    last = matches[-1]
+    return content[:last.start()] + new_line + content[last.end():]
+
+
+def parse_grub_cfg(text):
+    """
+    Extrai do grub.cfg gerado o que o GhenoTweaks altera: os argumentos da primeira entrada
+    normal (sem root=, ro/rw, BOOT_IMAGE e variáveis do próprio GRUB, como $vt_handoff)
+    e o 'set timeout=' que vem de GRUB_TIMEOUT.
+    """
+    linux_args = None
+    for match in re.finditer(r'^\s*linux(?:efi)?\s+\S+(.*)$', text or "", re.MULTILINE):
+        tokens = split_cmdline(match.group(1))
+        if "recovery" in tokens or "single" in tokens:
+            continue
+        linux_args = [
+            t for t in tokens
+            if t not in ("ro", "rw") and not t.startswith(("root=", "BOOT_IMAGE=", "$"))
+        ]
+        break
+    return {"linux_args": linux_args, "timeout": grub_cfg_timeout(text)}
+
+
+def grub_cfg_timeout(text):
+    r"""
+    O primeiro 'set timeout=' fora do bloco 'if [ "${recordfail}" = 1 ]' do Ubuntu, cujo
+    'set timeout=30' vem de GRUB_RECORDFAIL_TIMEOUT e não de GRUB_TIMEOUT.
+
+    >>> cfg = ('if [ "${recordfail}" = 1 ] ; then\n  set timeout=30\nelse\n'
+    ...        '  if [ x = xy ] ; then\n    set timeout=0\n  fi\nfi\n')
+    >>> grub_cfg_timeout(cfg)
+    '0'
+    >>> grub_update_needed({"GRUB_TIMEOUT": "30"}, cfg), grub_update_needed({"GRUB_TIMEOUT": "0"}, cfg)
+    (True, False)
+    """
+    depth = 0
+    recordfail_depth = None
+    for line in (text or "").splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == "if":
+            depth += 1
+            if recordfail_depth is None and "${recordfail}" in line:
+                recordfail_depth = depth
+        elif tokens[0] in ("else", "elif") and recordfail_depth == depth:
+            recordfail_depth = -1
+        elif tokens[0] == "fi":
+            if recordfail_depth == depth:
+                recordfail_depth = -1
+            depth -= 1
+        elif recordfail_depth is None or recordfail_depth < 0:
+            match = re.match(r'set timeout=(\d+)$', line.strip())
+            if match:
+                return match.group(1)
+    return None
+
+
+def grub_update_needed(variables, cfg_text):
+    """
+    Compara as variáveis efetivas com o grub.cfg atual para decidir se o 'update-grub',
+    que leva alguns segundos, precisa mesmo ser executado.
+    """
+    if not cfg_text:
+        return True
+    rendered = parse_grub_cfg(cfg_text)
+    expected = split_cmdline(variables.get("GRUB_CMDLINE_LINUX", "")) + \
+        split_cmdline(variables.get("GRUB_CMDLINE_LINUX_DEFAULT", ""))
+    if rendered["linux_args"] is not None and rendered["linux_args"] != expected:
+        return True
+    timeout = variables.get("GRUB_TIMEOUT")
+    return bool(timeout) and timeout != rendered["timeout"]
+
+
+def grub_needs_update(content):
+    return grub_update_needed(effective_grub_defaults(content, read_grub_dropins()), read_text_file(GRUB_CFG))
+
+
+def print_grub_overrides(dropins):
+    for path, name in grub_dropin_overrides(dropins):
+        print(f"Aviso: '{path}' redefine {name}; a alteração em '{GRUB_DEFAULT}' não terá efeito para essa variável.")
+
+
+@instrumented("grub")
 def optimize_grub():
     print("\n--- Otimizar Configurações do GRUB ---")
     print("Esta opção pode acelerar o tempo de inicialização do sistema.")
@@ -241,13 +1902,10 @@ def optimize_grub():
     if confirm_timeout == 's':
         target_timeout = input("Digite o novo valor para GRUB_TIMEOUT (ex: 3 para boot rápido, 0 para instantâneo): ")
         if target_timeout.isdigit():
+            new_grub_content = set_grub_timeout(new_grub_content, target_timeout)
             if timeout_match:
-                new_grub_content = re.sub(
-                    r'^GRUB_TIMEOUT=\d+', f'GRUB_TIMEOUT={target_timeout}', new_grub_content, flags=re.MULTILINE
-                )
                 print(f"GRUB_TIMEOUT alterado para {target_timeout}.")
             else:
-                new_grub_content += f"\nGRUB_TIMEOUT={target_timeout}\n"
                 print(f"GRUB_TIMEOUT adicionado como {target_timeout}.")
             changes_made = True
         else:
@@ -259,40 +1917,60 @@ def optimize_grub():
     print("   'quiet splash' oculta as mensagens de boot. Removê-lo pode ligeiramente acelerar")
     print("   o boot e permite ver mensagens do kernel, útil para depuração.")
     
-    cmdline_match = re.search(r'^GRUB_CMDLINE_LINUX_DEFAULT="(.*?)"', new_grub_content, re.MULTILINE)
-    current_cmdline = cmdline_match.group(1) if cmdline_match else ""
-    print(f"Valor atual de GRUB_CMDLINE_LINUX_DEFAULT: \"{current_cmdline}\"")
+    current_cmdline = get_grub_cmdline(new_grub_content)
+    print(f"Valor atual de GRUB_CMDLINE_LINUX_DEFAULT: \"{' '.join(current_cmdline)}\"")
 
     if 'quiet' in current_cmdline or 'splash' in current_cmdline:
         confirm_cmdline = input("Deseja remover 'quiet' e 'splash' desta linha? (s/n): ").lower()
         if confirm_cmdline == 's':
-            if cmdline_match:
-                new_cmdline = current_cmdline.replace("quiet", "").replace("splash", "").strip()
-                new_cmdline = re.sub(r'\s+', ' ', new_cmdline).strip()
-                new_grub_content = re.sub(
-                    r'^GRUB_CMDLINE_LINUX_DEFAULT=".*?"',
-                    f'GRUB_CMDLINE_LINUX_DEFAULT="{new_cmdline}"',
-                    new_grub_content,
-                    flags=re.MULTILINE,
-                )
-                print("'quiet' e 'splash' removidos.")
-                changes_made = True
-            else:
-                print("Linha 'GRUB_CMDLINE_LINUX_DEFAULT' não encontrada. Não foi possível modificar.")
+            new_grub_content = edit_grub_cmdline(new_grub_content, remove_args=["quiet", "splash"])
+            print("'quiet' e 'splash' removidos.")
+            changes_made = True
         else:
             print("Remoção de 'quiet splash' cancelada.")
     else:
         print("'quiet' e 'splash' não encontrados na linha GRUB_CMDLINE_LINUX_DEFAULT.")
 
+    print("\n3. Perfil de desempenho da linha de comando do kernel:")
+    for name, profile in GRUB_CMDLINE_PROFILES.items():
+        args = " ".join(profile["add"]) or "(remove: " + ", ".join(profile["remove"]) + ")"
+        print(f"   - {name}: {profile['description']}\n       {args}")
+    profile_name = input("Digite o nome do perfil (ou Enter para pular): ").strip().lower()
+    if profile_name in GRUB_CMDLINE_PROFILES:
+        add_args, remove_args = cmdline_profile_args(profile_name)
+        edited = edit_grub_cmdline(new_grub_content, add_args, remove_args)
+        if edited != new_grub_content:
+            new_grub_content = edited
+            print(f"Perfil '{profile_name}' aplicado: \"{' '.join(get_grub_cmdline(new_grub_content))}\"")
+            changes_made = True
+        else:
+            print(f"A linha de comando já está de acordo com o perfil '{profile_name}'.")
+    elif profile_name:
+        print(f"Perfil '{profile_name}' desconhecido. Nenhum perfil aplicado.")
+
+    print(f"\n4. Desligar as mitigações de vulnerabilidades de CPU ('{GRUB_MITIGATIONS_OFF}'):")
+    print("   Recupera desempenho em chamadas de sistema e trocas de contexto, mas expõe o sistema")
+    print("   a ataques como Spectre e Meltdown. Use SOMENTE em hosts isolados, que não executam")
+    print("   código de terceiros (navegadores, contêineres de outros usuários, VMs compartilhadas).")
+    if GRUB_MITIGATIONS_OFF in get_grub_cmdline(new_grub_content):
+        print(f"   '{GRUB_MITIGATIONS_OFF}' já está presente.")
+    elif input("Digite 'desligar' para confirmar (ou Enter para pular): ").strip().lower() == 'desligar':
+        new_grub_content = edit_grub_cmdline(new_grub_content, add_args=[GRUB_MITIGATIONS_OFF])
+        print(f"'{GRUB_MITIGATIONS_OFF}' adicionado.")
+        changes_made = True
+
+    print_grub_overrides(read_grub_dropins())
 
     if changes_made:
-        confirm_write = input("Deseja aplicar as mudanças no GRUB e executar 'update-grub'? (s/n): ").lower()
+        confirm_write = input("Deseja aplicar as mudanças no GRUB? (s/n): ").lower()
         if confirm_write == 's':
             try:
-                with open(GRUB_DEFAULT, 'w') as f:
-                    f.write(new_grub_content)
+                atomic_write(GRUB_DEFAULT, new_grub_content)
                 print("Arquivo /etc/default/grub atualizado.")
-                
+
+                if not grub_needs_update(new_grub_content):
+                    print(f"'{GRUB_CFG}' já corresponde à nova configuração. 'update-grub' não é necessário.")
+                    return
                 print("Executando 'update-grub' (isso pode levar alguns segundos)...")
                 result = run_command(["update-grub"])
                 if result is not None:
@@ -307,6 +1985,47 @@ def optimize_grub():
         print("Nenhuma alteração significativa foi selecionada para o GRUB.")
 
 
+def add_fstab_option(parts, option):
+    new_line_parts = parts[:]
+    new_line_parts[3] = parts[3] + f",{option}" if parts[3] else option
+    return " ".join(new_line_parts) + "\n"
+
+
+def apply_noatime_to_fstab(lines, mountpoints=None, exclude=("/boot", "/boot/efi")):
+    """
+    Versão não interativa de enable_noatime.
+
+        lines (list): Linhas atuais do fstab.
+        mountpoints (list): Pontos de montagem a alterar, ou None para todos os elegíveis.
+        exclude (tuple): Pontos de montagem que nunca devem ser alterados.
+    Returns:
+        tuple: (novas linhas, lista dos pontos de montagem alterados).
+    """
+    new_lines = []
+    changed = []
+    for line in lines:
+        parts = line.split()
+        if line.strip().startswith('#') or len(parts) < 4:
+            new_lines.append(line)
+            continue
+
+        options = parts[3].split(",")
+        eligible = (
+            "noatime" not in options
+            and "relatime" not in options
+            and parts[2] != "swap"
+            and parts[1] not in exclude
+            and (mountpoints is None or parts[1] in mountpoints)
+        )
+        if eligible:
+            new_lines.append(add_fstab_option(parts, "noatime"))
+            changed.append(parts[1])
+        else:
+            new_lines.append(line)
+    return new_lines, changed
+
+
+@instrumented("noatime")
 def enable_noatime():
     print("\n--- Habilitar 'noatime' em FSTAB ---")
     print("A opção 'noatime' impede que o sistema registre a cada vez que um arquivo é acessado.")
@@ -349,11 +2068,7 @@ def enable_noatime():
                         f"Deseja adicionar 'noatime' à partição '{parts[1]}' (tipo: {parts[2]})? (s/n): "
                     ).lower()
                     if confirm_line == 's':
-                        new_options_str = options_str + ",noatime" if options_str else "noatime"
-                        
-                        new_line_parts = parts[:]
-                        new_line_parts[3] = new_options_str
-                        modified_lines.append(" ".join(new_line_parts) + "\n")
+                        modified_lines.append(add_fstab_option(parts, "noatime"))
                         
                         changes_made = True
                         print(f"'{parts[1]}' marcado para 'noatime'.")
@@ -366,8 +2081,7 @@ def enable_noatime():
             confirm_write = input("\nDeseja aplicar as mudanças no FSTAB? (s/n): ").lower()
             if confirm_write == 's':
                 try:
-                    with open(FSTAB, 'w') as f:
-                        f.writelines(modified_lines)
+                    atomic_write(FSTAB, "".join(modified_lines))
                     print("Arquivo /etc/fstab atualizado. Algumas mudanças podem requerer reinicialização.")
                 except IOError as e:
                     print(f"Erro ao escrever em '{FSTAB}': {e}")
@@ -382,73 +2096,3489 @@ def enable_noatime():
         print(f"Ocorreu um erro inesperado ao processar FSTAB: {e}")
 
 
-def cleanup_apt_packages():
-    print("\n--- Limpeza de Pacotes e Caches do APT ---")
-    print("Esta opção irá remover pacotes que não são mais necessários (autoremove)")
-    print("e limpar o cache de pacotes baixados do APT (clean), liberando espaço em disco.")
+# Política por classe de dispositivo. Os schedulers são tentados em ordem, conforme o kernel ofereça.
+BLOCK_POLICIES = {
+    "nvme": {"scheduler": ("none",), "read_ahead_kb": 128},
+    "ssd": {"scheduler": ("mq-deadline", "none"), "read_ahead_kb": 128, "nr_requests": 256},
+    "hdd": {"scheduler": ("bfq", "mq-deadline"), "read_ahead_kb": 1024, "nr_requests": 256},
+    "virtio": {"scheduler": ("none", "mq-deadline"), "read_ahead_kb": 128},
+}
+BLOCK_UDEV_MATCH = {
+    "nvme": 'KERNEL=="nvme[0-9]*n[0-9]*"',
+    "ssd": 'KERNEL=="sd[a-z]*|mmcblk[0-9]*", ATTR{queue/rotational}=="0"',
+    "hdd": 'KERNEL=="sd[a-z]*", ATTR{queue/rotational}=="1"',
+    "virtio": 'KERNEL=="vd[a-z]*"',
+}
+BLOCK_IGNORED_PREFIXES = ("loop", "ram", "zram", "dm-", "md", "sr", "fd", "nbd")
 
-    confirm = input("Deseja continuar com a limpeza (apt autoremove e apt clean)? (s/n): ").lower()
-    if confirm == 's':
-        print("\nExecutando 'apt autoremove'...")
-        run_command(["apt", "autoremove", "-y"])
-        
-        print("\nExecutando 'apt clean'...")
-        run_command(["apt", "clean"])
-        
-        print("\nLimpeza concluída.")
-    else:
-        print("Limpeza cancelada.")
 
+def read_sysfs_value(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
 
-def configure_zram():
-    print("\n--- Configurar ZRAM (Memória Comprimida) ---")
-    print("ZRAM cria um dispositivo de bloco comprimido na RAM que é usado como swap.")
-    print("Isso pode evitar o uso de swap lenta no disco rígido, melhorando a responsividade,")
-    print("especialmente em sistemas com menos RAM ou que fazem muito uso de swap.")
-    print("O Ubuntu geralmente usa o pacote 'zram-config'.")
 
-    pkg_check = run_command(["dpkg", "-s", "zram-config"], check=False, show_output=False)
-    
-    if "install ok installed" in pkg_check:
-        print("'zram-config' já está instalado.")
-    else:
-        confirm_install = input("'zram-config' não está instalado. Deseja instalá-lo agora? (s/n): ").lower()
-        if confirm_install == 's':
-            print("Atualizando lista de pacotes...")
-            if run_command(["apt", "update", "-y"]) is None:
-                print("Falha ao atualizar a lista de pacotes. Não foi possível instalar 'zram-config'.")
-                return
-            print("Instalando 'zram-config'...")
-            if run_command(["apt", "install", "zram-config", "-y"]) is None:
-                print("Falha ao instalar 'zram-config'. Não foi possível configurar ZRAM.")
-                return
-            print("'zram-config' instalado.")
-        else:
-            print("Instalação de 'zram-config' cancelada. Não é possível configurar ZRAM.")
-            return
+def write_sysfs_values(values):
+    """
+    Escreve valores em arquivos do sysfs, pulando os que já estão corretos.
 
-    zram_status = run_command(
-        ["systemctl", "is-active", "zram-swap"], check=False, show_output=False
-    )
-    
-    if zram_status == "active":
-        print("ZRAM já está ativo e habilitado.")
-    elif zram_status == "inactive":
-        print("ZRAM está inativo. Ativando e habilitando o serviço 'zram-swap'...")
-        result = run_command(["systemctl", "enable", "--now", "zram-swap"])
-        if result is not None:
-            print("ZRAM ativado e habilitado com sucesso. Reinicie para garantir o funcionamento.")
-            print("Para configurar o tamanho do ZRAM, você pode editar o arquivo '/etc/default/zramswap'.")
-        else:
-            print("Falha ao ativar ZRAM. Verifique os logs do sistema.")
-    else:
-        print("Verificação do status do ZRAM incerta. Tentando ativar e habilitar o serviço 'zram-swap'...")
-        result = run_command(["systemctl", "enable", "--now", "zram-swap"])
-        if result is not None:
-            print("ZRAM ativado e habilitado com sucesso. Reinicie para garantir o funcionamento.")
+    Returns:
+        list: Caminhos que foram realmente alterados.
+    """
+    changed = []
+    for path, value in values.items():
+        current = read_sysfs_value(path)
+        if current is not None and (current == str(value) or f"[{value}]" in current.split()):
+            continue
+        try:
+            with open(path, 'w') as f:
+                f.write(str(value))
+            changed.append(path)
+            record_change("sysfs", path, current, str(value))
+        except OSError as e:
+            print(f"Erro ao escrever '{value}' em '{path}': {e}")
+    return changed
+
+
+def read_block_device(name, sysfs_root=SYSFS_ROOT):
+    queue = os.path.join(sysfs_root, "block", name, "queue")
+    scheduler = (read_sysfs_value(os.path.join(queue, "scheduler")) or "").split()
+    driver_link = os.path.join(sysfs_root, "block", name, "device", "driver")
+    driver = os.path.basename(os.path.realpath(driver_link)) if os.path.islink(driver_link) else None
+    return {
+        "name": name,
+        "rotational": read_sysfs_value(os.path.join(queue, "rotational")) == "1",
+        "schedulers": [t.strip("[]") for t in scheduler],
+        "scheduler": next((t.strip("[]") for t in scheduler if t.startswith("[")), None),
+        "read_ahead_kb": read_sysfs_value(os.path.join(queue, "read_ahead_kb")),
+        "nr_requests": read_sysfs_value(os.path.join(queue, "nr_requests")),
+        "discard": int(read_sysfs_value(os.path.join(queue, "discard_max_bytes")) or 0) > 0,
+        "driver": driver,
+    }
+
+
+def classify_block_device(device):
+    name = device["name"]
+    if name.startswith(BLOCK_IGNORED_PREFIXES):
+        return None
+    if name.startswith("nvme"):
+        return "nvme"
+    if name.startswith("vd") or device["driver"] == "virtio_blk":
+        return "virtio"
+    return "hdd" if device["rotational"] else "ssd"
+
+
+def block_device_settings(device, device_class):
+    """
+    Escolhe scheduler, read_ahead_kb e nr_requests para um dispositivo, de acordo com a classe
+    e com os schedulers que o kernel realmente oferece para ele.
+    """
+    policy = BLOCK_POLICIES[device_class]
+    settings = {}
+    scheduler = next((s for s in policy["scheduler"] if s in device["schedulers"]), None)
+    if scheduler:
+        settings["scheduler"] = scheduler
+    settings["read_ahead_kb"] = str(policy["read_ahead_kb"])
+    if "nr_requests" in policy and scheduler != "none":
+        settings["nr_requests"] = str(policy["nr_requests"])
+    return settings
+
+
+def scan_block_devices(sysfs_root=SYSFS_ROOT):
+    try:
+        names = sorted(os.listdir(os.path.join(sysfs_root, "block")))
+    except OSError:
+        return []
+    devices = []
+    for name in names:
+        device = read_block_device(name, sysfs_root)
+        device["class"] = classify_block_device(device)
+        if device["class"]:
+            device["settings"] = block_device_settings(device, device["class"])
+            devices.append(device)
+    return devices
+
+
+def render_block_udev_rules(devices):
+    classes = {}
+    for device in devices:
+        classes.setdefault(device["class"], device["settings"])
+
+    lines = ["# Gerado pelo GhenoTweaks. Ajustes de I/O por tipo de dispositivo."]
+    for device_class in BLOCK_POLICIES:
+        if device_class not in classes:
+            continue
+        settings = classes[device_class]
+        attrs = ", ".join(f'ATTR{{queue/{key}}}="{value}"' for key, value in settings.items())
+        lines.append(
+            f'ACTION=="add|change", {BLOCK_UDEV_MATCH[device_class]}, ENV{{DEVTYPE}}=="disk", {attrs}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def fstab_device_name(spec, dev_root=DEV_ROOT):
+    """
+    Resolve a primeira coluna do fstab (UUID=, LABEL=, PARTUUID= ou /dev/...) para o nome do kernel.
+    """
+    tags = {"UUID": "by-uuid", "LABEL": "by-label", "PARTUUID": "by-partuuid", "PARTLABEL": "by-partlabel"}
+    key, sep, value = spec.partition("=")
+    if sep and key in tags:
+        path = os.path.join(dev_root, "disk", tags[key], value)
+    elif spec.startswith("/dev/"):
+        path = os.path.join(dev_root, spec[len("/dev/"):])
+    else:
+        return None
+    resolved = os.path.realpath(path)
+    return os.path.basename(resolved) if os.path.exists(resolved) else None
+
+
+def parent_block_device(name, sysfs_root=SYSFS_ROOT):
+    path = os.path.realpath(os.path.join(sysfs_root, "class", "block", name))
+    if os.path.exists(os.path.join(path, "partition")):
+        return os.path.basename(os.path.dirname(path))
+    return name
+
+
+def remove_fstab_discard(lines, trim_devices, sysfs_root=SYSFS_ROOT, dev_root=DEV_ROOT):
+    """
+    Remove a opção 'discard' (TRIM contínuo) das partições em dispositivos que passarão a
+    usar o fstrim.timer. 'discard=async' do btrfs é mantido.
+    """
+    new_lines = []
+    changed = []
+    for line in lines:
+        parts = line.split()
+        if line.strip().startswith('#') or len(parts) < 4 or "discard" not in parts[3].split(","):
+            new_lines.append(line)
+            continue
+        name = fstab_device_name(parts[0], dev_root)
+        if name and parent_block_device(name, sysfs_root) in trim_devices:
+            options = [o for o in parts[3].split(",") if o != "discard"] or ["defaults"]
+            new_parts = parts[:]
+            new_parts[3] = ",".join(options)
+            new_lines.append(" ".join(new_parts) + "\n")
+            changed.append(parts[1])
+        else:
+            new_lines.append(line)
+    return new_lines, changed
+
+
+def plan_fstrim_timer(plan):
+    # Entra no estado desejado mesmo se já estiver habilitado, para o 'check' notar se for desligado.
+    if "fstrim.timer" not in plan["desired"]["enabled_units"]:
+        plan["desired"]["enabled_units"].append("fstrim.timer")
+    if read_unit_states(["fstrim.timer"]).get("fstrim.timer", {}).get("UnitFileState") != "enabled":
+        plan["changes"].append("fstrim: habilitar o TRIM semanal (fstrim.timer)")
+        plan_command(plan, ["systemctl", "enable", "--now", "fstrim.timer"])
+
+
+def plan_block(plan, settings, sysfs_root=SYSFS_ROOT, dev_root=DEV_ROOT):
+    if offline_mode():
+        # Sem os discos da máquina final, as regras cobrem todas as classes com o scheduler
+        # preferido de cada uma; no boot o udev aplica a regra que casar com cada disco.
+        devices = [
+            {"class": device_class, "settings": block_device_settings({"schedulers": policy["scheduler"][:1]}, device_class)}
+            for device_class, policy in BLOCK_POLICIES.items()
+        ]
+        plan_write(plan, BLOCK_UDEV_RULES, render_block_udev_rules(devices))
+        if BLOCK_UDEV_RULES in plan["files"]:
+            plan["changes"].append(f"discos: regras de I/O para {', '.join(BLOCK_POLICIES)} (no boot)")
+        if settings.get("fstrim", True):
+            plan_fstrim_timer(plan)
+        return
+
+    devices = scan_block_devices(sysfs_root)
+    if not devices:
+        print("Aviso: nenhum disco encontrado para ajustar. Seção 'block' ignorada.")
+        return
+
+    for device in devices:
+        queue = os.path.join(sysfs_root, "block", device["name"], "queue")
+        for key, value in device["settings"].items():
+            current = device[key]
+            plan["desired"]["sysfs"][os.path.join(queue, key)] = value
+            if current != value:
+                plan["sysfs"][os.path.join(queue, key)] = value
+                plan["changes"].append(f"disco {device['name']} ({device['class']}): {key} {current} -> {value}")
+
+    plan_write(plan, BLOCK_UDEV_RULES, render_block_udev_rules(devices))
+    if BLOCK_UDEV_RULES in plan["files"]:
+        plan_command(plan, ["udevadm", "control", "--reload"])
+
+    if not settings.get("fstrim", True):
+        return
+    trim_devices = {d["name"] for d in devices if d["discard"] and d["class"] != "hdd"}
+    if not trim_devices:
+        return
+    fstab = plan_read(plan, FSTAB)
+    if fstab is not None:
+        new_lines, changed = remove_fstab_discard(fstab.splitlines(True), trim_devices, sysfs_root, dev_root)
+        plan_write(plan, FSTAB, "".join(new_lines))
+        for mountpoint in changed:
+            plan["changes"].append(f"fstab: trocar 'discard' contínuo por fstrim.timer em '{mountpoint}'")
+    plan_fstrim_timer(plan)
+
+
+def print_block_devices(devices):
+    print(f"\n{'Disco':<10} {'Tipo':<8} {'Scheduler':<24} {'read_ahead_kb':<16} {'nr_requests':<14} TRIM")
+    for d in devices:
+        scheduler = f"{d['scheduler']} -> {d['settings'].get('scheduler', d['scheduler'])}"
+        read_ahead = f"{d['read_ahead_kb']} -> {d['settings']['read_ahead_kb']}"
+        nr_requests = f"{d['nr_requests']} -> {d['settings'].get('nr_requests', d['nr_requests'])}"
+        print(f"{d['name']:<10} {d['class']:<8} {scheduler:<24} {read_ahead:<16} {nr_requests:<14} "
+              f"{'sim' if d['discard'] else 'não'}")
+
+
+@instrumented("block")
+def optimize_block_devices():
+    print("\n--- Otimizar I/O dos Discos ---")
+    print("Escolhe o scheduler de I/O, o read-ahead e a fila de requisições de cada disco")
+    print("conforme o tipo (NVMe, SSD SATA, HD ou disco virtual), e troca o 'discard' contínuo")
+    print("pelo TRIM semanal (fstrim.timer) em SSDs. Os ajustes valem na hora e são")
+    print(f"persistidos em '{BLOCK_UDEV_RULES}'.")
+
+    devices = scan_block_devices()
+    if not devices:
+        print("Nenhum disco encontrado.")
+        return
+    print_block_devices(devices)
+
+    plan = new_plan("block")
+    plan_block(plan, {})
+    apply_plan(plan, dry_run=True)
+    if plan["files"] or plan["sysfs"] or plan["commands"]:
+        if input("\nDeseja aplicar estes ajustes? (s/n): ").lower() == 's':
+            apply_plan(plan)
+        else:
+            print("Alterações canceladas.")
+
+
+# Perfis de CPU. Governor e EPP são tentados em ordem, conforme o driver ofereça;
+# max_cstate_latency (em us) desliga os estados de repouso mais lentos para acordar.
+CPU_PROFILES = {
+    "latency": {
+        "description": "menor latência: frequência máxima e sem estados de repouso profundos",
+        "governor": ("performance",),
+        "epp": ("performance",),
+        "max_cstate_latency": 10,
+    },
+    "balanced": {
+        "description": "equilíbrio: frequência sob demanda, todos os estados de repouso",
+        "governor": ("schedutil", "powersave", "ondemand"),
+        "epp": ("balance_performance",),
+        "max_cstate_latency": None,
+    },
+    "powersave": {
+        "description": "economia de energia: prioriza consumo baixo",
+        "governor": ("powersave", "schedutil", "conservative"),
+        "epp": ("power", "balance_power"),
+        "max_cstate_latency": None,
+    },
+}
+# O ondemand.service do Ubuntu troca o governor um minuto após o boot e desfaria o perfil.
+CPU_COMPETING_UNITS = ("ondemand.service",)
+
+
+def read_cpu(name, sysfs_root=SYSFS_ROOT):
+    cpu_dir = os.path.join(sysfs_root, "devices", "system", "cpu", name)
+    cpufreq = os.path.join(cpu_dir, "cpufreq")
+    states = []
+    for state_dir in listdir_paths(os.path.join(cpu_dir, "cpuidle")):
+        if not re.match(r'state\d+$', os.path.basename(state_dir)):
+            continue
+        latency = read_sysfs_value(os.path.join(state_dir, "latency"))
+        states.append({
+            "state": os.path.basename(state_dir),
+            "name": read_sysfs_value(os.path.join(state_dir, "name")),
+            "latency": int(latency) if latency and latency.isdigit() else None,
+            "disable": read_sysfs_value(os.path.join(state_dir, "disable")),
+        })
+    states.sort(key=lambda state: int(state["state"][5:]))
+    return {
+        "name": name,
+        "driver": read_sysfs_value(os.path.join(cpufreq, "scaling_driver")),
+        "governor": read_sysfs_value(os.path.join(cpufreq, "scaling_governor")),
+        "governors": (read_sysfs_value(os.path.join(cpufreq, "scaling_available_governors")) or "").split(),
+        "epp": read_sysfs_value(os.path.join(cpufreq, "energy_performance_preference")),
+        "epps": (read_sysfs_value(os.path.join(cpufreq, "energy_performance_available_preferences")) or "").split(),
+        "idle_states": states,
+    }
+
+
+def scan_cpus(sysfs_root=SYSFS_ROOT):
+    names = [
+        os.path.basename(path)
+        for path in listdir_paths(os.path.join(sysfs_root, "devices", "system", "cpu"))
+        if re.match(r'cpu\d+$', os.path.basename(path))
+    ]
+    return [read_cpu(name, sysfs_root) for name in sorted(names, key=lambda name: int(name[3:]))]
+
+
+def cpu_settings(cpu, policy):
+    """
+    Valores de sysfs que um perfil pede para uma CPU, relativos ao diretório da CPU, apenas
+    para o que o driver oferece. O governor vem antes do EPP: com intel_pstate e amd-pstate o
+    EPP só aceita 'performance' depois que o governor 'performance' está ativo.
+    """
+    settings = {}
+    governor = next((g for g in policy.get("governor", ()) if g in cpu["governors"]), None)
+    if governor:
+        settings["cpufreq/scaling_governor"] = governor
+    if cpu["epp"] is not None:
+        epp = next((e for e in policy.get("epp", ()) if e in cpu["epps"]), None)
+        if epp and ((governor or cpu["governor"]) != "performance" or epp == "performance"):
+            settings["cpufreq/energy_performance_preference"] = epp
+    max_latency = policy.get("max_cstate_latency")
+    for state in cpu["idle_states"]:
+        if state["disable"] is None or state["latency"] is None:
+            continue
+        disable = max_latency is not None and state["latency"] > max_latency
+        settings[f"cpuidle/{state['state']}/disable"] = "1" if disable else "0"
+    return settings
+
+
+def render_cpu_tmpfiles(cpus, settings):
+    """
+    Gera o tmpfiles.d que reaplica os valores no boot. Um valor igual em todas as CPUs vira uma
+    única linha com glob (cobre também CPUs ligadas depois); os demais ficam por CPU.
+
+        cpus (list): Nomes das CPUs (ex: ["cpu0", "cpu1"]).
+        settings (dict): {cpu: {caminho relativo: valor}}.
+    """
+    lines = ["# Gerado pelo GhenoTweaks. Ajustes de frequência e de estados de repouso da CPU."]
+    keys = []
+    for cpu in cpus:
+        for key in settings.get(cpu, {}):
+            if key not in keys:
+                keys.append(key)
+    for key in keys:
+        values = [settings.get(cpu, {}).get(key) for cpu in cpus]
+        if len(set(values)) == 1:
+            lines.append(f"w {SYSFS_ROOT}/devices/system/cpu/cpu[0-9]*/{key} - - - - {values[0]}")
+            continue
+        for cpu, value in zip(cpus, values):
+            if value is not None:
+                lines.append(f"w {SYSFS_ROOT}/devices/system/cpu/{cpu}/{key} - - - - {value}")
+    return "\n".join(lines) + "\n"
+
+
+def cpu_policy(settings):
+    """
+    Junta o perfil nomeado em settings["profile"] com os valores dados explicitamente
+    (governor, epp, max_cstate_latency).
+    """
+    name = settings.get("profile", "latency")
+    if name not in CPU_PROFILES:
+        raise ValueError(f"perfil de CPU desconhecido: '{name}'")
+    policy = dict(CPU_PROFILES[name])
+    for key in ("governor", "epp"):
+        if key in settings:
+            value = settings[key]
+            policy[key] = (value,) if isinstance(value, str) else tuple(value)
+    if "max_cstate_latency" in settings:
+        policy["max_cstate_latency"] = settings["max_cstate_latency"]
+    return policy
+
+
+def plan_cpu(plan, settings, sysfs_root=SYSFS_ROOT):
+    try:
+        policy = cpu_policy(settings)
+    except ValueError as e:
+        print(f"Aviso: {e}. Seção 'cpu' ignorada.")
+        return
+    if offline_mode():
+        print("Aviso: governor, EPP e estados de repouso dependem das CPUs da máquina final. "
+              "Seção 'cpu' ignorada na imagem.")
+        return
+    cpus = scan_cpus(sysfs_root)
+    if not cpus:
+        print("Aviso: nenhuma CPU encontrada. Seção 'cpu' ignorada.")
+        return
+
+    per_cpu = {}
+    for cpu in cpus:
+        per_cpu[cpu["name"]] = cpu_settings(cpu, policy)
+        cpu_dir = os.path.join(sysfs_root, "devices", "system", "cpu", cpu["name"])
+        for key, value in per_cpu[cpu["name"]].items():
+            path = os.path.join(cpu_dir, key)
+            plan["desired"]["sysfs"][path] = value
+            current = read_sysfs_value(path)
+            if current != value:
+                plan["sysfs"][path] = value
+    if not any(per_cpu.values()):
+        print("Aviso: o kernel não expõe cpufreq nem cpuidle nesta máquina. Seção 'cpu' ignorada.")
+        return
+
+    # Resumo por valor, em vez de uma linha por CPU.
+    summary = {}
+    for path, value in plan["sysfs"].items():
+        match = re.match(r'.*/cpu(\d+)/(cpufreq/\w+|cpuidle/state\d+/disable)$', path)
+        if match:
+            summary.setdefault((match.group(2), value), []).append(match.group(1))
+    for (key, value), cpu_ids in summary.items():
+        plan["changes"].append(f"cpu: {key} -> {value} em {len(cpu_ids)} CPU(s)")
+
+    if any("cpufreq/scaling_governor" in values for values in per_cpu.values()):
+        for unit in CPU_COMPETING_UNITS:
+            status = run_command(["systemctl", "is-enabled", unit], check=False, show_output=False)
+            if status == "enabled":
+                plan["changes"].append(f"cpu: desabilitar '{unit}', que trocaria o governor após o boot")
+                plan_command(plan, ["systemctl", "disable", unit])
+                plan["desired"]["disabled_units"].append(unit)
+
+    plan_write(plan, CPU_TMPFILES, render_cpu_tmpfiles([cpu["name"] for cpu in cpus], per_cpu))
+
+
+def print_cpus(cpus):
+    print(f"\n{'CPU':<7} {'Driver':<16} {'Governor':<13} {'EPP':<22} Estados de repouso (latência us)")
+    for cpu in cpus:
+        states = " ".join(
+            f"{s['name']}({s['latency']}){'-' if s['disable'] == '1' else ''}" for s in cpu["idle_states"]
+        )
+        print(f"{cpu['name']:<7} {cpu['driver'] or '-':<16} {cpu['governor'] or '-':<13} "
+              f"{cpu['epp'] or '-':<22} {states or '-'}")
+    if any(s["disable"] == "1" for cpu in cpus for s in cpu["idle_states"]):
+        print("('-' indica estado de repouso desligado)")
+
+
+@instrumented("cpu")
+def optimize_cpu():
+    print("\n--- Otimizar CPU ---")
+    print("Ajusta o governor de frequência, a preferência de energia (EPP) e os estados de")
+    print("repouso (C-states) de todas as CPUs de uma vez. Estados profundos economizam energia,")
+    print("mas demoram para acordar e aumentam a latência. Os ajustes valem na hora e são")
+    print(f"persistidos em '{CPU_TMPFILES}'.")
+
+    cpus = scan_cpus()
+    if not cpus:
+        print("Nenhuma CPU encontrada.")
+        return
+    print_cpus(cpus)
+
+    print("\nPerfis disponíveis:")
+    for name, profile in CPU_PROFILES.items():
+        print(f"  - {name}: {profile['description']}")
+    name = input("Digite o nome do perfil (ou Enter para cancelar): ").strip().lower()
+    if not name:
+        print("Operação cancelada.")
+        return
+    if name not in CPU_PROFILES:
+        print(f"Perfil '{name}' desconhecido.")
+        return
+
+    plan = new_plan("cpu")
+    plan_cpu(plan, {"profile": name})
+    apply_plan(plan, dry_run=True)
+    if plan["files"] or plan["sysfs"] or plan["commands"]:
+        if input("\nDeseja aplicar estes ajustes? (s/n): ").lower() == 's':
+            apply_plan(plan)
+        else:
+            print("Alterações canceladas.")
+
+
+THP_SETTINGS = {
+    "thp": "enabled",
+    "thp_defrag": "defrag",
+    "thp_shmem": "shmem_enabled",
+    "khugepaged_defrag": "khugepaged/defrag",
+    "khugepaged_pages_to_scan": "khugepaged/pages_to_scan",
+    "khugepaged_scan_sleep_millisecs": "khugepaged/scan_sleep_millisecs",
+}
+# 'run' por último: merge_across_nodes só pode mudar com o KSM parado.
+KSM_SETTINGS = {
+    "ksm_merge_across_nodes": "merge_across_nodes",
+    "ksm_use_zero_pages": "use_zero_pages",
+    "ksm_pages_to_scan": "pages_to_scan",
+    "ksm_sleep_millisecs": "sleep_millisecs",
+    "ksm": "run",
+}
+KSM_STATS = ("pages_shared", "pages_sharing", "pages_unshared", "pages_volatile", "full_scans", "general_profit")
+
+
+def read_sysfs_choice(path):
+    """
+    Lê um arquivo de múltipla escolha do sysfs ('always [madvise] never') e retorna
+    (valor selecionado, opções). Para arquivos comuns, as opções ficam vazias.
+    """
+    value = read_sysfs_value(path)
+    if value is None or "[" not in value:
+        return value, []
+    options = [token.strip("[]") for token in value.split()]
+    return next(token.strip("[]") for token in value.split() if token.startswith("[")), options
+
+
+def mm_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def parse_range_list(text):
+    """
+    Converte listas do sysfs como '0-2,4' em [0, 1, 2, 4].
+    """
+    values = []
+    for part in (text or "").strip().split(","):
+        if "-" in part:
+            first, last = part.split("-", 1)
+            values.extend(range(int(first), int(last) + 1))
+        elif part:
+            values.append(int(part))
+    return values
+
+
+def read_numa_nodes(page_kb, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    """
+    Nós de memória com o arquivo nr_hugepages de cada um. Sem NUMA no kernel, retorna um único
+    'nó' com o contador global de /sys/kernel/mm/hugepages.
+    """
+    pool = f"hugepages-{page_kb}kB"
+    node_root = os.path.join(sysfs_root, "devices", "system", "node")
+    nodes = []
+    for node_id in parse_range_list(read_sysfs_value(os.path.join(node_root, "has_memory"))):
+        node_dir = os.path.join(node_root, f"node{node_id}")
+        meminfo = read_text_file(os.path.join(node_dir, "meminfo")) or ""
+        match = re.search(r'MemTotal:\s+(\d+) kB', meminfo)
+        path = os.path.join(node_dir, "hugepages", pool, "nr_hugepages")
+        if match and os.path.exists(path):
+            nodes.append({"node": f"node{node_id}", "mem_kb": int(match.group(1)), "path": path})
+    if nodes:
+        return nodes
+    path = os.path.join(sysfs_root, "kernel", "mm", "hugepages", pool, "nr_hugepages")
+    if not os.path.exists(path):
+        return []
+    mem_kb = read_key_value_file(os.path.join(proc_root, "meminfo"), ("MemTotal",)).get("MemTotal", 0)
+    return [{"node": "global", "mem_kb": mem_kb, "path": path}]
+
+
+def size_hugepages(mem_total_kb, percent, page_kb):
+    return int(mem_total_kb * percent / 100) // page_kb
+
+
+def split_hugepages(total, weights):
+    """
+    Divide 'total' páginas entre os nós em proporção à memória de cada um, pelo método do maior resto.
+
+        total (int): Número de hugepages.
+        weights (list): Memória de cada nó.
+    Returns:
+        list: Páginas por nó, somando exatamente 'total'.
+    """
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [0] * len(weights)
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def read_memory_tuning(sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    mm = os.path.join(sysfs_root, "kernel", "mm")
+    meminfo = read_key_value_file(
+        os.path.join(proc_root, "meminfo"), ("MemTotal", "Hugepagesize", "AnonHugePages", "HugePages_Total", "HugePages_Free"),
+    )
+    page_kb = meminfo.get("Hugepagesize", 2048)
+    nodes = read_numa_nodes(page_kb, sysfs_root, proc_root)
+    for node in nodes:
+        node["nr_hugepages"] = int(read_sysfs_value(node["path"]) or 0)
+    return {
+        "thp": {key: read_sysfs_choice(os.path.join(mm, "transparent_hugepage", name))[0] for key, name in THP_SETTINGS.items()},
+        "ksm": {key: read_sysfs_value(os.path.join(mm, "ksm", name)) for key, name in KSM_SETTINGS.items()},
+        "ksm_stats": {name: read_sysfs_value(os.path.join(mm, "ksm", name)) for name in KSM_STATS},
+        "meminfo": meminfo,
+        "page_kb": page_kb,
+        "nodes": nodes,
+    }
+
+
+def print_memory_tuning(tuning):
+    print("\nHugepages transparentes (THP):")
+    for key, value in tuning["thp"].items():
+        print(f"  {THP_SETTINGS[key]:<34} {value if value is not None else '-'}")
+    print(f"  {'AnonHugePages em uso':<34} {format_bytes(tuning['meminfo'].get('AnonHugePages', 0) * 1024)}")
+    print("\nKSM (deduplicação de páginas):")
+    for key, value in tuning["ksm"].items():
+        print(f"  {KSM_SETTINGS[key]:<34} {value if value is not None else '-'}")
+    for name, value in tuning["ksm_stats"].items():
+        if value is not None:
+            print(f"  {name:<34} {value}")
+    print(f"\nHugepages reservadas ({tuning['page_kb']} kB):")
+    for node in tuning["nodes"]:
+        reserved = node["nr_hugepages"] * tuning["page_kb"] * 1024
+        print(f"  {node['node']:<10} {node['nr_hugepages']:>8} páginas ({format_bytes(reserved)} de {format_bytes(node['mem_kb'] * 1024)})")
+
+
+def allocate_hugepages(plan, targets, fallback_tmpfiles, proc_root=PROC_ROOT):
+    """
+    Verificação prévia do plano: reserva as hugepages e confere quantas o kernel realmente
+    conseguiu alocar, já que a escrita em nr_hugepages não falha quando falta memória contígua.
+    Se faltarem páginas após compactar a memória, desfaz a reserva e tira as hugepages da
+    configuração persistida.
+    """
+    previous = {path: read_sysfs_value(path) or "0" for path in targets}
+    for attempt in range(2):
+        write_sysfs_values(targets)
+        allocated = {path: int(read_sysfs_value(path) or 0) for path in targets}
+        if all(allocated[path] >= int(count) for path, count in targets.items()):
+            print(f"Hugepages reservadas: {sum(allocated.values())} página(s).")
+            plan["desired"]["sysfs"].update(targets)
+            return True
+        if attempt == 0:
+            print("Memória fragmentada: compactando antes de tentar de novo...")
+            try:
+                with open(os.path.join(proc_root, "sys", "vm", "compact_memory"), 'w') as f:
+                    f.write("1")
+            except OSError as e:
+                print(f"Não foi possível compactar a memória: {e}")
+                break
+
+    requested = sum(int(count) for count in targets.values())
+    print(f"Aviso: só foi possível reservar {sum(allocated.values())} de {requested} hugepages. A reserva foi")
+    print("desfeita e não será persistida. Tente logo após o boot ou use uma porcentagem menor.")
+    write_sysfs_values(previous)
+    plan_write(plan, MM_TMPFILES, fallback_tmpfiles)
+    return False
+
+
+def render_mm_tmpfiles(values, sysfs_root=SYSFS_ROOT):
+    lines = ["# Gerado pelo GhenoTweaks. THP, KSM e hugepages reservadas."]
+    for path, value in values.items():
+        lines.append(f"w {SYSFS_ROOT}/{os.path.relpath(path, sysfs_root)} - - - - {value}")
+    return "\n".join(lines) + "\n"
+
+
+def plan_memory(plan, settings, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    mm = os.path.join(sysfs_root, "kernel", "mm")
+    persisted = {}
+    for group, table in (("transparent_hugepage", THP_SETTINGS), ("ksm", KSM_SETTINGS)):
+        for key, name in table.items():
+            if key not in settings:
+                continue
+            path = os.path.join(mm, group, name)
+            value = mm_value(settings[key])
+            if offline_mode():
+                # O kernel deste host não diz nada sobre o da imagem; o valor só é persistido.
+                persisted[path] = value
+                plan["desired"]["sysfs"][path] = value
+                continue
+            current, options = read_sysfs_choice(path)
+            if current is None:
+                print(f"Aviso: '{path}' não existe neste kernel. '{key}' ignorado.")
+                continue
+            if options and value not in options:
+                print(f"Aviso: '{value}' não é válido para '{key}' (opções: {', '.join(options)}). Ignorado.")
+                continue
+            persisted[path] = value
+            plan["desired"]["sysfs"][path] = value
+            if current != value:
+                plan["sysfs"][path] = value
+                plan["changes"].append(f"memória: {group}/{name} {current} -> {value}")
+
+    if "hugepages_percent" in settings and offline_mode():
+        print("Aviso: a reserva de hugepages depende da RAM da máquina final. 'hugepages_percent' ignorado na imagem.")
+    elif "hugepages_percent" in settings:
+        meminfo = read_key_value_file(os.path.join(proc_root, "meminfo"), ("MemTotal", "Hugepagesize"))
+        page_kb = int(settings.get("hugepage_size_kb", meminfo.get("Hugepagesize", 2048)))
+        nodes = read_numa_nodes(page_kb, sysfs_root, proc_root)
+        if not nodes:
+            print(f"Aviso: o kernel não oferece hugepages de {page_kb} kB. 'hugepages_percent' ignorado.")
+        else:
+            total = size_hugepages(sum(n["mem_kb"] for n in nodes), float(settings["hugepages_percent"]), page_kb)
+            targets = {}
+            # Se a reserva falhar, persiste a reserva que já existia em vez da nova.
+            fallback = dict(persisted)
+            for node, count in zip(nodes, split_hugepages(total, [n["mem_kb"] for n in nodes])):
+                persisted[node["path"]] = str(count)
+                current = read_sysfs_value(node["path"])
+                if current and current != "0":
+                    fallback[node["path"]] = current
+                if current != str(count):
+                    targets[node["path"]] = str(count)
+                    plan["changes"].append(
+                        f"memória: {node['node']}: {current} -> {count} hugepages de {page_kb} kB "
+                        f"({format_bytes(count * page_kb * 1024)})"
+                    )
+                else:
+                    plan["desired"]["sysfs"][node["path"]] = str(count)
+            if targets:
+                fallback_tmpfiles = render_mm_tmpfiles(fallback, sysfs_root)
+                plan["preflight"].append((allocate_hugepages, (targets, fallback_tmpfiles, proc_root)))
+
+    if persisted:
+        plan_write(plan, MM_TMPFILES, render_mm_tmpfiles(persisted, sysfs_root))
+        if offline_mode() and MM_TMPFILES in plan["files"]:
+            plan["changes"].extend(
+                f"memória: {os.path.relpath(path, mm)} = {value} (no boot)" for path, value in persisted.items()
+            )
+
+
+@instrumented("memory")
+def optimize_memory():
+    print("\n--- Hugepages, THP e KSM ---")
+    print("Hugepages transparentes (THP) reduzem faltas de TLB em processos com muita memória,")
+    print("mas podem causar picos de latência na compactação; 'madvise' restringe o uso aos")
+    print("programas que pedem. O KSM deduplica páginas iguais (útil com muitas VMs).")
+    print("Bancos de dados e JVMs costumam preferir hugepages reservadas no boot.")
+
+    tuning = read_memory_tuning()
+    print_memory_tuning(tuning)
+
+    settings = {}
+    thp = input("\nModo do THP (always/madvise/never, Enter para manter): ").strip().lower()
+    if thp:
+        settings["thp"] = thp
+    ksm = input("Ativar o KSM? (s/n, Enter para manter): ").strip().lower()
+    if ksm in ("s", "n"):
+        settings["ksm"] = ksm == "s"
+    percent = input("Porcentagem da RAM a reservar em hugepages (Enter para manter): ").strip()
+    if percent:
+        try:
+            settings["hugepages_percent"] = float(percent)
+        except ValueError:
+            print(f"Porcentagem inválida: '{percent}'.")
+            return
+    if not settings:
+        print("Nenhuma alteração selecionada.")
+        return
+
+    plan = new_plan("memory")
+    plan_memory(plan, settings)
+    apply_plan(plan, dry_run=True)
+    if plan["files"] or plan["sysfs"] or plan["preflight"]:
+        if input("\nDeseja aplicar estes ajustes? (s/n): ").lower() == 's':
+            apply_plan(plan)
+        else:
+            print("Alterações canceladas.")
+
+
+# Padrões da rede. rtt_ms é o RTT dos caminhos que precisam de vazão máxima; bandwidth_mbps,
+# quando ausente, vem da NIC mais rápida (ou do padrão, em NICs virtuais sem velocidade).
+NET_DEFAULTS = {
+    "rtt_ms": 50,
+    "default_bandwidth_mbps": 1000,
+    "somaxconn": 4096,
+    "bbr": True,
+    "rps": True,
+}
+# Valores padrão do kernel: os limites calculados nunca ficam abaixo deles.
+NET_KERNEL_BUFFER_MAX = 6291456
+NET_KERNEL_RMEM = (4096, 131072)
+NET_KERNEL_WMEM = (4096, 16384)
+# Um buffer por socket não passa desta fração da RAM.
+NET_BUFFER_RAM_FRACTION = 64
+NET_BACKLOG_PER_GBIT = 1000
+# Limites que o GhenoTweaks só aumenta: um valor atual maior é mantido.
+NET_LIMIT_PARAMS = (
+    "net.core.rmem_max", "net.core.wmem_max", "net.ipv4.tcp_rmem", "net.ipv4.tcp_wmem",
+    "net.core.somaxconn", "net.core.netdev_max_backlog",
+)
+
+
+def read_net_interfaces(sysfs_root=SYSFS_ROOT):
+    """
+    Interfaces físicas (com link 'device') e suas filas, velocidade e estado.
+    """
+    interfaces = []
+    for path in listdir_paths(os.path.join(sysfs_root, "class", "net")):
+        if not os.path.exists(os.path.join(path, "device")):
+            continue
+        queues = [os.path.basename(q) for q in listdir_paths(os.path.join(path, "queues"))]
+        speed = read_sysfs_value(os.path.join(path, "speed"))
+        interfaces.append({
+            "name": os.path.basename(path),
+            "speed": int(speed) if speed and speed.lstrip("-").isdigit() and int(speed) > 0 else None,
+            "operstate": read_sysfs_value(os.path.join(path, "operstate")),
+            "mtu": read_sysfs_value(os.path.join(path, "mtu")),
+            "rx_queues": sorted((q for q in queues if q.startswith("rx-")), key=lambda q: int(q[3:])),
+            "tx_queues": sorted((q for q in queues if q.startswith("tx-")), key=lambda q: int(q[3:])),
+        })
+    return interfaces
+
+
+def socket_buffer_limits(bandwidth_mbps, rtt_ms, mem_total_bytes):
+    """
+    Calcula os limites dos buffers de socket a partir do produto banda x atraso (BDP).
+
+    O máximo é 2x o BDP (o kernel usa parte do buffer para metadados), arredondado para MiB,
+    nunca abaixo do padrão do kernel nem acima de 1/NET_BUFFER_RAM_FRACTION da RAM
+    (sem esse teto quando mem_total_bytes é None, como em uma imagem).
+
+    Returns:
+        dict: Valores de sysctl para rmem_max, wmem_max, tcp_rmem e tcp_wmem.
+    """
+    bdp = bandwidth_mbps * 1000000 / 8 * rtt_ms / 1000
+    mib = 1024 * 1024
+    maximum = math.ceil(2 * bdp / mib) * mib
+    maximum = max(maximum, NET_KERNEL_BUFFER_MAX)
+    if mem_total_bytes is not None:
+        maximum = min(maximum, max(NET_KERNEL_BUFFER_MAX, mem_total_bytes // NET_BUFFER_RAM_FRACTION // mib * mib))
+    return {
+        "net.core.rmem_max": str(maximum),
+        "net.core.wmem_max": str(maximum),
+        "net.ipv4.tcp_rmem": f"{NET_KERNEL_RMEM[0]} {NET_KERNEL_RMEM[1]} {maximum}",
+        "net.ipv4.tcp_wmem": f"{NET_KERNEL_WMEM[0]} {NET_KERNEL_WMEM[1]} {maximum}",
+    }
+
+
+def netdev_backlog(bandwidth_mbps):
+    return max(1000, int(bandwidth_mbps / 1000 * NET_BACKLOG_PER_GBIT))
+
+
+def format_cpu_mask(cpus, template=None):
+    """
+    Máscara hexadecimal de CPUs no formato do sysfs (grupos de 32 bits separados por vírgula).
+    Com 'template' (o valor atual do arquivo), usa a mesma largura, para comparar com o que o
+    kernel mostra.
+    """
+    value = 0
+    for cpu in cpus:
+        value |= 1 << cpu
+    digits = format(value, "x")
+    if template:
+        digits = digits.rjust(len(template.replace(",", "")), "0")
+    groups = []
+    while digits:
+        groups.insert(0, digits[-8:])
+        digits = digits[:-8]
+    return ",".join(groups) or "0"
+
+
+def spread_queue_masks(queue_count, cpus):
+    """
+    Distribui as CPUs entre as filas de forma intercalada: a fila i fica com as CPUs
+    cpus[i], cpus[i + n], ... Com mais filas que CPUs, cada fila recebe uma CPU.
+    """
+    if not queue_count or not cpus:
+        return []
+    if queue_count >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(queue_count)]
+    return [cpus[i::queue_count] for i in range(queue_count)]
+
+
+def kernel_module_kind(name, proc_root=PROC_ROOT, modules_root=MODULES_ROOT, release=None):
+    """
+    Returns:
+        str: 'builtin' se está embutido no kernel, 'module' se é um módulo carregado ou instalado
+        para o kernel atual (ou para 'release'), ou None se não existe.
+    """
+    if proc_root and re.search(rf'^{name} ', read_text_file(os.path.join(proc_root, "modules")) or "", re.MULTILINE):
+        return "module"
+    release_dir = os.path.join(modules_root, release or os.uname().release)
+    for index, kind in (("modules.builtin", "builtin"), ("modules.dep", "module")):
+        content = read_text_file(os.path.join(release_dir, index)) or ""
+        if re.search(rf'/{name}\.ko(?:\.\w+)?(?::|$)', content, re.MULTILINE):
+            return kind
+    return None
+
+
+def newest_kernel_release(modules_root=MODULES_ROOT):
+    """
+    O kernel mais novo instalado, pelo nome dos diretórios em /lib/modules, ou None.
+    Kernels rc ou do PPA mainline ao lado dos da distribuição são comparados pela mesma chave.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as root:
+    ...     for release in ('6.8.0-45-generic', '6.9.0-060900rc1-generic'):
+    ...         os.mkdir(os.path.join(root, release))
+    ...     newest_kernel_release(root)
+    '6.9.0-060900rc1-generic'
+    """
+    try:
+        with os.scandir(modules_root) as entries:
+            releases = [entry.name for entry in entries if entry.is_dir()]
+    except OSError:
+        return None
+    return max(releases, key=kernel_version_key, default=None)
+
+
+def network_settings(interfaces, mem_total_bytes, available_cc, settings=None, current=None):
+    """
+    Parâmetros de sysctl da rede, sem efeitos colaterais.
+
+        interfaces (list): Resultado de read_net_interfaces.
+        mem_total_bytes (int): RAM total, ou None se desconhecida.
+        available_cc (list): Controles de congestionamento disponíveis (bbr, cubic...).
+        settings (dict): Sobrescreve NET_DEFAULTS (rtt_ms, bandwidth_mbps, somaxconn...).
+        current (dict): Valores atuais; limites já maiores que os calculados são mantidos.
+    Returns:
+        tuple: (valores de sysctl, banda usada em Mb/s).
+    """
+    config = dict(NET_DEFAULTS, **(settings or {}))
+    bandwidth = config.get("bandwidth_mbps") or max(
+        (i["speed"] for i in interfaces if i["speed"]), default=config["default_bandwidth_mbps"]
+    )
+    values = socket_buffer_limits(bandwidth, config["rtt_ms"], mem_total_bytes)
+    values["net.core.somaxconn"] = str(config["somaxconn"])
+    values["net.core.netdev_max_backlog"] = str(config.get("netdev_max_backlog") or netdev_backlog(bandwidth))
+    for param in NET_LIMIT_PARAMS:
+        value = values[param]
+        old = (current or {}).get(param, "").split()
+        new = value.split()
+        if old and len(old) == len(new) and all(o.isdigit() for o in old) and int(old[-1]) > int(new[-1]):
+            values[param] = " ".join(new[:-1] + old[-1:])
+    if config["bbr"] and "bbr" in available_cc:
+        values["net.core.default_qdisc"] = "fq"
+        values["net.ipv4.tcp_congestion_control"] = "bbr"
+    return values, bandwidth
+
+
+def queue_mask_settings(interfaces, cpus, sysfs_root=SYSFS_ROOT):
+    """
+    Máscaras de RPS (filas de recepção) e XPS (filas de transmissão). O RPS só é usado quando a
+    NIC tem menos filas de recepção que CPUs; com uma fila por CPU o RSS da placa já distribui.
+
+    Returns:
+        dict: {caminho no sysfs: máscara}.
+    """
+    values = {}
+    for interface in interfaces:
+        queues_dir = os.path.join(sysfs_root, "class", "net", interface["name"], "queues")
+        for kind, queues in (("rps_cpus", interface["rx_queues"]), ("xps_cpus", interface["tx_queues"])):
+            if kind == "rps_cpus" and len(queues) >= len(cpus):
+                continue
+            for queue, queue_cpus in zip(queues, spread_queue_masks(len(queues), cpus)):
+                path = os.path.join(queues_dir, queue, kind)
+                current = read_sysfs_value(path)
+                if current is None:
+                    continue
+                values[path] = format_cpu_mask(queue_cpus, current)
+    return values
+
+
+def render_net_udev_rules(masks, sysfs_root=SYSFS_ROOT):
+    rules = {}
+    for path, mask in masks.items():
+        parts = os.path.relpath(path, os.path.join(sysfs_root, "class", "net")).split(os.sep)
+        rules.setdefault(parts[0], []).append(f'ATTR{{queues/{parts[2]}/{parts[3]}}}="{mask}"')
+    lines = ["# Gerado pelo GhenoTweaks. Máscaras de RPS/XPS por interface de rede."]
+    for name, attrs in rules.items():
+        lines.append(f'ACTION=="add", SUBSYSTEM=="net", KERNEL=="{name}", ' + ", ".join(attrs))
+    return "\n".join(lines) + "\n"
+
+
+def print_net_interfaces(interfaces):
+    print(f"\n{'Interface':<14} {'Estado':<9} {'Velocidade':<12} {'MTU':<7} Filas (rx/tx)")
+    for i in interfaces:
+        speed = f"{i['speed']} Mb/s" if i["speed"] else "-"
+        print(f"{i['name']:<14} {i['operstate'] or '-':<9} {speed:<12} {i['mtu'] or '-':<7} "
+              f"{len(i['rx_queues'])}/{len(i['tx_queues'])}")
+
+
+def plan_network(plan, settings, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+    config = dict(NET_DEFAULTS, **settings)
+    if offline_mode():
+        # Uma imagem não tem as placas nem a RAM da máquina final: a banda vem do perfil (ou do
+        # padrão), sem teto pela RAM e sem RPS/XPS, e os módulos são procurados no kernel da imagem.
+        interfaces, mem_total, available_cc, current = [], None, [], {}
+        release = newest_kernel_release(target_path(MODULES_ROOT))
+        if release:
+            modules = {name: kernel_module_kind(name, None, target_path(MODULES_ROOT), release)
+                       for name in ("tcp_bbr", "sch_fq")}
+        else:
+            print("Aviso: a imagem não tem kernel em /lib/modules; BBR e fq assumidos como módulos.")
+            modules = {"tcp_bbr": "module", "sch_fq": "module"}
+        config["rps"] = False
+    else:
+        interfaces = read_net_interfaces(sysfs_root)
+        mem_total = read_key_value_file(os.path.join(proc_root, "meminfo"), ("MemTotal",)).get("MemTotal", 0) * 1024
+        available_cc = (read_sysctl_values(["net.ipv4.tcp_available_congestion_control"]).get(
+            "net.ipv4.tcp_available_congestion_control") or "").split()
+        modules = {name: kernel_module_kind(name, proc_root) for name in ("tcp_bbr", "sch_fq")}
+        current = read_sysctl_values(NET_LIMIT_PARAMS)
+
+    # O BBR pode não estar carregado ainda; o sysctl carrega o módulo ao escolhê-lo.
+    if config["bbr"] and "bbr" not in available_cc and modules["tcp_bbr"]:
+        available_cc.append("bbr")
+    values, bandwidth = network_settings(interfaces, mem_total, available_cc, settings, current)
+    if "net.core.default_qdisc" in values and not modules["sch_fq"]:
+        print("Aviso: o qdisc 'fq' não foi encontrado; o BBR usará o pacing interno do TCP.")
+        del values["net.core.default_qdisc"]
+    if config["bbr"] and "net.ipv4.tcp_congestion_control" not in values:
+        print("Aviso: o kernel não oferece o BBR. O controle de congestionamento não será alterado.")
+
+    plan["changes"].append(
+        f"rede: buffers dimensionados para {bandwidth} Mb/s x {config['rtt_ms']} ms "
+        f"(BDP de {format_bytes(bandwidth * 125000 * config['rtt_ms'] / 1000)})"
+    )
+    plan_sysctl(plan, values)
+
+    load = []
+    if "net.ipv4.tcp_congestion_control" in values and modules["tcp_bbr"] == "module":
+        load.append("tcp_bbr")
+    if "net.core.default_qdisc" in values and modules["sch_fq"] == "module":
+        load.append("sch_fq")
+    if load:
+        # Garante os módulos antes do systemd-sysctl no boot.
+        plan_write(plan, NET_MODULES_LOAD, "# Gerado pelo GhenoTweaks.\n" + "\n".join(load) + "\n")
+    if "net.core.default_qdisc" in values and not offline_mode():
+        plan["changes"].append("rede: o qdisc 'fq' vale para interfaces criadas depois (ou após reiniciar)")
+
+    if not config["rps"]:
+        return
+    cpus = parse_range_list(read_sysfs_value(os.path.join(sysfs_root, "devices", "system", "cpu", "online")))
+    masks = queue_mask_settings(interfaces, cpus, sysfs_root)
+    for path, mask in masks.items():
+        plan["desired"]["sysfs"][path] = mask
+        if read_sysfs_value(path) != mask:
+            plan["sysfs"][path] = mask
+            plan["changes"].append(f"rede: {os.path.relpath(path, os.path.join(sysfs_root, 'class', 'net'))} -> {mask}")
+    if masks:
+        plan_write(plan, NET_UDEV_RULES, render_net_udev_rules(masks, sysfs_root))
+        if NET_UDEV_RULES in plan["files"]:
+            plan_command(plan, ["udevadm", "control", "--reload"])
+
+
+@instrumented("network")
+def optimize_network():
+    print("\n--- Otimizar Rede ---")
+    print("Dimensiona os buffers de socket pelo produto banda x atraso (BDP), ativa o BBR com o")
+    print("qdisc 'fq' quando o kernel os oferece, aumenta as filas de conexões e de pacotes e")
+    print("distribui o processamento das filas das placas de rede entre as CPUs (RPS/XPS).")
+
+    interfaces = read_net_interfaces()
+    if not interfaces:
+        print("Nenhuma interface de rede física encontrada.")
+        return
+    print_net_interfaces(interfaces)
+
+    settings = {}
+    rtt = input(f"\nRTT típico dos clientes em ms (Enter para {NET_DEFAULTS['rtt_ms']}): ").strip()
+    if rtt:
+        if not rtt.replace(".", "", 1).isdigit():
+            print(f"RTT inválido: '{rtt}'.")
+            return
+        settings["rtt_ms"] = float(rtt)
+    bandwidth = input("Banda em Mb/s (Enter para usar a velocidade da placa): ").strip()
+    if bandwidth:
+        if not bandwidth.isdigit():
+            print(f"Banda inválida: '{bandwidth}'.")
+            return
+        settings["bandwidth_mbps"] = int(bandwidth)
+
+    plan = new_plan("network")
+    plan_network(plan, settings)
+    apply_plan(plan, dry_run=True)
+    if plan["files"] or plan["sysctl"] or plan["sysfs"] or plan["commands"]:
+        if input("\nDeseja aplicar estes ajustes? (s/n): ").lower() == 's':
+            apply_plan(plan)
+        else:
+            print("Alterações canceladas.")
+
+
+RECLAIM_CATEGORIES = (
+    ("apt_cache", "Cache de pacotes do APT"),
+    ("autoremove", "Pacotes órfãos (apt autoremove)"),
+    ("old_kernels", "Kernels antigos"),
+    ("journal", "Arquivos antigos do journald"),
+    ("snaps", "Revisões desabilitadas de snaps"),
+    ("crash", "Relatórios de falhas (/var/crash)"),
+    ("thumbnails", "Miniaturas em cache dos usuários"),
+)
+JOURNAL_MAX_SIZE = "200M"
+JOURNAL_MAX_AGE = "2weeks"
+
+
+def tree_size(path):
+    """
+    Espaço em disco ocupado por um arquivo ou árvore de diretórios (sem seguir links).
+    """
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            stat = os.lstat(current)
+        except OSError:
+            continue
+        total += stat.st_blocks * 512
+        if not os.path.isdir(current) or os.path.islink(current):
+            continue
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        try:
+                            total += entry.stat(follow_symlinks=False).st_blocks * 512
+                        except OSError:
+                            continue
+        except OSError:
+            continue
+    return total
+
+
+def parse_size_limit(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    match = re.match(r'^\s*(\d+)\s*([KMGT]?)', text.upper())
+    return int(match.group(1)) * units.get(match.group(2), 1) if match else None
+
+
+def parse_age_limit(text):
+    units = {"s": 1, "min": 60, "h": 3600, "d": 86400, "day": 86400, "days": 86400,
+             "week": 604800, "weeks": 604800, "month": 2629800, "months": 2629800}
+    match = re.match(r'^\s*(\d+)\s*([a-z]*)', text)
+    return int(match.group(1)) * units.get(match.group(2) or "s", 1) if match else None
+
+
+def listdir_paths(path):
+    try:
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    except OSError:
+        return []
+
+
+def installed_kernel_versions(root="/"):
+    versions = []
+    for path in listdir_paths(os.path.join(root, "boot")):
+        name = os.path.basename(path)
+        if name.startswith("vmlinuz-"):
+            versions.append(name[len("vmlinuz-"):])
+    return versions
+
+
+def kernel_version_key(version):
+    """
+    Chave de ordenação de versões do kernel. Números e letras de cada parte viram tuplas
+    separadas, para que versões rc ou do PPA mainline sejam comparáveis com as da distribuição.
+
+    >>> sorted(['6.9.0-060900rc1-generic', '6.8.0-45-generic', '6.8.0-100-generic'], key=kernel_version_key)
+    ['6.8.0-45-generic', '6.8.0-100-generic', '6.9.0-060900rc1-generic']
+    """
+    return [(0, int(token)) if token.isdigit() else (1, token) for token in re.findall(r'\d+|[^\d.\-]+', version)]
+
+
+def reclaim_candidates(root="/", running_kernel=None, journal_max_size=JOURNAL_MAX_SIZE,
+                       journal_max_age=JOURNAL_MAX_AGE, now=None):
+    """
+    Lista, sem medir tamanhos, o que cada categoria poderia liberar.
+
+    Returns:
+        dict: {categoria: [{"path", "label"}]}.
+    """
+    running_kernel = running_kernel or os.uname().release
+    now = now or time.time()
+    candidates = {key: [] for key, _ in RECLAIM_CATEGORIES}
+
+    apt_archives = os.path.join(root, "var/cache/apt/archives")
+    for path in listdir_paths(apt_archives) + listdir_paths(os.path.join(apt_archives, "partial")):
+        if path.endswith(".deb"):
+            candidates["apt_cache"].append({"path": path, "label": os.path.basename(path)})
+
+    versions = sorted(installed_kernel_versions(root), key=kernel_version_key)
+    for version in versions[:-1]:
+        if version == running_kernel:
+            continue
+        for path in ("boot/vmlinuz-", "boot/initrd.img-", "boot/System.map-", "boot/config-", "usr/lib/modules/"):
+            full = os.path.join(root, path + version)
+            if os.path.lexists(full):
+                candidates["old_kernels"].append({"path": full, "label": version})
+
+    archived = []
+    for dirpath, _, filenames in os.walk(os.path.join(root, "var/log/journal")):
+        for name in filenames:
+            if "@" in name and name.endswith((".journal", ".journal~")):
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                archived.append((stat.st_mtime, stat.st_blocks * 512, path))
+    max_size = parse_size_limit(journal_max_size) or 0
+    max_age = parse_age_limit(journal_max_age) or 0
+    remaining = sum(size for _, size, _ in archived)
+    for mtime, size, path in sorted(archived):
+        if (max_age and now - mtime > max_age) or remaining > max_size:
+            candidates["journal"].append({"path": path, "label": os.path.basename(path)})
+            remaining -= size
+
+    for path in listdir_paths(os.path.join(root, "var/lib/snapd/snaps")):
+        match = re.match(r'^(.+)_(x?\d+)\.snap$', os.path.basename(path))
+        if not match:
+            continue
+        current = os.path.join(root, "snap", match.group(1), "current")
+        if os.path.islink(current) and os.readlink(current) != match.group(2):
+            candidates["snaps"].append({"path": path, "label": f"{match.group(1)} (revisão {match.group(2)})"})
+
+    for path in listdir_paths(os.path.join(root, "var/crash")):
+        candidates["crash"].append({"path": path, "label": os.path.basename(path)})
+
+    homes = listdir_paths(os.path.join(root, "home")) + [os.path.join(root, "root")]
+    for home in homes:
+        thumbnails = os.path.join(home, ".cache", "thumbnails")
+        if os.path.isdir(thumbnails):
+            candidates["thumbnails"].append({"path": thumbnails, "label": thumbnails})
+
+    return candidates
+
+
+def apt_autoremove_estimate():
+    """
+    Espaço que o 'apt autoremove' liberaria, pela simulação do apt em inglês (LC_ALL=C).
+
+    Returns:
+        int: Bytes, ou None se a saída não pôde ser interpretada.
+    """
+    output = run_command(
+        ["apt-get", "--assume-no", "autoremove"], check=False, show_output=False, env={"LC_ALL": "C"},
+    ) or ""
+    if re.search(r'^0 upgraded, 0 newly installed, 0 to remove', output, re.MULTILINE):
+        return 0
+    # apt 2.x: "After this operation, 1,024 kB disk space will be freed."; apt 3.x: "Freed space: 1,024 kB".
+    match = re.search(r'(?:After this operation, |Freed space: )([\d.,]+) ([kMG]B)', output)
+    if not match:
+        return None
+    multipliers = {"kB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+    return int(float(match.group(1).replace(",", "")) * multipliers[match.group(2)])
+
+
+def scan_reclaimable(root="/", workers=8, **options):
+    """
+    Mede em paralelo, com um pool de threads, o espaço de todos os candidatos de todas as categorias.
+
+    Returns:
+        dict: {categoria: {"bytes": int, "items": [{"path", "label", "bytes"}]}}.
+    """
+    import concurrent.futures
+    candidates = reclaim_candidates(root, **options)
+    items = [item for category in candidates.values() for item in category]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        sizes = list(pool.map(lambda item: tree_size(item["path"]), items))
+    for item, size in zip(items, sizes):
+        item["bytes"] = size
+
+    report = {
+        category: {"bytes": sum(i["bytes"] for i in category_items), "items": category_items}
+        for category, category_items in candidates.items()
+    }
+    if root == "/":
+        estimate = apt_autoremove_estimate()
+        report["autoremove"]["bytes"] = estimate or 0
+        report["autoremove"]["unknown"] = estimate is None
+    return report
+
+
+def print_reclaim_report(report):
+    print(f"\n{'Categoria':<40} {'Recuperável':>12}  Itens")
+    total = 0
+    for key, label in RECLAIM_CATEGORIES:
+        entry = report[key]
+        total += entry["bytes"]
+        size = "desconhecido" if entry.get("unknown") else format_bytes(entry["bytes"])
+        print(f"{label:<40} {size:>12}  {len(entry['items']) or '-'}")
+    print(f"{'Total':<40} {format_bytes(total):>12}")
+
+
+def remove_path(path):
+    import shutil
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except OSError as e:
+        print(f"Erro ao remover '{path}': {e}")
+        return False
+
+
+def reclaim_category(category, entry, journal_max_size=JOURNAL_MAX_SIZE, journal_max_age=JOURNAL_MAX_AGE):
+    if category == "apt_cache":
+        return run_command(["apt", "clean"]) is not None
+    if category == "autoremove":
+        return run_command(["apt", "autoremove", "-y"]) is not None
+    if category == "old_kernels":
+        versions = sorted({item["label"] for item in entry["items"]})
+        output = run_command(
+            ["dpkg-query", "-W", "-f=${Package}\\n", *[f"linux-*-{v}" for v in versions]],
+            check=False, show_output=False,
+        ) or ""
+        packages = output.split()
+        return not packages or run_command(["apt-get", "purge", "-y", *packages]) is not None
+    if category == "journal":
+        return run_command(
+            ["journalctl", f"--vacuum-size={journal_max_size}", f"--vacuum-time={journal_max_age}"]
+        ) is not None
+    if category == "snaps":
+        success = True
+        for item in entry["items"]:
+            name, revision = re.match(r'^(.+)_(x?\d+)\.snap$', os.path.basename(item["path"])).groups()
+            success = run_command(["snap", "remove", name, f"--revision={revision}"]) is not None and success
+        return success
+    if category == "thumbnails":
+        return all([remove_path(p) for item in entry["items"] for p in listdir_paths(item["path"])])
+    return all([remove_path(item["path"]) for item in entry["items"]])
+
+
+def free_bytes(path="/"):
+    stat = os.statvfs(path)
+    return stat.f_bavail * stat.f_frsize
+
+
+@instrumented("reclaim")
+def reclaim_disk_space(categories, report, **options):
+    before = free_bytes()
+    success = True
+    for key, label in RECLAIM_CATEGORIES:
+        # O autoremove sempre roda: a estimativa do apt pode faltar, e ele não custa nada sem órfãos.
+        if key in categories and (key == "autoremove" or report[key]["bytes"] or report[key]["items"]):
+            print(f"\nLimpando: {label}...")
+            success = reclaim_category(key, report[key], **options) and success
+    print(f"\nEspaço liberado: {format_bytes(max(free_bytes() - before, 0))}.")
+    return success
+
+
+@instrumented("reclaim")
+def cleanup_apt_packages():
+    print("\n--- Limpeza de Pacotes e Caches ---")
+    print("Esta opção mede o espaço que pode ser liberado no cache do APT, em pacotes órfãos,")
+    print("kernels antigos, no journald, em revisões antigas de snaps, em relatórios de falhas")
+    print("e nas miniaturas em cache, e só então pergunta o que limpar.")
+
+    print("\nMedindo o espaço recuperável...")
+    report = scan_reclaimable()
+    print_reclaim_report(report)
+
+    confirm = input("\nDeseja limpar todas as categorias? (s/n, ou os nomes separados por vírgula: "
+                    f"{', '.join(key for key, _ in RECLAIM_CATEGORIES)}): ").strip().lower()
+    if confirm == 's':
+        categories = [key for key, _ in RECLAIM_CATEGORIES]
+    elif confirm and confirm != 'n':
+        categories = [c.strip() for c in confirm.split(",") if c.strip() in dict(RECLAIM_CATEGORIES)]
+    else:
+        categories = []
+    if categories:
+        reclaim_disk_space(categories, report)
+        print("\nLimpeza concluída.")
+    else:
+        print("Limpeza cancelada.")
+
+
+# Unidades de outros pacotes que também configuram o zram0 e conflitariam com o GhenoTweaks.
+ZRAM_COMPETING_UNITS = (
+    "zram-config.service", "zramswap.service", "zram-swap.service", "systemd-zram-setup@zram0.service",
+)
+ZRAM_SAMPLE_DIRS = ("/usr/bin", "/usr/lib/x86_64-linux-gnu", "/usr/share/doc", "/var/log")
+ZRAM_DEFAULT_RATIO = 2.0
+ZRAM_PAGE_SIZE = 4096
+
+
+def read_zram_algorithms(device="zram0", sysfs_root=SYSFS_ROOT):
+    """
+    Lê comp_algorithm (ex: "lzo lzo-rle [lz4] zstd").
+    Returns:
+        tuple: (lista de algoritmos disponíveis, algoritmo atual ou None).
+    """
+    try:
+        with open(os.path.join(sysfs_root, "block", device, "comp_algorithm"), 'r') as f:
+            tokens = f.read().split()
+    except OSError:
+        return [], None
+    current = next((t.strip("[]") for t in tokens if t.startswith("[")), None)
+    return [t.strip("[]") for t in tokens], current
+
+
+def kernel_zram_algorithms(sysfs_root=SYSFS_ROOT):
+    """
+    Algoritmos que o kernel aceita em comp_algorithm, carregando o módulo zram se preciso.
+    """
+    if not os.path.isdir(os.path.join(sysfs_root, "class", "zram-control")):
+        run_command(["modprobe", "zram"], check=False, show_output=False)
+    return read_zram_algorithms(sysfs_root=sysfs_root)[0]
+
+
+def is_block_device(path):
+    import stat
+    try:
+        return stat.S_ISBLK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def collect_sample_pages(count=2048, dirs=ZRAM_SAMPLE_DIRS, zero_fraction=0.1, seed=0):
+    """
+    Monta páginas de teste a partir de trechos de binários, bibliotecas e textos do sistema,
+    com uma fração de páginas zeradas, que são comuns na memória anônima.
+    """
+    import random
+    rng = random.Random(seed)
+    files = []
+    for directory in dirs:
+        for dirpath, _, filenames in os.walk(directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    files.append(path)
+            if len(files) >= 2000:
+                break
+
+    pages = [bytes(ZRAM_PAGE_SIZE)] * int(count * zero_fraction)
+    attempts = 0
+    while files and len(pages) < count and attempts < count * 4:
+        attempts += 1
+        path = rng.choice(files)
+        try:
+            size = os.path.getsize(path)
+            if size < ZRAM_PAGE_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(rng.randrange(0, size - ZRAM_PAGE_SIZE + 1, ZRAM_PAGE_SIZE) if size > ZRAM_PAGE_SIZE else 0)
+                page = f.read(ZRAM_PAGE_SIZE)
+        except OSError:
+            continue
+        if len(page) == ZRAM_PAGE_SIZE:
+            pages.append(page)
+    rng.shuffle(pages)
+    return pages
+
+
+def userspace_compressors():
+    """
+    Compressores equivalentes em espaço de usuário, usados quando não é possível
+    testar um dispositivo zram real. lz4 e zstd dependem dos módulos opcionais 'lz4' e 'zstandard'.
+    """
+    import zlib
+    compressors = {"deflate": lambda data: zlib.compress(data, 1)}
+    try:
+        import lz4.block
+        compressors["lz4"] = lambda data: lz4.block.compress(data, store_size=False)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        compressors["zstd"] = zstandard.ZstdCompressor(level=3).compress
+    except ImportError:
+        pass
+    return compressors
+
+
+def userspace_runner(compress):
+    def run(pages):
+        return sum(len(compress(page)) for page in pages)
+    return run
+
+
+def zram_kernel_runner(algorithm, sysfs_root=SYSFS_ROOT, dev_root="/dev"):
+    """
+    Mede um algoritmo no próprio kernel: cria um zram temporário via zram-control,
+    grava as páginas nele e lê o tamanho comprimido em mm_stat.
+    """
+    def run(pages):
+        control = os.path.join(sysfs_root, "class", "zram-control")
+        with open(os.path.join(control, "hot_add"), 'r') as f:
+            device_id = f.read().strip()
+        device = os.path.join(sysfs_root, "block", f"zram{device_id}")
+        try:
+            with open(os.path.join(device, "comp_algorithm"), 'w') as f:
+                f.write(algorithm)
+            with open(os.path.join(device, "disksize"), 'w') as f:
+                f.write(str(len(pages) * ZRAM_PAGE_SIZE * 2))
+            fd = os.open(os.path.join(dev_root, f"zram{device_id}"), os.O_WRONLY)
+            try:
+                for page in pages:
+                    os.write(fd, page)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with open(os.path.join(device, "mm_stat"), 'r') as f:
+                return int(f.read().split()[1])
+        finally:
+            with open(os.path.join(device, "reset"), 'w') as f:
+                f.write("1")
+            with open(os.path.join(control, "hot_remove"), 'w') as f:
+                f.write(device_id)
+    return run
+
+
+def benchmark_zram_algorithms(pages, runners):
+    """
+    Mede taxa de compressão e vazão de cada algoritmo.
+
+        pages (list): Páginas de dados a comprimir.
+        runners (dict): {algoritmo: função(pages) -> bytes comprimidos}.
+    Returns:
+        list: {"algorithm", "ratio", "throughput"} com vazão em MiB/s.
+    """
+    total = sum(len(page) for page in pages)
+    results = []
+    for algorithm, runner in runners.items():
+        start = time.perf_counter()
+        try:
+            compressed = runner(pages)
+        except OSError as e:
+            print(f"Aviso: não foi possível testar '{algorithm}': {e}")
+            continue
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        results.append({
+            "algorithm": algorithm,
+            "ratio": total / max(compressed, 1),
+            "throughput": total / elapsed / (1024 * 1024),
+        })
+    return results
+
+
+def choose_zram_algorithm(results, min_speed_fraction=0.35):
+    """
+    Escolhe o algoritmo de melhor compressão entre os que têm ao menos uma fração
+    da vazão do mais rápido, já que o zram está no caminho de cada falta de página.
+    """
+    fastest = max(r["throughput"] for r in results)
+    candidates = [r for r in results if r["throughput"] >= fastest * min_speed_fraction]
+    best = max(candidates, key=lambda r: r["ratio"])
+    reason = (
+        f"melhor compressão ({best['ratio']:.2f}x) entre os algoritmos com pelo menos "
+        f"{min_speed_fraction * 100:.0f}% da vazão do mais rápido ({best['throughput']:.0f} MiB/s)"
+    )
+    return best, reason
+
+
+def size_zram_device(mem_total_bytes, ratio, percent=50):
+    """
+    Calcula o disksize (tamanho não comprimido) para que os dados comprimidos ocupem
+    no máximo 'percent'% da RAM, limitado a duas vezes a RAM total.
+    """
+    disksize = mem_total_bytes * percent / 100 * max(ratio, 1.0)
+    disksize = min(disksize, mem_total_bytes * 2)
+    mib = 1024 * 1024
+    return int(disksize // mib * mib)
+
+
+def zram_swap_priority(swap_devices):
+    disk_priorities = [d["priority"] for d in swap_devices if "zram" not in d["name"]]
+    return min(max(disk_priorities + [90]) + 10, 32767)
+
+
+def benchmark_available_zram(sysfs_root=SYSFS_ROOT):
+    """
+    Testa os algoritmos suportados pelo kernel em um zram real; sem zram-control,
+    usa os compressores equivalentes em espaço de usuário. Só entram algoritmos que o kernel
+    lista em comp_algorithm, já que o escolhido é escrito lá no boot.
+    """
+    algorithms = kernel_zram_algorithms(sysfs_root)
+    if not algorithms:
+        print("Aviso: o kernel não informou nenhum algoritmo do zram (o módulo zram está disponível?).")
+        return []
+    pages = collect_sample_pages()
+
+    if os.path.isdir(os.path.join(sysfs_root, "class", "zram-control")):
+        results = benchmark_zram_algorithms(
+            pages, {a: zram_kernel_runner(a, sysfs_root) for a in algorithms}
+        )
+        if results:
+            return results
+
+    compressors = {name: c for name, c in userspace_compressors().items() if name in algorithms}
+    if not compressors:
+        return []
+    print("Aviso: usando compressores em espaço de usuário como aproximação dos algoritmos do kernel.")
+    return benchmark_zram_algorithms(pages, {name: userspace_runner(c) for name, c in compressors.items()})
+
+
+def print_zram_benchmark(results):
+    print(f"\n{'Algoritmo':<12} {'Compressão':>11} {'Vazão':>14}")
+    for r in sorted(results, key=lambda r: r["ratio"], reverse=True):
+        print(f"{r['algorithm']:<12} {r['ratio']:>10.2f}x {r['throughput']:>9.0f} MiB/s")
+
+
+def systemd_shell_command(script):
+    """
+    Linha de ExecStart que roda 'script' no /bin/sh. Os valores no script já devem vir com
+    shlex.quote; aqui só se protege a string do próprio systemd (aspas, barras, % e $).
+    """
+    escaped = script.replace("\\", "\\\\").replace('"', '\\"').replace("%", "%%").replace("$", "$$")
+    return f'/bin/sh -c "{escaped}"'
+
+
+def render_zram_unit(algorithm, disksize, priority, ratio, writeback_device=None):
+    import shlex
+    lines = [
+        f"# ghenotweaks: algorithm={algorithm} ratio={ratio:.2f}",
+        "[Unit]",
+        "Description=GhenoTweaks ZRAM swap",
+        "DefaultDependencies=no",
+        "After=local-fs.target" if writeback_device else "After=systemd-modules-load.service",
+        "Before=swap.target",
+        "",
+        "[Service]",
+        "Type=oneshot",
+        "RemainAfterExit=yes",
+        "ExecStart=/sbin/modprobe zram num_devices=1",
+        f"ExecStart={systemd_shell_command(f'echo {shlex.quote(algorithm)} > /sys/block/zram0/comp_algorithm')}",
+    ]
+    if writeback_device:
+        lines.append(
+            f"ExecStart={systemd_shell_command(f'echo {shlex.quote(writeback_device)} > /sys/block/zram0/backing_dev')}"
+        )
+    lines += [
+        f"ExecStart=/bin/sh -c 'echo {disksize} > /sys/block/zram0/disksize'",
+        "ExecStart=/sbin/mkswap /dev/zram0",
+        f"ExecStart=/sbin/swapon -p {priority} /dev/zram0",
+        "ExecStop=/sbin/swapoff /dev/zram0",
+        "ExecStop=/bin/sh -c 'echo 1 > /sys/block/zram0/reset'",
+        "",
+        "[Install]",
+        "WantedBy=swap.target",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def render_zram_writeback_units(interval="1h"):
+    """
+    Serviço e timer que movem as páginas frias do zram para o dispositivo de writeback. Só o
+    backing_dev não basta: o kernel grava apenas quando 'idle' ou 'huge' é escrito em writeback.
+    """
+    service = "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: writeback das páginas frias do zram",
+        f"After={ZRAM_UNIT_NAME}",
+        f"Requisite={ZRAM_UNIT_NAME}",
+        "",
+        "[Service]",
+        "Type=oneshot",
+        # Páginas incompressíveis e as que ficaram ociosas desde a última execução vão para o disco;
+        # em seguida todas são marcadas como ociosas para a próxima. 'huge' exige kernel 5.1 ou superior.
+        "ExecStart=-/bin/sh -c 'echo huge > /sys/block/zram0/writeback'",
+        "ExecStart=/bin/sh -c 'echo idle > /sys/block/zram0/writeback'",
+        "ExecStart=/bin/sh -c 'echo all > /sys/block/zram0/idle'",
+        "Nice=10",
+        "IOSchedulingClass=idle",
+        "",
+    ])
+    timer = "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: writeback periódico do zram",
+        "",
+        "[Timer]",
+        f"OnBootSec={interval}",
+        f"OnUnitActiveSec={interval}",
+        "",
+        "[Install]",
+        "WantedBy=timers.target",
+        "",
+    ])
+    return service, timer
+
+
+def read_zram_stats(device="zram0", sysfs_root=SYSFS_ROOT):
+    """
+    Lê mm_stat e bd_stat. Os contadores do bd_stat são em páginas de 4 KiB.
+
+    Returns:
+        dict: Bytes originais e comprimidos, e bytes no dispositivo de writeback, gravados e lidos.
+    """
+    block = os.path.join(sysfs_root, "block", device)
+    mm_stat = (read_sysfs_value(os.path.join(block, "mm_stat")) or "").split()
+    bd_stat = (read_sysfs_value(os.path.join(block, "bd_stat")) or "").split()
+    stats = {"backing_dev": read_sysfs_value(os.path.join(block, "backing_dev"))}
+    if len(mm_stat) >= 3:
+        stats["orig_data_size"], stats["compr_data_size"], stats["mem_used_total"] = map(int, mm_stat[:3])
+    if len(bd_stat) >= 3:
+        stats["bd_count"], stats["bd_reads"], stats["bd_writes"] = (int(v) * ZRAM_PAGE_SIZE for v in bd_stat[:3])
+    return stats
+
+
+def print_zram_stats(stats):
+    if "orig_data_size" not in stats:
+        print("O zram0 não está configurado.")
+        return
+    ratio = stats["orig_data_size"] / stats["compr_data_size"] if stats["compr_data_size"] else 0
+    print(f"\nzram0: {format_bytes(stats['orig_data_size'])} de dados em {format_bytes(stats['mem_used_total'])} "
+          f"de RAM (compressão {ratio:.2f}x)")
+    if stats.get("backing_dev") in (None, "none"):
+        print("Writeback: sem dispositivo de writeback.")
+    elif "bd_count" in stats:
+        print(f"Writeback em {stats['backing_dev']}: {format_bytes(stats['bd_count'])} no dispositivo, "
+              f"{format_bytes(stats['bd_writes'])} gravados, {format_bytes(stats['bd_reads'])} lidos de volta")
+
+
+def parse_zram_unit(content):
+    match = re.search(r'^# ghenotweaks: algorithm=(\S+) ratio=([\d.]+)', content or "", re.MULTILINE)
+    if not match:
+        return None
+    return {"algorithm": match.group(1), "ratio": float(match.group(2))}
+
+
+def configure_zram_engine():
+    print("\nTestando os algoritmos de compressão disponíveis (isso leva alguns segundos)...")
+    results = benchmark_available_zram()
+    if not results:
+        print("Não foi possível testar nenhum algoritmo de compressão.")
+        return
+    print_zram_benchmark(results)
+    best, reason = choose_zram_algorithm(results)
+    print(f"\nAlgoritmo recomendado: {best['algorithm']} ({reason}).")
+
+    percent = input("Porcentagem máxima da RAM a ocupar com dados comprimidos (Enter para 50): ").strip()
+    writeback = input("Dispositivo de writeback para páginas frias (ex: /dev/sdb2, Enter para nenhum): ").strip()
+    settings = {
+        "algorithm": best["algorithm"],
+        "ratio": best["ratio"],
+        "percent": int(percent) if percent.isdigit() else 50,
+    }
+    if writeback:
+        settings["writeback_device"] = writeback
+
+    plan = build_plan({"zram": settings}, name="zram")
+    if apply_plan(plan, dry_run=True) and (plan["files"] or plan["commands"]):
+        if input("\nDeseja aplicar esta configuração de ZRAM? (s/n): ").lower() == 's':
+            apply_plan(plan)
+        else:
+            print("Configuração de ZRAM cancelada.")
+
+
+@instrumented("zram")
+def configure_zram():
+    print("\n--- Configurar ZRAM (Memória Comprimida) ---")
+    print("ZRAM cria um dispositivo de bloco comprimido na RAM que é usado como swap.")
+    print("Isso pode evitar o uso de swap lenta no disco rígido, melhorando a responsividade,")
+    print("especialmente em sistemas com menos RAM ou que fazem muito uso de swap.")
+    print("O Ubuntu geralmente usa o pacote 'zram-config'.")
+
+    confirm_engine = input(
+        "\nDeseja usar o configurador avançado (testa os algoritmos, calcula o tamanho e a prioridade)? (s/n): "
+    ).lower()
+    if confirm_engine == 's':
+        configure_zram_engine()
+        return
+
+    pkg_check = run_command(["dpkg", "-s", "zram-config"], check=False, show_output=False)
+    
+    if "install ok installed" in pkg_check:
+        print("'zram-config' já está instalado.")
+    else:
+        confirm_install = input("'zram-config' não está instalado. Deseja instalá-lo agora? (s/n): ").lower()
+        if confirm_install == 's':
+            print("Atualizando lista de pacotes...")
+            if run_command(["apt", "update", "-y"]) is None:
+                print("Falha ao atualizar a lista de pacotes. Não foi possível instalar 'zram-config'.")
+                return
+            print("Instalando 'zram-config'...")
+            if run_command(["apt", "install", "zram-config", "-y"]) is None:
+                print("Falha ao instalar 'zram-config'. Não foi possível configurar ZRAM.")
+                return
+            print("'zram-config' instalado.")
+        else:
+            print("Instalação de 'zram-config' cancelada. Não é possível configurar ZRAM.")
+            return
+
+    zram_status = run_command(
+        ["systemctl", "is-active", "zram-swap"], check=False, show_output=False
+    )
+    
+    if zram_status == "active":
+        print("ZRAM já está ativo e habilitado.")
+    elif zram_status == "inactive":
+        print("ZRAM está inativo. Ativando e habilitando o serviço 'zram-swap'...")
+        result = run_command(["systemctl", "enable", "--now", "zram-swap"])
+        if result is not None:
+            print("ZRAM ativado e habilitado com sucesso. Reinicie para garantir o funcionamento.")
+            print("Para configurar o tamanho do ZRAM, você pode editar o arquivo '/etc/default/zramswap'.")
+        else:
+            print("Falha ao ativar ZRAM. Verifique os logs do sistema.")
+    else:
+        print("Verificação do status do ZRAM incerta. Tentando ativar e habilitar o serviço 'zram-swap'...")
+        result = run_command(["systemctl", "enable", "--now", "zram-swap"])
+        if result is not None:
+            print("ZRAM ativado e habilitado com sucesso. Reinicie para garantir o funcionamento.")
             print("Para configurar o tamanho do ZRAM, você pode editar o arquivo '/etc/default/zramswap'.")
         else:
-            print("Falha ao ativar ZRAM. Verifique os logs do sistema.")
+            print("Falha ao ativar ZRAM. Verifique os logs do sistema.")
+
+def file_fingerprint(path):
+    import hashlib
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+    return {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def state_digest(state):
+    import hashlib
+    desired = {key: state.get(key) for key in ("sysctl", "sysfs", "files", "disabled_units", "enabled_units")}
+    return hashlib.sha256(json.dumps(desired, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def record_applied_state(sysctl=None, sysfs=None, files=(), disabled_units=(), enabled_units=(), path=STATE_FILE):
+    """
+    Acrescenta ao estado salvo o que acabou de ser aplicado. O 'check' compara o sistema com este
+    estado para detectar desvios de configuração. Se nada mudou, o arquivo não é reescrito.
+
+    Returns:
+        bool: True se o estado salvo foi atualizado.
+    """
+    path = target_path(path)
+    previous = load_state(path)
+    state = copy.deepcopy(previous) if previous else {
+        "version": 1, "sysctl": {}, "sysfs": {}, "files": {}, "disabled_units": [], "enabled_units": [],
+    }
+    state["sysctl"].update(sysctl or {})
+    state["sysfs"].update(sysfs or {})
+    for file_path in files:
+        fingerprint = file_fingerprint(target_path(file_path))
+        if fingerprint:
+            state["files"][file_path] = fingerprint
+    for unit in disabled_units:
+        if unit not in state["disabled_units"]:
+            state["disabled_units"].append(unit)
+        if unit in state["enabled_units"]:
+            state["enabled_units"].remove(unit)
+    for unit in enabled_units:
+        if unit not in state["enabled_units"]:
+            state["enabled_units"].append(unit)
+        if unit in state["disabled_units"]:
+            state["disabled_units"].remove(unit)
+    # A cópia ainda tem a data e a impressão digital antigas: igualdade aqui quer dizer nenhuma mudança.
+    if state == previous:
+        return False
+    state["applied"] = datetime.datetime.now().isoformat(timespec="seconds")
+    state["fingerprint"] = state_digest(state)
+
+    try:
+        atomic_write(path, json.dumps(state, indent=2, sort_keys=True), backup=False)
+    except OSError as e:
+        print(f"Aviso: não foi possível salvar o estado aplicado em '{path}': {e}")
+        return False
+    return True
+
+
+def forget_applied_state(files=(), sysctl=(), sysfs=(), units=(), path=STATE_FILE):
+    """
+    Remove do estado salvo o que foi desfeito por um rollback, para que o 'check' não acuse
+    como desvio uma configuração revertida de propósito.
+
+    Returns:
+        bool: True se o estado salvo foi atualizado.
+    """
+    state = load_state(path)
+    if state is None:
+        return False
+    previous = copy.deepcopy(state)
+    for file_path in files:
+        state["files"].pop(file_path, None)
+    for param in sysctl:
+        state["sysctl"].pop(param, None)
+    for sysfs_path in sysfs:
+        state["sysfs"].pop(sysfs_path, None)
+    state["enabled_units"] = [unit for unit in state["enabled_units"] if unit not in units]
+    if state == previous:
+        return False
+    state["applied"] = datetime.datetime.now().isoformat(timespec="seconds")
+    state["fingerprint"] = state_digest(state)
+    try:
+        atomic_write(path, json.dumps(state, indent=2, sort_keys=True), backup=False)
+    except OSError as e:
+        print(f"Aviso: não foi possível atualizar o estado aplicado em '{path}': {e}")
+        return False
+    return True
+
+
+def enabled_unit_names(systemd_dir=SYSTEMD_SYSTEM_DIR):
+    """
+    Unidades habilitadas, lidas dos links em *.wants/ e *.requires/, sem chamar o systemctl.
+    """
+    names = set()
+    try:
+        entries = os.scandir(systemd_dir)
+    except OSError:
+        return names
+    with entries:
+        for entry in entries:
+            if entry.name.endswith((".wants", ".requires")) and entry.is_dir():
+                names.update(os.listdir(entry.path))
+    return names
+
+
+def check_drift(state, sysctl_root=PROC_SYS, systemd_dir=SYSTEMD_SYSTEM_DIR, cgroup_root=CGROUP_ROOT):
+    """
+    Compara o sistema com o estado salvo em uma única passada, sem criar processos.
+
+    Returns:
+        list: Descrição de cada desvio encontrado (vazia se não houver desvios).
+    """
+    drift = []
+    enabled = enabled_unit_names(systemd_dir)
+    # Com o daemon habilitado, os parâmetros que ele ajusta em tempo real mudam de propósito.
+    dynamic = set(DAEMON_DEFAULTS["knobs"]) if DAEMON_UNIT_NAME in enabled else set()
+
+    current = read_sysctl_values(list(state.get("sysctl", {})), sysctl_root)
+    for param, value in state.get("sysctl", {}).items():
+        if param in dynamic:
+            continue
+        if current.get(param) != value:
+            drift.append(f"sysctl {param}: esperado '{value}', atual '{current.get(param, '?')}'")
+
+    for path, value in state.get("sysfs", {}).items():
+        actual = read_sysfs_value(path)
+        if actual is None or (actual != value and f"[{value}]" not in actual.split()):
+            drift.append(f"sysfs {path}: esperado '{value}', atual '{actual}'")
+
+    for path, expected in state.get("files", {}).items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            drift.append(f"arquivo {path}: removido")
+            continue
+        if stat.st_size == expected["size"] and stat.st_mtime_ns == expected["mtime_ns"]:
+            continue
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None or fingerprint["sha256"] != expected["sha256"]:
+            drift.append(f"arquivo {path}: conteúdo alterado")
+
+    if state.get("disabled_units") or state.get("enabled_units"):
+        running_dir = os.path.join(cgroup_root, "system.slice")
+        for unit in state.get("disabled_units", []):
+            if unit in enabled:
+                drift.append(f"serviço {unit}: habilitado novamente")
+            elif os.path.isdir(os.path.join(running_dir, unit)):
+                drift.append(f"serviço {unit}: em execução")
+        for unit in state.get("enabled_units", []):
+            if unit not in enabled:
+                drift.append(f"serviço {unit}: não está mais habilitado")
+    return drift
+
+
+def process_elapsed_ms():
+    """
+    Tempo desde o início do processo (incluindo a inicialização do interpretador), lido de
+    /proc/self/stat. A resolução é de um tick do kernel (normalmente 10 ms).
+
+    Returns:
+        float ou None: Milissegundos desde o início do processo, ou None se não for possível ler.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # O campo 2 (comm) pode conter espaços; os demais vêm depois do último ')'.
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(time.clock_gettime(time.CLOCK_BOOTTIME) - started, 0.0) * 1000
+
+
+def check_command(args):
+    state = load_state(args.state)
+    if state is None:
+        print(f"Nenhum estado aplicado encontrado em '{args.state}'. Aplique um perfil primeiro.")
+        return 2
+
+    drift = check_drift(state)
+    elapsed_ms = process_elapsed_ms()
+    if not drift:
+        if not args.quiet:
+            elapsed = f", {elapsed_ms:.0f} ms desde o início do processo" if elapsed_ms is not None else ""
+            print(f"OK: sem desvios (estado {state.get('fingerprint')}, aplicado em {state.get('applied')}"
+                  f"{elapsed}).")
+        return 0
+    print(f"DESVIO: {len(drift)} item(ns) diferente(s) do estado {state.get('fingerprint')} "
+          f"aplicado em {state.get('applied')}:")
+    for item in drift:
+        print(f"  - {item}")
+    return 1
+
+
+def render_check_units(interval="15min"):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    service = "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: verificação de desvios de configuração",
+        "",
+        "[Service]",
+        "Type=oneshot",
+        f"WorkingDirectory={directory}",
+        # Com -m o Python reaproveita o bytecode em __pycache__ em vez de recompilar o script.
+        f"ExecStart={sys.executable} -m optimizer check --quiet",
+        "",
+    ])
+    timer = "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: verificação periódica de desvios",
+        "",
+        "[Timer]",
+        f"OnBootSec={interval}",
+        f"OnUnitActiveSec={interval}",
+        "",
+        "[Install]",
+        "WantedBy=timers.target",
+        "",
+    ])
+    return service, timer
+
+
+def install_check_timer(interval):
+    service, timer = render_check_units(interval)
+    plan = new_plan("check_timer")
+    plan_write(plan, os.path.join(SYSTEMD_SYSTEM_DIR, f"{CHECK_TIMER_NAME}.service"), service)
+    plan_write(plan, os.path.join(SYSTEMD_SYSTEM_DIR, f"{CHECK_TIMER_NAME}.timer"), timer)
+    if plan["files"]:
+        plan_command(plan, ["systemctl", "daemon-reload"])
+        plan_command(plan, ["systemctl", "enable", "--now", f"{CHECK_TIMER_NAME}.timer"])
+    plan["desired"]["enabled_units"].append(f"{CHECK_TIMER_NAME}.timer")
+    return apply_plan(plan)
+
+
+PROFILE_SECTIONS = (
+    "sysctl", "grub", "fstab", "services", "zram", "block", "cpu", "memory", "network", "daemon",
+)
+
+
+def load_profile(path):
+    try:
+        if path.endswith(".toml"):
+            try:
+                import tomllib
+            except ImportError:
+                print("Perfis TOML exigem Python 3.11 ou superior. Use um perfil JSON.")
+                return None
+            with open(path, 'rb') as f:
+                profile = tomllib.load(f)
+        else:
+            with open(path, 'r') as f:
+                profile = json.load(f)
+    except (IOError, ValueError) as e:
+        print(f"Erro ao ler o perfil '{path}': {e}")
+        return None
+
+    if not isinstance(profile, dict):
+        print(f"Perfil inválido em '{path}': era esperado um objeto com seções.")
+        return None
+
+    for section in profile:
+        if section not in PROFILE_SECTIONS:
+            print(f"Aviso: seção desconhecida '{section}' no perfil será ignorada.")
+    return profile
+
+
+def new_plan(name="profile"):
+    """
+    Um plano acumula tudo que um perfil precisa alterar antes de tocar no sistema,
+    para que cada arquivo seja escrito e cada comando de recarga executado uma única vez.
+    O nome identifica o ajuste nos eventos e nas métricas.
+    """
+    return {
+        "name": name,
+        "files": {}, "originals": {}, "sysctl": {}, "sysfs": {}, "commands": [], "changes": [],
+        # Verificações (função, argumentos) executadas antes de qualquer escrita; podem ajustar o plano.
+        "preflight": [],
+        # Comandos que não podem rodar em uma imagem (--root) e ficam para o primeiro boot.
+        "pending": [],
+        "desired": {"sysctl": {}, "sysfs": {}, "files": [], "disabled_units": [], "enabled_units": []},
+    }
+
+
+def plan_read(plan, path):
+    if path in plan["files"]:
+        return plan["files"][path]
+    if path not in plan["originals"]:
+        try:
+            with open(target_path(path), 'r') as f:
+                plan["originals"][path] = f.read()
+        except FileNotFoundError:
+            plan["originals"][path] = None
+    return plan["originals"][path]
+
+
+def plan_write(plan, path, content):
+    if path not in plan["desired"]["files"]:
+        plan["desired"]["files"].append(path)
+    if path not in plan["originals"]:
+        plan_read(plan, path)
+    if content == plan["originals"].get(path):
+        plan["files"].pop(path, None)
+    else:
+        plan["files"][path] = content
+
+
+def plan_command(plan, command):
+    if command not in plan["commands"]:
+        plan["commands"].append(command)
+
+
+def plan_sysctl(plan, settings):
+    values = {param: normalize_sysctl_value(value) for param, value in settings.items()}
+    dropin = plan_read(plan, SYSCTL_DROPIN)
+    plan_write(plan, SYSCTL_DROPIN, render_sysctl_dropin(dropin, values))
+
+    conf = plan_read(plan, SYSCTL_CONF)
+    conflicts = conflicting_sysctl_conf_values(conf, values)
+    if conflicts:
+        new_lines, _ = update_sysctl_lines(conf.splitlines(True), conflicts, append=False)
+        plan_write(plan, SYSCTL_CONF, "".join(new_lines))
+
+    plan["desired"]["sysctl"].update(values)
+    if offline_mode():
+        # Os valores em /proc são os deste host; na imagem vale só o que fica persistido.
+        if SYSCTL_DROPIN in plan["files"]:
+            plan["changes"].extend(f"sysctl: {param} = {value} (no boot)" for param, value in values.items())
+        return
+    current = read_sysctl_values(list(values))
+    for param, value in values.items():
+        if current.get(param) != value:
+            plan["sysctl"][param] = value
+            plan["changes"].append(f"sysctl: {param} {current.get(param, '?')} -> {value}")
+
+
+def plan_grub(plan, settings):
+    content = plan_read(plan, GRUB_DEFAULT)
+    if content is None:
+        print(f"Aviso: '{GRUB_DEFAULT}' não encontrado. Seção 'grub' ignorada.")
+        return
+
+    try:
+        profile_add, profile_remove = cmdline_profile_args(
+            settings.get("cmdline_profile", []), settings.get("mitigations_off", False)
+        )
+    except ValueError as e:
+        print(f"Aviso: {e}. Seção 'grub' ignorada.")
+        return
+
+    new_content = content
+    if "timeout" in settings:
+        new_content = set_grub_timeout(new_content, int(settings["timeout"]))
+    new_content = edit_grub_cmdline(
+        new_content,
+        add_args=profile_add + list(settings.get("add_args", [])),
+        remove_args=profile_remove + list(settings.get("remove_args", [])),
+    )
+    plan_write(plan, GRUB_DEFAULT, new_content)
+    if GRUB_DEFAULT in plan["files"]:
+        plan["changes"].append("grub: configuração de boot atualizada")
+
+    dropins = read_grub_dropins(target_path(GRUB_DEFAULT_DIR))
+    print_grub_overrides(dropins)
+    # O grub.cfg é regenerado também quando está desatualizado em relação a um
+    # /etc/default/grub que não mudou agora, e nunca quando já corresponde a ele.
+    if grub_update_needed(effective_grub_defaults(new_content, dropins), read_text_file(target_path(GRUB_CFG))):
+        plan_command(plan, ["update-grub"])
+    elif GRUB_DEFAULT in plan["files"]:
+        plan["changes"].append(f"grub: '{GRUB_CFG}' já corresponde; 'update-grub' dispensado")
+
+
+def plan_fstab(plan, settings):
+    noatime = settings.get("noatime", False)
+    if not noatime:
+        return
+    content = plan_read(plan, FSTAB)
+    if content is None:
+        print(f"Aviso: '{FSTAB}' não encontrado. Seção 'fstab' ignorada.")
+        return
+
+    mountpoints = None if noatime is True else list(noatime)
+    exclude = tuple(settings.get("exclude", ("/boot", "/boot/efi")))
+    new_lines, changed = apply_noatime_to_fstab(content.splitlines(True), mountpoints, exclude)
+    plan_write(plan, FSTAB, "".join(new_lines))
+    for mountpoint in changed:
+        plan["changes"].append(f"fstab: 'noatime' em '{mountpoint}'")
+
+
+def parse_systemctl_show(output):
+    units = []
+    current = {}
+    for line in output.splitlines():
+        if not line.strip():
+            if current:
+                units.append(current)
+                current = {}
+            continue
+        key, _, value = line.partition("=")
+        current[key] = value
+    if current:
+        units.append(current)
+    return units
+
+
+def offline_unit_state(name):
+    """
+    Estado de uma unidade na imagem em _target_root, lido dos arquivos de unidade e dos links
+    em *.wants/, já que não há um systemd rodando nela para responder ao 'systemctl show'.
+    """
+    if name in enabled_unit_names(target_path(SYSTEMD_SYSTEM_DIR)):
+        file_state = "enabled"
+    else:
+        file_state = "disabled"
+    for directory in UNIT_FILE_DIRS:
+        path = target_path(os.path.join(directory, name))
+        # Como no systemd, um link para /dev/null ou um arquivo vazio mascara a unidade.
+        if os.path.islink(path) and os.readlink(path) == "/dev/null" or os.path.isfile(path) and os.path.getsize(path) == 0:
+            return {"Id": name, "LoadState": "masked", "UnitFileState": "masked", "ActiveState": "inactive"}
+        if os.path.lexists(path):
+            return {"Id": name, "LoadState": "loaded", "UnitFileState": file_state, "ActiveState": "inactive"}
+    return {"Id": name, "LoadState": "not-found", "UnitFileState": "", "ActiveState": "inactive"}
+
+
+def read_unit_states(names):
+    """
+    Returns:
+        dict: Nome da unidade -> propriedades Id, LoadState, UnitFileState e ActiveState.
+    """
+    if offline_mode():
+        return {name: offline_unit_state(name) for name in names}
+    output = run_command(
+        ["systemctl", "show", "--property=Id,LoadState,UnitFileState,ActiveState", *names],
+        check=False, show_output=False,
+    )
+    return dict(zip(names, parse_systemctl_show(output or "")))
+
+
+def plan_services(plan, settings):
+    names = [n if "." in n else f"{n}.service" for n in settings.get("disable", [])]
+    if not names:
+        return
+
+    to_disable = []
+    for name, unit in read_unit_states(names).items():
+        if unit.get("LoadState") == "not-found":
+            print(f"Aviso: serviço '{name}' não encontrado. Ignorando.")
+            continue
+        plan["desired"]["disabled_units"].append(name)
+        if unit.get("UnitFileState") == "enabled" or unit.get("ActiveState") == "active":
+            to_disable.append(name)
+            plan["changes"].append(f"serviço: desabilitar e parar '{name}'")
+    if to_disable:
+        plan_command(plan, ["systemctl", "disable", "--now", *to_disable])
+
+
+def plan_zram_engine(plan, settings):
+    existing = plan_read(plan, ZRAM_UNIT)
+    previous = parse_zram_unit(existing)
+    algorithm = settings.get("algorithm", "auto")
+    ratio = settings.get("ratio")
+
+    if algorithm == "auto" and previous:
+        algorithm, ratio = previous["algorithm"], ratio or previous["ratio"]
+    elif algorithm == "auto":
+        results = benchmark_available_zram()
+        if not results:
+            print("Aviso: nenhum algoritmo de compressão pôde ser testado. Seção 'zram' ignorada.")
+            return
+        best, reason = choose_zram_algorithm(results)
+        algorithm, ratio = best["algorithm"], ratio or best["ratio"]
+        plan["changes"].append(f"zram: algoritmo '{algorithm}' ({reason})")
+    elif ratio is None and previous and previous["algorithm"] == algorithm:
+        ratio = previous["ratio"]
+
+    # Os dois valores vão para a unidade executada como root em todo boot: só aceita o que o
+    # kernel lista e um dispositivo de bloco que existe agora.
+    available = kernel_zram_algorithms()
+    if algorithm not in available:
+        print(f"Aviso: o kernel não oferece o algoritmo '{algorithm}' para o zram "
+              f"(disponíveis: {', '.join(available) or 'nenhum'}). Seção 'zram' ignorada.")
+        return
+    writeback_device = settings.get("writeback_device")
+    if writeback_device and not is_block_device(writeback_device):
+        print(f"Aviso: '{writeback_device}' não é um dispositivo de bloco. Seção 'zram' ignorada.")
+        return
+
+    mem_total = read_key_value_file(os.path.join(PROC_ROOT, "meminfo"), ("MemTotal",)).get("MemTotal", 0) * 1024
+    disksize = size_zram_device(mem_total, ratio or ZRAM_DEFAULT_RATIO, settings.get("percent", 50))
+    priority = settings.get("priority") or zram_swap_priority(read_swap_devices())
+    unit = render_zram_unit(algorithm, disksize, priority, ratio or ZRAM_DEFAULT_RATIO,
+                            settings.get("writeback_device"))
+    plan_write(plan, ZRAM_UNIT, unit)
+
+    states = read_unit_states([*ZRAM_COMPETING_UNITS, ZRAM_UNIT_NAME])
+    plan["desired"]["enabled_units"].append(ZRAM_UNIT_NAME)
+    plan["desired"]["disabled_units"].extend(
+        name for name in ZRAM_COMPETING_UNITS if states.get(name, {}).get("LoadState") == "loaded"
+    )
+    competing = [
+        name for name in ZRAM_COMPETING_UNITS
+        if states.get(name, {}).get("UnitFileState") == "enabled" or states.get(name, {}).get("ActiveState") == "active"
+    ]
+    if competing:
+        plan["changes"].append(f"zram: desabilitar {', '.join(competing)}, que também configuram o zram")
+        plan_command(plan, ["systemctl", "disable", "--now", *competing])
+
+    plan_zram_writeback(plan, settings)
+
+    if ZRAM_UNIT in plan["files"]:
+        plan["changes"].append(
+            f"zram: {format_bytes(disksize)} com '{algorithm}', prioridade {priority}"
+            + (f", writeback em {settings['writeback_device']}" if settings.get("writeback_device") else "")
+        )
+        plan_command(plan, ["systemctl", "daemon-reload"])
+        plan_command(plan, ["systemctl", "enable", ZRAM_UNIT_NAME])
+        plan_command(plan, ["systemctl", "restart", ZRAM_UNIT_NAME])
+    elif states.get(ZRAM_UNIT_NAME, {}).get("ActiveState") != "active":
+        plan["changes"].append(f"zram: ativar '{ZRAM_UNIT_NAME}'")
+        plan_command(plan, ["systemctl", "enable", "--now", ZRAM_UNIT_NAME])
+
+
+def plan_zram_writeback(plan, settings):
+    service_path = os.path.join(SYSTEMD_SYSTEM_DIR, f"{ZRAM_WRITEBACK_NAME}.service")
+    timer_path = os.path.join(SYSTEMD_SYSTEM_DIR, f"{ZRAM_WRITEBACK_NAME}.timer")
+    timer_name = f"{ZRAM_WRITEBACK_NAME}.timer"
+    if not settings.get("writeback_device"):
+        if plan_read(plan, timer_path) is not None:
+            plan["changes"].append("zram: desabilitar o writeback periódico")
+            plan_command(plan, ["systemctl", "disable", "--now", timer_name])
+            plan["desired"]["disabled_units"].append(timer_name)
+        return
+
+    interval = settings.get("writeback_interval", "1h")
+    service, timer = render_zram_writeback_units(interval)
+    plan_write(plan, service_path, service)
+    plan_write(plan, timer_path, timer)
+    plan["desired"]["enabled_units"].append(timer_name)
+    if service_path in plan["files"] or timer_path in plan["files"]:
+        plan["changes"].append(f"zram: writeback das páginas ociosas a cada {interval}")
+        plan_command(plan, ["systemctl", "daemon-reload"])
+        plan_command(plan, ["systemctl", "enable", "--now", timer_name])
+
+
+def plan_zram(plan, settings):
+    if not settings.get("enabled", True):
+        return
+    if offline_mode():
+        print("Aviso: o zram depende da RAM e das CPUs da máquina final. Seção 'zram' ignorada na imagem.")
+        return
+    if any(key in settings for key in ("algorithm", "percent", "priority", "writeback_device", "writeback_interval")):
+        plan_zram_engine(plan, settings)
+        return
+
+    pkg_status = run_command(
+        ["dpkg-query", "-W", "-f=${Status}", "zram-config"], check=False, show_output=False
+    )
+    if "install ok installed" not in (pkg_status or ""):
+        plan["changes"].append("zram: instalar 'zram-config'")
+        plan_command(plan, ["apt", "update", "-y"])
+        plan_command(plan, ["apt", "install", "zram-config", "-y"])
+
+    zram_status = run_command(["systemctl", "is-active", "zram-swap"], check=False, show_output=False)
+    if zram_status != "active":
+        plan["changes"].append("zram: ativar e habilitar 'zram-swap'")
+        plan_command(plan, ["systemctl", "enable", "--now", "zram-swap"])
+
+
+PROFILE_PLANNERS = (
+    ("sysctl", plan_sysctl),
+    ("grub", plan_grub),
+    ("fstab", plan_fstab),
+    ("services", plan_services),
+    ("zram", plan_zram),
+    ("block", plan_block),
+    ("cpu", plan_cpu),
+    ("memory", plan_memory),
+    ("network", plan_network),
+)
+
+
+def build_plan(profile, name="profile"):
+    plan = new_plan(name)
+    for section, planner in PROFILE_PLANNERS:
+        if section in profile:
+            planner(plan, profile[section])
+    return plan
+
+
+def offline_command(command, root):
+    """
+    Traduz um comando do plano para uma imagem montada em 'root'. Habilitar e desabilitar
+    unidades vira 'systemctl --root', sem '--now'; recargas e reinícios não têm efeito em uma
+    imagem e são descartados, já que o boot aplica os arquivos persistidos.
+
+    Returns:
+        list: O comando traduzido, ou None se ele deve ser descartado.
+    """
+    if command[0] != "systemctl":
+        return None
+    args = [arg for arg in command[1:] if arg != "--now"]
+    if args and args[0] in ("enable", "disable", "mask", "unmask"):
+        return ["systemctl", f"--root={root}", *args]
+    return None
+
+
+def offline_plan(plan, root):
+    """
+    Adapta um plano para uma imagem: sem escritas em /proc e /sys, que descreveriam este host,
+    e com os comandos traduzidos por offline_command ou deixados como pendentes.
+    """
+    plan["sysctl"].clear()
+    plan["sysfs"].clear()
+    commands = []
+    for command in plan["commands"]:
+        if command[0] in OFFLINE_PENDING_COMMANDS:
+            if command not in plan["pending"]:
+                plan["pending"].append(command)
+            continue
+        translated = offline_command(command, root)
+        if translated and translated not in commands:
+            commands.append(translated)
+    plan["commands"] = commands
+
+
+def apply_plan(plan, dry_run=False):
+    if offline_mode():
+        offline_plan(plan, _target_root)
+    if not any(plan[key] for key in ("files", "sysctl", "sysfs", "commands", "preflight", "pending")):
+        print("O sistema já está de acordo com o perfil. Nada a fazer.")
+        # Só grava o estado se ele ainda não registrar este perfil (ex.: sistema ajustado à mão).
+        if not dry_run:
+            record_applied_state(**plan["desired"])
+        return True
+
+    print("\n--- Alterações planejadas ---")
+    for change in plan["changes"]:
+        print(f"  - {change}")
+    for path in plan["files"]:
+        print(f"  * escrever '{path}'")
+    for command in plan["commands"]:
+        print(f"  $ {' '.join(command)}")
+    for command in plan["pending"]:
+        print(f"  ! pendente no primeiro boot: {' '.join(command)}")
+
+    if dry_run:
+        print("\nModo de simulação: nenhuma alteração foi aplicada.")
+        return True
+
+    with tweak_step(plan["name"]) as step:
+        step["success"] = execute_plan(plan)
+    print("\nPerfil aplicado com sucesso." if step["success"] else "\nPerfil aplicado com erros. Verifique as mensagens acima.")
+    return step["success"]
+
+
+def execute_plan(plan):
+    success = True
+    for check, args in plan["preflight"]:
+        success = check(plan, *args) and success
+
+    for path, content in plan["files"].items():
+        try:
+            atomic_write(target_path(path), content)
+            print(f"Arquivo '{path}' atualizado.")
+        except IOError as e:
+            print(f"Erro ao escrever em '{path}': {e}")
+            success = False
+
+    if plan["sysctl"]:
+        changed = write_sysctl_values(plan["sysctl"])
+        for param in changed:
+            print(f"'{param}' aplicado como '{plan['sysctl'][param]}'.")
+        if len(changed) != len(plan["sysctl"]):
+            success = False
+
+    if plan["sysfs"]:
+        changed = write_sysfs_values(plan["sysfs"])
+        for path in changed:
+            print(f"'{path}' ajustado para '{plan['sysfs'][path]}'.")
+        if len(changed) != len(plan["sysfs"]):
+            success = False
+
+    for command in plan["commands"]:
+        print(f"\nExecutando '{' '.join(command)}'...")
+        if run_command(command) is None:
+            print(f"Falha ao executar '{' '.join(command)}'.")
+            success = False
+
+    if success:
+        record_applied_state(**plan["desired"])
+    return success
+
+
+def apply_profile(path, dry_run=False):
+    profile = load_profile(path)
+    if profile is None:
+        return False
+    return apply_plan(build_plan(profile), dry_run=dry_run)
+
+
+def tune_image(root, profile, dry_run=False):
+    """
+    Aplica um perfil já carregado ao sistema de arquivos montado em 'root'. Roda em um processo
+    do pool de apply_profile_to_roots, então trocar _target_root não afeta as outras imagens.
+
+    Returns:
+        dict: Relatório da imagem (sucesso, alterações, arquivos, comandos, pendências e saída).
+    """
+    global _target_root
+    _target_root = root
+    # Cada imagem tem sua própria execução de backup, mesmo quando o processo é reaproveitado.
+    begin_backup_run("image")
+    start = time.monotonic()
+    plan = new_plan()
+    success = False
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            plan = build_plan(profile)
+            success = apply_plan(plan, dry_run=dry_run)
+        except Exception as e:
+            print(f"Ocorreu um erro inesperado ao ajustar a imagem: {e}")
+    return {
+        "root": root,
+        "success": success,
+        "dry_run": dry_run,
+        "duration": round(time.monotonic() - start, 3),
+        "changes": plan["changes"],
+        "files": list(plan["files"]),
+        "commands": plan["commands"],
+        "pending": plan["pending"],
+        "output": output.getvalue(),
+    }
+
+
+def image_report_path(report_dir, root):
+    return os.path.join(report_dir, (root.strip("/").replace("/", "_") or "root") + ".json")
+
+
+def apply_profile_to_roots(path, roots, dry_run=False, jobs=None, report_dir=None):
+    """
+    Aplica um perfil a várias imagens montadas (rootfs ou chroot) em paralelo, uma por processo,
+    e imprime um relatório por imagem à medida que terminam.
+
+        roots (list): Diretórios raiz das imagens.
+        jobs (int): Processos simultâneos; por padrão, um por CPU.
+        report_dir (str): Se informado, salva o relatório JSON de cada imagem neste diretório.
+    """
+    import concurrent.futures
+    profile = load_profile(path)
+    if profile is None:
+        return False
+    roots = [os.path.abspath(root) for root in roots]
+    for root in roots:
+        if root == "/":
+            print("Erro: para ajustar o sistema em execução, use o perfil sem --root.")
+            return False
+        if not os.path.isdir(os.path.join(root, "etc")):
+            print(f"Erro: '{root}' não parece a raiz de um sistema (não há '{os.path.join(root, 'etc')}').")
+            return False
+
+    succeeded = 0
+    workers = min(len(roots), jobs or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(tune_image, root, profile, dry_run): root for root in roots}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {"root": futures[future], "success": False, "duration": 0.0,
+                          "output": f"Falha no processo que ajustava a imagem: {e}\n"}
+            succeeded += report["success"]
+            print(f"\n=== {report['root']}: {'OK' if report['success'] else 'FALHOU'} "
+                  f"em {report['duration']:.2f}s ===")
+            print(report["output"].rstrip())
+            if report_dir:
+                report_path = image_report_path(report_dir, report["root"])
+                try:
+                    atomic_write(report_path, json.dumps(report, indent=2, sort_keys=True), backup=False)
+                except OSError as e:
+                    print(f"Aviso: não foi possível salvar o relatório em '{report_path}': {e}")
+
+    print(f"\n{succeeded} de {len(roots)} imagem(ns) ajustada(s) com sucesso.")
+    return succeeded == len(roots)
+
+
+BENCH_METRICS = (
+    ("psi_memory_some", "Stall de memória (PSI some, %)"),
+    ("psi_io_some", "Stall de I/O (PSI some, %)"),
+    ("swapin_rate", "Páginas lidas da swap (/s)"),
+    ("swapout_rate", "Páginas gravadas na swap (/s)"),
+    ("majfault_rate", "Falhas de página maiores (/s)"),
+    ("disk_write_ops", "Escritas em disco (ops/s)"),
+    ("disk_write_kb", "Escritas em disco (KB/s)"),
+)
+
+# Valores críticos bicaudais da distribuição t de Student para 95%, por graus de liberdade.
+T_CRITICAL_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+    10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}
+
+
+def t_critical_95(df):
+    """
+    Valor crítico t bicaudal de 95%. Entre os graus de liberdade tabelados, interpola em 1/df,
+    em que a curva é quase linear; graus fracionários (Welch) são aceitos diretamente.
+
+    >>> exact = {1: 12.706, 11: 2.201, 13: 2.160, 50: 2.009, 80: 1.990, 1000: 1.962}
+    >>> all(abs(t_critical_95(df) - value) < 0.002 for df, value in exact.items())
+    True
+    """
+    if df < 1:
+        return float("inf")
+    # Acima da tabela, o limite é o quantil da normal (1/df = 0).
+    points = sorted(T_CRITICAL_95.items()) + [(math.inf, 1.960)]
+    for (low, low_value), (high, high_value) in zip(points, points[1:]):
+        if df <= high:
+            fraction = (1 / low - 1 / df) / (1 / low - 1 / high)
+            return low_value + (high_value - low_value) * fraction
+    return 1.960
+
+
+def whole_disks(sysfs_root=SYSFS_ROOT):
+    try:
+        names = os.listdir(os.path.join(sysfs_root, "block"))
+    except OSError:
+        return None
+    return {n for n in names if not n.startswith(("loop", "ram", "zram", "dm-", "sr"))}
+
+
+def read_diskstats(proc_root=PROC_ROOT, disks=None):
+    writes = sectors = 0
+    try:
+        with open(os.path.join(proc_root, "diskstats"), 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 10 or (disks is not None and parts[2] not in disks):
+                    continue
+                writes += int(parts[7])
+                sectors += int(parts[9])
+    except OSError:
+        pass
+    return {"writes": writes, "sectors_written": sectors}
+
+
+def collect_bench_sample(proc_root=PROC_ROOT, sysfs_root=SYSFS_ROOT):
+    return {
+        "time": time.monotonic(),
+        "vmstat": read_key_value_file(os.path.join(proc_root, "vmstat"), VMSTAT_FIELDS),
+        "psi_memory": read_pressure("memory", proc_root),
+        "psi_io": read_pressure("io", proc_root),
+        "diskstats": read_diskstats(proc_root, whole_disks(sysfs_root)),
+    }
+
+
+def bench_interval_metrics(first, second):
+    elapsed = max(second["time"] - first["time"], 1e-6)
+
+    def rate(a, b):
+        return max(b - a, 0) / elapsed
+
+    def stall(key):
+        if not first[key] or not second[key]:
+            return None
+        return rate(first[key]["some"]["total"], second[key]["some"]["total"]) / 1e6 * 100
+
+    return {
+        "psi_memory_some": stall("psi_memory"),
+        "psi_io_some": stall("psi_io"),
+        "swapin_rate": rate(first["vmstat"].get("pswpin", 0), second["vmstat"].get("pswpin", 0)),
+        "swapout_rate": rate(first["vmstat"].get("pswpout", 0), second["vmstat"].get("pswpout", 0)),
+        "majfault_rate": rate(first["vmstat"].get("pgmajfault", 0), second["vmstat"].get("pgmajfault", 0)),
+        "disk_write_ops": rate(first["diskstats"]["writes"], second["diskstats"]["writes"]),
+        "disk_write_kb": rate(first["diskstats"]["sectors_written"], second["diskstats"]["sectors_written"]) / 2,
+    }
+
+
+def measure_bench_metrics(duration=30, interval=1.0, proc_root=PROC_ROOT, sysfs_root=SYSFS_ROOT):
+    """
+    Mede as métricas do benchmark em intervalos; cada intervalo vira uma observação,
+    o que permite calcular intervalos de confiança.
+    """
+    observations = {key: [] for key, _ in BENCH_METRICS}
+    previous = collect_bench_sample(proc_root, sysfs_root)
+    deadline = previous["time"] + duration
+    while time.monotonic() < deadline:
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        current = collect_bench_sample(proc_root, sysfs_root)
+        for key, value in bench_interval_metrics(previous, current).items():
+            if value is not None:
+                observations[key].append(value)
+        previous = current
+    return observations
+
+
+def parse_boot_time(output):
+    """
+    Extrai o tempo total de boot (em segundos) da saída de 'systemd-analyze'.
+    """
+    match = re.search(r'=\s*(.+?)\s*$', output.splitlines()[0]) if output else None
+    if not match:
+        return None
+    return parse_systemd_duration(match.group(1))
+
+
+def parse_systemd_duration(text):
+    units = {"h": 3600, "min": 60, "s": 1, "ms": 0.001, "us": 0.000001}
+    parts = re.findall(r'([\d.]+)\s*(h|min|ms|us|s)\b', text)
+    if not parts:
+        return None
+    return sum(float(value) * units[unit] for value, unit in parts)
+
+
+def read_boot_time():
+    output = run_command(["systemd-analyze"], check=False, show_output=False)
+    return parse_boot_time(output)
+
+
+def summarize_observations(values):
+    import statistics
+    n = len(values)
+    if n == 0:
+        return {"n": 0, "mean": None, "stdev": None, "ci95": None}
+    mean = statistics.fmean(values)
+    stdev = statistics.stdev(values) if n > 1 else 0.0
+    ci95 = t_critical_95(n - 1) * stdev / math.sqrt(n) if n > 1 else None
+    return {"n": n, "mean": mean, "stdev": stdev, "ci95": ci95}
+
+
+def compare_observations(before, after):
+    """
+    Diferença entre as médias (depois - antes) com intervalo de confiança de 95% (Welch).
+    Para todas as métricas do benchmark, valores menores são melhores.
+    """
+    a, b = summarize_observations(before), summarize_observations(after)
+    if a["n"] < 2 or b["n"] < 2:
+        return {"before": a["mean"], "after": b["mean"], "diff": None, "ci_low": None, "ci_high": None,
+                "verdict": "amostras insuficientes"}
+
+    va, vb = a["stdev"] ** 2 / a["n"], b["stdev"] ** 2 / b["n"]
+    diff = b["mean"] - a["mean"]
+    se = math.sqrt(va + vb)
+    if se == 0:
+        half = 0.0
+    else:
+        df = (va + vb) ** 2 / ((va ** 2 / (a["n"] - 1)) + (vb ** 2 / (b["n"] - 1)))
+        half = t_critical_95(df) * se
+
+    low, high = diff - half, diff + half
+    if high < 0:
+        verdict = "melhor"
+    elif low > 0:
+        verdict = "PIOR"
+    else:
+        verdict = "sem diferença significativa"
+    return {"before": a["mean"], "after": b["mean"], "diff": diff, "ci_low": low, "ci_high": high,
+            "verdict": verdict}
+
+
+def compare_bench_results(before, after):
+    return {key: compare_observations(before.get(key, []), after.get(key, [])) for key, _ in BENCH_METRICS}
+
+
+def print_bench_comparison(comparison, before_label="Antes", after_label="Depois"):
+    print(f"\n{'Métrica':<34} {before_label:>10} {after_label:>10}   {'Diferença (IC 95%)':<30} Resultado")
+    for key, label in BENCH_METRICS:
+        c = comparison[key]
+        if c["diff"] is None:
+            print(f"{label:<34} {'-':>10} {'-':>10}   {'-':<30} {c['verdict']}")
+            continue
+        interval = f"{c['diff']:+.2f} [{c['ci_low']:+.2f}, {c['ci_high']:+.2f}]"
+        print(f"{label:<34} {c['before']:>10.2f} {c['after']:>10.2f}   {interval:<30} {c['verdict']}")
+
+
+def bench_metadata():
+    uname = os.uname()
+    return {
+        "host": uname.nodename,
+        "kernel": uname.release,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "boot_time": read_boot_time(),
+    }
+
+
+def run_bench(profile, duration=30, interval=1.0, settle=5, output=None, label=None):
+    result = {"version": 1, "label": label, "profile": profile, **bench_metadata()}
+
+    print(f"Medindo a linha de base por {duration} segundos...")
+    result["before"] = measure_bench_metrics(duration, interval)
+
+    if not apply_plan(build_plan(profile)):
+        print("Aviso: o perfil foi aplicado com erros; os resultados podem não ser representativos.")
+    if settle:
+        print(f"Aguardando {settle} segundos para o sistema se estabilizar...")
+        time.sleep(settle)
+
+    print(f"Medindo novamente por {duration} segundos...")
+    result["after"] = measure_bench_metrics(duration, interval)
+    result["comparison"] = compare_bench_results(result["before"], result["after"])
+    print_bench_comparison(result["comparison"])
+    if result["boot_time"] is not None:
+        print(f"\nTempo de boot atual: {result['boot_time']:.2f}s (compare entre reinicializações com 'bench --compare').")
+
+    if output is None:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(BENCH_DIR, f"bench_{timestamp}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultados salvos em '{output}'.")
+
+    worse = [key for key, c in result["comparison"].items() if c["verdict"] == "PIOR"]
+    if worse:
+        print(f"ATENÇÃO: o perfil piorou as métricas: {', '.join(worse)}.")
+    return not worse
+
+
+def compare_bench_files(first_path, second_path):
+    """
+    Compara as medições 'depois' de dois resultados salvos (outro host, outro kernel, outro boot).
+    """
+    try:
+        with open(first_path, 'r') as f:
+            first = json.load(f)
+        with open(second_path, 'r') as f:
+            second = json.load(f)
+    except (IOError, ValueError) as e:
+        print(f"Erro ao ler resultados do benchmark: {e}")
+        return False
+
+    for label, data in (("A", first), ("B", second)):
+        boot = f"{data['boot_time']:.2f}s" if data.get("boot_time") is not None else "?"
+        print(f"{label}: {data.get('host')} | kernel {data.get('kernel')} | {data.get('date')} | boot {boot}")
+    comparison = compare_bench_results(first["after"], second["after"])
+    print_bench_comparison(comparison, "A", "B")
+    return True
+
+
+def parse_sysctl_assignments(assignments):
+    values = {}
+    for assignment in assignments:
+        param, sep, value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"atribuição inválida '{assignment}', use parametro=valor")
+        values[param.strip()] = value.strip()
+    return values
+
+
+DAEMON_LEVELS = ("normal", "elevated", "high")
+DAEMON_DEFAULTS = {
+    # Gatilhos PSI: "<some|full> <stall em us> <janela em us>". Janelas múltiplas de 2s
+    # também são aceitas quando o processo não tem CAP_SYS_RESOURCE.
+    "triggers": {"memory": "some 200000 2000000", "io": "some 600000 2000000"},
+    # Limiares sobre o avg10 de memória (%): entra no nível em 'enter', só sai abaixo de 'exit'.
+    "levels": {"elevated": {"enter": 10.0, "exit": 5.0}, "high": {"enter": 30.0, "exit": 20.0}},
+    # Tempo mínimo em um nível antes de descer, para evitar oscilações.
+    "min_dwell": 30.0,
+    # Reavaliação periódica para descer de nível, já que os gatilhos só disparam na subida.
+    "recheck_interval": 10.0,
+    # Com I/O saturado, a swappiness é limitada a 'io_cap' para não disputar o disco com a swap.
+    "io_high": 40.0,
+    # 'normal' só é usado sem um valor de referência (ex.: --simulate); o daemon usa os valores
+    # encontrados ao iniciar, vindos do perfil, do autotune ou do zram, e só se afasta deles sob pressão.
+    "knobs": {
+        "vm.swappiness": {"normal": 10, "elevated": 60, "high": 100, "min": 0, "max": 200, "io_cap": 30},
+        "vm.vfs_cache_pressure": {"normal": 50, "elevated": 100, "high": 200, "min": 10, "max": 500},
+        "vm.watermark_scale_factor": {"normal": 10, "elevated": 50, "high": 200, "min": 10, "max": 1000},
+    },
+}
+
+
+def merge_daemon_config(overrides):
+    config = copy.deepcopy(DAEMON_DEFAULTS)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            for inner_key, inner_value in value.items():
+                if isinstance(inner_value, dict) and isinstance(config[key].get(inner_key), dict):
+                    config[key][inner_key].update(inner_value)
+                else:
+                    config[key][inner_key] = inner_value
+        else:
+            config[key] = value
+    return config
+
+
+def daemon_targets(level, io_pressure, config, baseline=None):
+    """
+    Valores de cada parâmetro no nível. Com 'baseline' (valores lidos ao iniciar), o nível normal
+    é o próprio baseline e os demais só o movem no sentido do nível: um valor de 'elevated'
+    abaixo de uma swappiness de 150 do zram não a reduz.
+    """
+    targets = {}
+    for param, knob in config["knobs"].items():
+        try:
+            base = int((baseline or {})[param])
+        except (KeyError, ValueError):
+            base = knob["normal"]
+        if level == "normal":
+            value = base
+        elif knob[level] >= knob["normal"]:
+            value = max(knob[level], base)
+        else:
+            value = min(knob[level], base)
+        # O limite por I/O só segura a subida; não desce abaixo do valor de referência.
+        if "io_cap" in knob and io_pressure >= config["io_high"]:
+            value = min(value, max(knob["io_cap"], base))
+        targets[param] = str(max(knob.get("min", value), min(knob.get("max", value), value)))
+    return targets
+
+
+def daemon_policy_step(state, pressure, now, config, baseline=None):
+    """
+    Um passo da política de controle, sem efeitos colaterais.
+
+        state (dict): {"level", "since"} do passo anterior.
+        pressure (dict): {"memory": avg10, "io": avg10} em %.
+        now (float): Instante atual em segundos.
+        baseline (dict): Valores de referência do nível normal; veja daemon_targets.
+    Returns:
+        tuple: (novo estado, valores desejados para cada parâmetro).
+    """
+    levels = config["levels"]
+    memory = pressure.get("memory", 0.0)
+    current = DAEMON_LEVELS.index(state["level"])
+
+    if memory >= levels["high"]["enter"]:
+        wanted = 2
+    elif memory >= levels["elevated"]["enter"]:
+        wanted = max(current, 1)
+    else:
+        wanted = current
+    if wanted == current and current > 0 and now - state["since"] >= config["min_dwell"]:
+        exit_level = DAEMON_LEVELS[current]
+        if memory < levels[exit_level]["exit"]:
+            wanted = current - 1
+
+    if wanted != current:
+        state = {"level": DAEMON_LEVELS[wanted], "since": now}
+    return state, daemon_targets(state["level"], pressure.get("io", 0.0), config, baseline)
+
+
+def simulate_daemon(feed, config=None):
+    """
+    Reproduz a política sobre uma sequência de leituras {"time", "memory", "io"} e
+    retorna apenas os instantes em que algum parâmetro mudaria.
+    """
+    config = merge_daemon_config(config)
+    state = {"level": "normal", "since": feed[0]["time"] if feed else 0.0}
+    applied = daemon_targets("normal", 0.0, config)
+    events = []
+    for reading in feed:
+        state, targets = daemon_policy_step(state, reading, reading["time"], config)
+        changes = {param: value for param, value in targets.items() if applied.get(param) != value}
+        if changes:
+            events.append({"time": reading["time"], "level": state["level"], "changes": changes})
+            applied.update(changes)
+    return events
+
+
+def log_daemon(message):
+    print(f"{datetime.datetime.now().isoformat(timespec='seconds')} {message}", flush=True)
+
+
+def read_pressure_avg10(proc_root=PROC_ROOT):
+    pressure = {}
+    for resource_name in ("memory", "io"):
+        data = read_pressure(resource_name, proc_root)
+        pressure[resource_name] = data["some"]["avg10"] if data else 0.0
+    return pressure
+
+
+def register_psi_triggers(epoll, triggers, proc_root=PROC_ROOT):
+    """
+    Registra os gatilhos PSI; o kernel sinaliza POLLPRI no descritor quando o stall ultrapassa o limite.
+    """
+    import select
+    fds = []
+    for resource_name, trigger in triggers.items():
+        path = os.path.join(proc_root, "pressure", resource_name)
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+            os.write(fd, trigger.encode() + b"\0")
+        except OSError as e:
+            log_daemon(f"Aviso: não foi possível registrar o gatilho PSI em '{path}': {e}")
+            continue
+        epoll.register(fd, select.EPOLLPRI)
+        fds.append(fd)
+    return fds
+
+
+async def run_daemon(config, proc_root=PROC_ROOT):
+    import asyncio
+    import resource
+    import select
+    import signal
+    loop = asyncio.get_running_loop()
+    baseline = read_sysctl_values(list(config["knobs"]))
+    state = {"level": "normal", "since": time.monotonic()}
+    # O nível normal é o que já estava aplicado: nada é escrito até haver pressão.
+    applied = dict(baseline)
+    wakeup = asyncio.Event()
+    stop = asyncio.Event()
+
+    def evaluate(reason):
+        nonlocal state
+        pressure = read_pressure_avg10(proc_root)
+        state, targets = daemon_policy_step(state, pressure, time.monotonic(), config, baseline)
+        changes = {param: value for param, value in targets.items() if applied.get(param) != value}
+        if not changes:
+            return
+        changed = write_sysctl_values(changes)
+        applied.update({param: changes[param] for param in changed})
+        if changed:
+            summary = ", ".join(f"{param}={changes[param]}" for param in changed)
+            log_daemon(f"nível {state['level']} ({reason}; memória {pressure['memory']:.1f}%, "
+                       f"I/O {pressure['io']:.1f}%): {summary}")
+
+    epoll = select.epoll()
+    fds = register_psi_triggers(epoll, config["triggers"], proc_root)
+    if not fds:
+        log_daemon("Nenhum gatilho PSI pôde ser registrado (o kernel precisa de CONFIG_PSI). Encerrando.")
+        epoll.close()
+        return False
+
+    def on_trigger():
+        epoll.poll(0)
+        wakeup.set()
+
+    loop.add_reader(epoll.fileno(), on_trigger)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    log_daemon(f"Daemon iniciado; gatilhos: {config['triggers']}.")
+
+    evaluate("início")
+    try:
+        while not stop.is_set():
+            waiters = [asyncio.ensure_future(wakeup.wait()), asyncio.ensure_future(stop.wait())]
+            done, pending = await asyncio.wait(
+                waiters, timeout=config["recheck_interval"], return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in pending:
+                task.cancel()
+            if stop.is_set():
+                break
+            evaluate("gatilho PSI" if wakeup.is_set() else "reavaliação")
+            wakeup.clear()
+    finally:
+        loop.remove_reader(epoll.fileno())
+        epoll.close()
+        for fd in fds:
+            os.close(fd)
+        restored = write_sysctl_values(baseline)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        log_daemon(
+            f"Daemon encerrado; {len(restored)} parâmetro(s) restaurado(s). Custo próprio: "
+            f"{usage.ru_utime + usage.ru_stime:.2f}s de CPU, {usage.ru_maxrss / 1024:.1f} MiB de RSS máximo."
+        )
+    return True
+
+
+def render_daemon_unit(profile_path=None):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    command = f"{sys.executable} -m optimizer daemon"
+    if profile_path:
+        command += f" --profile {os.path.abspath(profile_path)}"
+    return "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: ajuste dinâmico da memória virtual por pressão (PSI)",
+        "After=local-fs.target",
+        "",
+        "[Service]",
+        f"WorkingDirectory={directory}",
+        f"ExecStart={command}",
+        "Restart=on-failure",
+        "Nice=10",
+        "CPUWeight=10",
+        "MemoryMax=64M",
+        "",
+        "[Install]",
+        "WantedBy=multi-user.target",
+        "",
+    ])
+
+
+def daemon_command(args):
+    import asyncio
+    overrides = {}
+    if args.daemon_profile:
+        profile = load_profile(args.daemon_profile)
+        if profile is None:
+            return False
+        overrides = profile.get("daemon", {})
+    config = merge_daemon_config(overrides)
+
+    if args.simulate:
+        try:
+            with open(args.simulate, 'r') as f:
+                feed = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler a sequência de pressão '{args.simulate}': {e}")
+            return False
+        for event in simulate_daemon(feed, overrides):
+            changes = ", ".join(f"{param}={value}" for param, value in event["changes"].items())
+            print(f"t={event['time']:>8.1f}s  nível {event['level']:<9} {changes}")
+        return True
+
+    check_root()
+    if args.install_unit:
+        plan = new_plan("daemon_unit")
+        plan_write(plan, os.path.join(SYSTEMD_SYSTEM_DIR, DAEMON_UNIT_NAME), render_daemon_unit(args.daemon_profile))
+        if plan["files"]:
+            plan_command(plan, ["systemctl", "daemon-reload"])
+            plan_command(plan, ["systemctl", "enable", DAEMON_UNIT_NAME])
+            plan_command(plan, ["systemctl", "restart", DAEMON_UNIT_NAME])
+        plan["desired"]["enabled_units"].append(DAEMON_UNIT_NAME)
+        return apply_plan(plan, dry_run=args.dry_run)
+    return asyncio.run(run_daemon(config))
+
+
+# Diretórios amostrados por 'preload --record': programas, bibliotecas e configuração.
+PRELOAD_SCAN_DIRS = ("/usr/bin", "/usr/sbin", "/usr/lib", "/usr/libexec", "/usr/local", "/opt", "/etc")
+PRELOAD_MIN_PERCENT = 50
+# Teto da lista: aquecer mais que isso no boot tiraria do cache o que os programas já usam.
+PRELOAD_MAX_BYTES = 256 * 1024 * 1024
+PRELOAD_WORKERS = 8
+PRELOAD_POLL_INTERVAL = 0.25
+# Tabela para translate(): cada byte do vetor do mincore(2) vira só o seu bit 0.
+MINCORE_RESIDENT_BIT = bytes(value & 1 for value in range(256))
+
+_libc = None
+
+
+def load_libc():
+    """
+    mmap(2), munmap(2) e mincore(2) da libc, via ctypes, carregados só na primeira chamada.
+
+    Returns:
+        ctypes.CDLL: A libc, ou None se não pôde ser carregada.
+    """
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.mmap.restype = ctypes.c_void_p
+            libc.mmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long)
+            libc.munmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+            libc.mincore.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte))
+        except (ImportError, OSError, AttributeError):
+            return None
+        _libc = libc
+    return _libc
+
+
+def file_residency(path):
+    """
+    Páginas de um arquivo presentes no cache de páginas, via mincore(2) sobre um mmap do arquivo.
+    Mapear não lê nada do disco, então a medição não altera o cache. Desde o Linux 5.2 o kernel
+    só informa arquivos que o usuário poderia escrever; para arquivos do sistema, rode como root.
+
+    Returns:
+        tuple: (páginas residentes, total de páginas), ou None se o arquivo não pôde ser medido.
+    """
+    import ctypes
+    import mmap
+    libc = load_libc()
+    if libc is None:
+        return None
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0, 0
+        pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+        address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            vector = (ctypes.c_ubyte * pages)()
+            if libc.mincore(address, size, vector) != 0:
+                return None
+        finally:
+            libc.munmap(address, size)
+        # Só o bit menos significativo de cada byte indica residência; os demais são reservados.
+        return bytes(vector).translate(MINCORE_RESIDENT_BIT).count(1), pages
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def total_file_size(paths):
+    """
+    Soma o tamanho dos arquivos; os que sumiram desde a seleção são ignorados.
+    """
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            continue
+    return total
+
+
+def measure_residency(paths, workers=PRELOAD_WORKERS):
+    """
+    Mede a residência de vários arquivos em paralelo.
+
+    Returns:
+        dict: {caminho: (páginas residentes, total de páginas)}, sem os que não puderam ser medidos.
+    """
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(file_residency, paths))
+    return {path: result for path, result in zip(paths, results) if result is not None}
+
+
+def residency_percent(residency):
+    resident = sum(r for r, _ in residency.values())
+    total = sum(t for _, t in residency.values())
+    return 100.0 * resident / total if total else 0.0
+
+
+def regular_files(directories):
+    """
+    Arquivos regulares não vazios sob os diretórios, sem seguir links nem sair do sistema de arquivos.
+    """
+    paths = []
+    for directory in directories:
+        try:
+            device = os.stat(directory).st_dev
+        except OSError:
+            continue
+        stack = [directory]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.st_dev != device:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and stat.st_size:
+                    paths.append(entry.path)
+    return sorted(paths)
+
+
+def sample_residency(paths, samples=1, interval=5.0, workers=PRELOAD_WORKERS):
+    """
+    Amostra a residência dos arquivos várias vezes e guarda o maior valor de cada um, para
+    capturar o que um programa ou o boot usou ao longo do intervalo, mesmo que saia do cache depois.
+    """
+    best = {}
+    for sample in range(samples):
+        if sample:
+            time.sleep(interval)
+        for path, (resident, total) in measure_residency(paths, workers).items():
+            if resident >= best.get(path, (0, 0))[0]:
+                best[path] = (resident, total)
+    return best
+
+
+def select_preload_files(residency, min_percent=PRELOAD_MIN_PERCENT, max_bytes=PRELOAD_MAX_BYTES):
+    """
+    Escolhe os arquivos a pré-carregar: os que estavam ao menos min_percent no cache, do mais para
+    o menos residente, até somar max_bytes.
+
+    Returns:
+        list: Caminhos escolhidos, na ordem de prioridade.
+    """
+    import mmap
+    candidates = [
+        (resident / total, resident, path) for path, (resident, total) in residency.items()
+        if total and 100.0 * resident / total >= min_percent
+    ]
+    selected = []
+    used = 0
+    for _, _, path in sorted(candidates, key=lambda c: (-c[0], -c[1], c[2])):
+        size = residency[path][1] * mmap.PAGESIZE
+        if used + size > max_bytes:
+            continue
+        selected.append(path)
+        used += size
+    return selected
+
+
+def read_path_list(path):
+    """
+    Lê uma lista de arquivos, um caminho absoluto por linha; linhas vazias e '#' são ignoradas.
+    '-' lê da entrada padrão, para receber a saída de ferramentas como o fatrace ou o strace.
+    """
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    paths = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            paths.append(line)
+    return paths
+
+
+def normalize_preload_paths(paths):
+    """
+    Resolve links e descarta duplicados e o que não for arquivo regular.
+
+    Returns:
+        tuple: (caminhos válidos, quantidade descartada).
+    """
+    seen = []
+    for path in paths:
+        real = os.path.realpath(path)
+        if os.path.isfile(real) and real not in seen:
+            seen.append(real)
+    return seen, len(paths) - len(seen)
+
+
+def render_preload_list(paths):
+    return "\n".join([
+        f"# Gerado pelo GhenoTweaks em {datetime.datetime.now().isoformat(timespec='seconds')}.",
+        "# Arquivos aquecidos no cache de páginas por 'optimizer.py preload'.",
+        *paths,
+        "",
+    ])
+
+
+def warm_file(path):
+    """
+    Pede ao kernel que leia o arquivo inteiro para o cache (posix_fadvise WILLNEED, o mesmo
+    readahead do readahead(2)) e retorna sem esperar a leitura terminar.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+@instrumented("preload")
+def warm_page_cache(paths, workers=PRELOAD_WORKERS, settle=10.0):
+    """
+    Aquece o cache de páginas com os arquivos, em um pool de threads, e mede a residência antes e depois.
+    O WILLNEED só agenda as leituras, então a medição final espera o cache parar de crescer
+    (no máximo 'settle' segundos).
+
+    Returns:
+        dict: Arquivos, bytes, residência antes e depois (%) e duração.
+    """
+    import concurrent.futures
+    import mmap
+    start = time.monotonic()
+    before = measure_residency(paths, workers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        warmed = sum(pool.map(warm_file, paths))
+    after = {}
+    deadline = time.monotonic() + settle
+    while time.monotonic() < deadline:
+        time.sleep(PRELOAD_POLL_INTERVAL)
+        current = measure_residency(paths, workers)
+        if current == after or all(resident == total for resident, total in current.values()):
+            after = current
+            break
+        after = current
+    report = {
+        "files": len(paths),
+        "warmed": warmed,
+        "bytes": sum(total for _, total in after.values()) * mmap.PAGESIZE,
+        "before_percent": round(residency_percent(before), 1),
+        "after_percent": round(residency_percent(after), 1),
+        "duration": round(time.monotonic() - start, 3),
+    }
+    log_event("preload", **report)
+    return report
+
+
+def render_preload_unit(list_path=PRELOAD_LIST):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return "\n".join([
+        "[Unit]",
+        "Description=GhenoTweaks: pré-carregamento do cache de páginas",
+        # Começa logo que os sistemas de arquivos montam, em paralelo com o resto do boot.
+        "DefaultDependencies=no",
+        "After=local-fs.target",
+        f"ConditionPathExists={os.path.abspath(list_path)}",
+        "",
+        "[Service]",
+        "Type=oneshot",
+        f"WorkingDirectory={directory}",
+        f"ExecStart={sys.executable} -m optimizer preload --list {os.path.abspath(list_path)}",
+        "Nice=10",
+        "IOSchedulingClass=best-effort",
+        "IOSchedulingPriority=7",
+        "",
+        "[Install]",
+        "WantedBy=sysinit.target",
+        "",
+    ])
+
+
+def preload_command(args):
+    if load_libc() is None:
+        print("Erro: não foi possível carregar a libc para usar o mincore(2).")
+        return False
+
+    if args.record or args.from_list:
+        if args.from_list:
+            try:
+                paths, dropped = normalize_preload_paths(read_path_list(args.from_list))
+            except OSError as e:
+                print(f"Erro ao ler a lista '{args.from_list}': {e}")
+                return False
+            if dropped:
+                print(f"{dropped} caminho(s) repetido(s), inexistente(s) ou que não são arquivos foram ignorados.")
+        else:
+            directories = args.scan or PRELOAD_SCAN_DIRS
+            print(f"Amostrando o cache de páginas em {', '.join(directories)} ({args.samples} amostra(s))...")
+            residency = sample_residency(regular_files(directories), args.samples, args.interval, args.workers)
+            paths = select_preload_files(residency, args.min_percent, args.max_mb * 1024 * 1024)
+        if not paths:
+            print("Nenhum arquivo a pré-carregar.")
+            return False
+        print(f"{len(paths)} arquivo(s), {format_bytes(total_file_size(paths))}.")
+        if args.dry_run:
+            print("\nModo de simulação: a lista não foi salva.")
+            return True
+        check_root()
+        try:
+            atomic_write(args.list, render_preload_list(paths))
+        except OSError as e:
+            print(f"Erro ao salvar a lista em '{args.list}': {e}")
+            return False
+        print(f"Lista salva em '{args.list}'.")
+        return True
+
+    if args.install_unit:
+        check_root()
+        plan = new_plan("preload_unit")
+        plan_write(plan, os.path.join(SYSTEMD_SYSTEM_DIR, PRELOAD_UNIT_NAME), render_preload_unit(args.list))
+        if plan["files"]:
+            plan_command(plan, ["systemctl", "daemon-reload"])
+            plan_command(plan, ["systemctl", "enable", PRELOAD_UNIT_NAME])
+        plan["desired"]["enabled_units"].append(PRELOAD_UNIT_NAME)
+        return apply_plan(plan, dry_run=args.dry_run)
+
+    try:
+        paths = read_path_list(args.list)
+    except OSError:
+        print(f"Nenhuma lista em '{args.list}'. Grave uma com 'preload --record' ou 'preload --from-list'.")
+        return False
+    if args.dry_run:
+        residency = measure_residency(paths, args.workers)
+        print(f"{len(residency)} arquivo(s) medidos: {residency_percent(residency):.1f}% no cache de páginas.")
+        print("\nModo de simulação: nada foi pré-carregado.")
+        return True
+    report = warm_page_cache(paths, args.workers, args.settle)
+    print(f"{report['warmed']} de {report['files']} arquivo(s) aquecidos ({format_bytes(report['bytes'])}) "
+          f"em {report['duration']:.2f}s.")
+    print(f"Residência no cache de páginas: {report['before_percent']:.1f}% antes, {report['after_percent']:.1f}% depois.")
+    if report["warmed"] < report["files"]:
+        # Arquivos removidos por atualizações não impedem o aquecimento dos demais.
+        print(f"{report['files'] - report['warmed']} arquivo(s) da lista não existem mais; "
+              "grave a lista de novo com 'preload --record'.")
+    return report["warmed"] > 0
+
 
 def show_info_link():
     print("\n--- Saiba mais sobre os termos de otimização ---")
@@ -457,7 +5587,422 @@ def show_info_link():
     print("\nEste link contém explicações detalhadas sobre cada termo, ajudando você a entender melhor sobre cada otimização.")
 
 
-def main():
+def zram_command(args):
+    if args.status:
+        print_zram_stats(read_zram_stats())
+        return True
+    if args.benchmark:
+        results = benchmark_available_zram()
+        if not results:
+            print("Não foi possível testar nenhum algoritmo de compressão.")
+            return False
+        print_zram_benchmark(results)
+        best, reason = choose_zram_algorithm(results)
+        print(f"\nAlgoritmo recomendado: {best['algorithm']} ({reason}).")
+        return True
+
+    if not args.dry_run:
+        check_root()
+    settings = {"algorithm": args.algorithm, "percent": args.percent}
+    if args.priority is not None:
+        settings["priority"] = args.priority
+    if args.writeback_device:
+        settings["writeback_device"] = args.writeback_device
+        settings["writeback_interval"] = args.writeback_interval
+    return apply_plan(build_plan({"zram": settings}, name="zram"), dry_run=args.dry_run)
+
+
+def reclaim_command(args):
+    categories = [key for key, _ in RECLAIM_CATEGORIES]
+    if args.only:
+        categories = [c.strip() for c in args.only.split(",")]
+        unknown = [c for c in categories if c not in dict(RECLAIM_CATEGORIES)]
+        if unknown:
+            print(f"Categorias desconhecidas: {', '.join(unknown)}.")
+            return False
+
+    options = {"journal_max_size": args.journal_size, "journal_max_age": args.journal_age}
+    report = scan_reclaimable(args.reclaim_root, args.workers, **options)
+    print_reclaim_report(report)
+    if args.dry_run:
+        print("\nModo de simulação: nada foi removido.")
+        return True
+    if args.reclaim_root != "/":
+        print("\nA limpeza só pode ser executada no sistema em uso (--root /).")
+        return False
+    check_root()
+    return reclaim_disk_space(categories, report, **options)
+
+
+def block_command(args):
+    devices = scan_block_devices(args.sysfs_root)
+    if not devices:
+        print("Nenhum disco encontrado.")
+        return False
+    print_block_devices(devices)
+    if not args.dry_run:
+        check_root()
+    plan = new_plan("block")
+    plan_block(plan, {"fstrim": not args.no_fstrim}, args.sysfs_root, args.dev_root)
+    return apply_plan(plan, dry_run=args.dry_run)
+
+
+def cpu_command(args):
+    cpus = scan_cpus(args.sysfs_root)
+    if not cpus:
+        print("Nenhuma CPU encontrada.")
+        return False
+    print_cpus(cpus)
+    if not args.cpu_profile:
+        return True
+    if not args.dry_run:
+        check_root()
+    settings = {"profile": args.cpu_profile}
+    for key in ("governor", "epp", "max_cstate_latency"):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    plan = new_plan("cpu")
+    plan_cpu(plan, settings, args.sysfs_root)
+    return apply_plan(plan, dry_run=args.dry_run)
+
+
+def memory_command(args):
+    print_memory_tuning(read_memory_tuning(args.sysfs_root, args.proc_root))
+    settings = {}
+    for key in ("thp", "thp_defrag", "khugepaged_defrag", "ksm_pages_to_scan", "hugepages_percent", "hugepage_size_kb"):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if args.ksm:
+        settings["ksm"] = args.ksm == "on"
+    if not settings:
+        return True
+    if not args.dry_run:
+        check_root()
+    plan = new_plan("memory")
+    plan_memory(plan, settings, args.sysfs_root, args.proc_root)
+    return apply_plan(plan, dry_run=args.dry_run)
+
+
+def network_command(args):
+    print_net_interfaces(read_net_interfaces(args.sysfs_root))
+    settings = {"bbr": not args.no_bbr, "rps": not args.no_rps}
+    for key in ("rtt_ms", "bandwidth_mbps", "somaxconn", "netdev_max_backlog"):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if not args.dry_run and not args.show:
+        check_root()
+    plan = new_plan("network")
+    plan_network(plan, settings, args.sysfs_root, args.proc_root)
+    return apply_plan(plan, dry_run=args.dry_run or args.show)
+
+
+def bench_command(args):
+    if args.compare:
+        return compare_bench_files(*args.compare)
+
+    if args.bench_profile:
+        profile = load_profile(args.bench_profile)
+        if profile is None:
+            return False
+    else:
+        profile = {}
+    try:
+        if args.sysctl:
+            profile.setdefault("sysctl", {}).update(parse_sysctl_assignments(args.sysctl))
+    except ValueError as e:
+        print(f"Erro: {e}")
+        return False
+    if not profile:
+        print("Informe um perfil (--profile) ou ao menos um ajuste (--sysctl), ou use --compare.")
+        return False
+
+    check_root()
+    return run_bench(profile, args.duration, args.interval, args.settle, args.output, args.label)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="GhenoTweaks - Ubuntu: otimizações de desempenho. Sem argumentos, abre o menu interativo."
+    )
+    parser.add_argument(
+        "--profile", metavar="ARQUIVO",
+        help="aplica de forma não interativa um perfil TOML ou JSON em uma única passada",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="apenas mostra o que o perfil alteraria, sem aplicar nada",
+    )
+    parser.add_argument(
+        "--root", metavar="DIR", action="append",
+        help="aplica o perfil a uma imagem montada (rootfs ou chroot) em vez do sistema em execução; "
+             "pode ser repetido para ajustar várias imagens em paralelo",
+    )
+    parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="imagens ajustadas ao mesmo tempo com --root (padrão: uma por CPU)",
+    )
+    parser.add_argument(
+        "--report-dir", metavar="DIR",
+        help="salva o relatório JSON de cada imagem ajustada com --root neste diretório",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    autotune_parser = subparsers.add_parser(
+        "autotune", help="recomenda swappiness e vfs_cache_pressure a partir da carga medida",
+    )
+    autotune_parser.add_argument("--window", type=float, default=60, help="duração da coleta em segundos")
+    autotune_parser.add_argument("--interval", type=float, default=1.0, help="intervalo entre amostras em segundos")
+    autotune_parser.add_argument("--record", metavar="ARQUIVO", help="salva as amostras coletadas em JSON")
+    autotune_parser.add_argument("--replay", metavar="ARQUIVO", help="usa amostras gravadas em vez de coletar")
+    autotune_parser.add_argument("--apply", action="store_true", help="aplica e persiste os valores recomendados")
+
+    boot_parser = subparsers.add_parser(
+        "boot", help="analisa o caminho crítico do boot e sugere unidades a desabilitar",
+    )
+    boot_parser.add_argument("--target", default="graphical.target", help="alvo final do boot")
+    boot_parser.add_argument("--blame", metavar="ARQUIVO", help="saída salva de 'systemd-analyze blame'")
+    boot_parser.add_argument("--chain", metavar="ARQUIVO", help="saída salva de 'systemd-analyze critical-chain'")
+    boot_parser.add_argument("--analyze", metavar="ARQUIVO", help="saída salva de 'systemd-analyze'")
+    boot_parser.add_argument(
+        "--timestamps", metavar="ARQUIVO",
+        help="saída salva de 'systemctl show' com Id, After e os tempos monotônicos das unidades",
+    )
+    boot_parser.add_argument("--top", type=int, default=10, help="quantas unidades listar")
+
+    units_parser = subparsers.add_parser(
+        "units", help="mede o custo real (RAM, CPU, I/O) de cada serviço via cgroup v2",
+    )
+    units_parser.add_argument("--interval", type=float, default=5.0, help="intervalo de medição em segundos")
+    units_parser.add_argument("--sort", choices=sorted(UNIT_COST_SORT_KEYS), default="memory", help="ordenação")
+    units_parser.add_argument("--top", type=int, default=20, help="quantos serviços listar")
+    units_parser.add_argument("--cgroup-root", default=CGROUP_ROOT, help="raiz da hierarquia cgroup v2")
+    units_parser.add_argument("--no-prompt", action="store_true", help="apenas mostra a tabela")
+
+    zram_parser = subparsers.add_parser(
+        "zram", help="testa os algoritmos do zram e configura tamanho, prioridade e writeback",
+    )
+    zram_parser.add_argument("--algorithm", default="auto", help="algoritmo de compressão ou 'auto'")
+    zram_parser.add_argument("--percent", type=int, default=50, help="porcentagem máxima da RAM comprimida")
+    zram_parser.add_argument("--priority", type=int, help="prioridade da swap (padrão: acima da swap em disco)")
+    zram_parser.add_argument("--writeback-device", metavar="DISPOSITIVO", help="dispositivo de writeback")
+    zram_parser.add_argument(
+        "--writeback-interval", default="1h", metavar="INTERVALO",
+        help="intervalo do writeback das páginas ociosas (padrão: 1h)",
+    )
+    zram_parser.add_argument("--benchmark", action="store_true", help="apenas testa os algoritmos")
+    zram_parser.add_argument("--status", action="store_true", help="mostra a compressão e o uso do writeback (bd_stat)")
+
+    block_parser = subparsers.add_parser(
+        "block", help="ajusta scheduler, read_ahead_kb e nr_requests de cada disco e persiste via udev",
+    )
+    block_parser.add_argument("--sysfs-root", default=SYSFS_ROOT, help="raiz do sysfs (para testes)")
+    block_parser.add_argument("--dev-root", default=DEV_ROOT, help="raiz do /dev (para testes)")
+    block_parser.add_argument("--no-fstrim", action="store_true", help="não mexe em discard/fstrim.timer")
+
+    cpu_parser = subparsers.add_parser(
+        "cpu", help="ajusta governor, EPP e C-states de todas as CPUs e persiste via tmpfiles.d",
+    )
+    cpu_parser.add_argument(
+        "cpu_profile", nargs="?", choices=list(CPU_PROFILES), metavar="PERFIL",
+        help=f"perfil a aplicar ({', '.join(CPU_PROFILES)}); sem perfil, apenas mostra o estado atual",
+    )
+    cpu_parser.add_argument("--governor", help="governor a usar no lugar do perfil")
+    cpu_parser.add_argument("--epp", help="energy_performance_preference a usar no lugar do perfil")
+    cpu_parser.add_argument(
+        "--max-cstate-latency", type=int, metavar="US", help="desliga estados de repouso com latência acima deste valor",
+    )
+    cpu_parser.add_argument("--sysfs-root", default=SYSFS_ROOT, help="raiz do sysfs (para testes)")
+
+    memory_parser = subparsers.add_parser(
+        "memory", help="mostra e ajusta THP, KSM e hugepages reservadas (divididas entre os nós NUMA)",
+    )
+    memory_parser.add_argument("--thp", choices=["always", "madvise", "never"], help="modo do THP")
+    memory_parser.add_argument(
+        "--thp-defrag", choices=["always", "defer", "defer+madvise", "madvise", "never"], help="desfragmentação do THP",
+    )
+    memory_parser.add_argument("--khugepaged-defrag", type=int, choices=[0, 1], help="compactação pelo khugepaged")
+    memory_parser.add_argument("--ksm", choices=["on", "off"], help="liga ou desliga o KSM")
+    memory_parser.add_argument("--ksm-pages-to-scan", type=int, help="páginas examinadas pelo KSM a cada ciclo")
+    memory_parser.add_argument("--hugepages-percent", type=float, help="porcentagem da RAM reservada em hugepages")
+    memory_parser.add_argument("--hugepage-size-kb", type=int, help="tamanho da hugepage (padrão: Hugepagesize)")
+    memory_parser.add_argument("--sysfs-root", default=SYSFS_ROOT, help="raiz do sysfs (para testes)")
+    memory_parser.add_argument("--proc-root", default=PROC_ROOT, help="raiz do /proc (para testes)")
+
+    network_parser = subparsers.add_parser(
+        "network", help="dimensiona buffers de socket pelo BDP, ativa BBR/fq e distribui RPS/XPS entre as CPUs",
+    )
+    network_parser.add_argument("--rtt-ms", type=float, help=f"RTT usado no BDP (padrão: {NET_DEFAULTS['rtt_ms']})")
+    network_parser.add_argument("--bandwidth-mbps", type=int, help="banda usada no BDP (padrão: a NIC mais rápida)")
+    network_parser.add_argument("--somaxconn", type=int, help=f"fila de conexões (padrão: {NET_DEFAULTS['somaxconn']})")
+    network_parser.add_argument("--netdev-max-backlog", type=int, help="fila de pacotes (padrão: pela banda)")
+    network_parser.add_argument("--no-bbr", action="store_true", help="não altera o controle de congestionamento")
+    network_parser.add_argument("--no-rps", action="store_true", help="não altera as máscaras de RPS/XPS")
+    network_parser.add_argument("--show", action="store_true", help="apenas mostra as interfaces e os valores calculados")
+    network_parser.add_argument("--sysfs-root", default=SYSFS_ROOT, help="raiz do sysfs (para testes)")
+    network_parser.add_argument("--proc-root", default=PROC_ROOT, help="raiz do /proc (para testes)")
+
+    check_parser = subparsers.add_parser(
+        "check", help="compara o sistema com o último estado aplicado e sai com código 1 se houver desvios",
+    )
+    check_parser.add_argument("--state", default=STATE_FILE, help="arquivo de estado aplicado")
+    check_parser.add_argument("--quiet", action="store_true", help="não imprime nada quando não há desvios")
+    check_parser.add_argument(
+        "--install-timer", metavar="INTERVALO", nargs="?", const="15min",
+        help="instala um timer systemd que executa a verificação periodicamente (padrão: 15min)",
+    )
+
+    reclaim_parser = subparsers.add_parser(
+        "reclaim", help="mede e libera espaço em caches, kernels antigos, journald, snaps e miniaturas",
+    )
+    reclaim_parser.add_argument(
+        "--only", metavar="CATEGORIAS",
+        help=f"categorias separadas por vírgula ({', '.join(key for key, _ in RECLAIM_CATEGORIES)})",
+    )
+    reclaim_parser.add_argument("--journal-size", default=JOURNAL_MAX_SIZE, help="tamanho máximo do journald")
+    reclaim_parser.add_argument("--journal-age", default=JOURNAL_MAX_AGE, help="idade máxima do journald")
+    reclaim_parser.add_argument("--root", dest="reclaim_root", default="/", help="raiz a analisar")
+    reclaim_parser.add_argument("--workers", type=int, default=8, help="threads para medir os tamanhos")
+
+    rollback_parser = subparsers.add_parser(
+        "rollback", help="restaura todos os arquivos alterados por uma execução (padrão: a última)",
+    )
+    rollback_parser.add_argument("run_id", nargs="?", help="identificador da execução")
+    rollback_parser.add_argument("--list", action="store_true", help="lista as execuções com backup")
+
+    compact_parser = subparsers.add_parser("compact", help="remove backups antigos, mantendo os mais recentes")
+    compact_parser.add_argument("--keep", type=int, default=10, help="quantas execuções manter")
+
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="ajusta swappiness, vfs_cache_pressure e watermarks conforme a pressão de memória (PSI)",
+    )
+    daemon_parser.add_argument(
+        "--profile", dest="daemon_profile", metavar="ARQUIVO", help="perfil com a seção [daemon] (limites e níveis)",
+    )
+    daemon_parser.add_argument(
+        "--simulate", metavar="ARQUIVO", help="reproduz a política sobre uma sequência JSON de pressões",
+    )
+    daemon_parser.add_argument("--install-unit", action="store_true", help="instala e inicia o serviço systemd")
+
+    preload_parser = subparsers.add_parser(
+        "preload", help="aquece o cache de páginas com os arquivos que o boot ou um programa usam",
+    )
+    preload_parser.add_argument("--list", default=PRELOAD_LIST, metavar="ARQUIVO", help="lista de arquivos a aquecer")
+    preload_parser.add_argument(
+        "--record", action="store_true", help="grava a lista amostrando o que já está no cache de páginas (mincore)",
+    )
+    preload_parser.add_argument(
+        "--from-list", metavar="ARQUIVO", help="grava a lista a partir de caminhos fornecidos, um por linha ('-' para stdin)",
+    )
+    preload_parser.add_argument(
+        "--scan", action="append", metavar="DIR", help="diretório a amostrar com --record (repetível)",
+    )
+    preload_parser.add_argument("--samples", type=int, default=1, help="amostras com --record")
+    preload_parser.add_argument("--interval", type=float, default=5.0, help="intervalo entre amostras em segundos")
+    preload_parser.add_argument(
+        "--min-percent", type=float, default=PRELOAD_MIN_PERCENT, help="residência mínima para entrar na lista (%%)",
+    )
+    preload_parser.add_argument(
+        "--max-mb", type=int, default=PRELOAD_MAX_BYTES // (1024 * 1024), help="tamanho máximo da lista em MiB",
+    )
+    preload_parser.add_argument("--workers", type=int, default=PRELOAD_WORKERS, help="threads para medir e aquecer")
+    preload_parser.add_argument(
+        "--settle", type=float, default=10.0, help="espera máxima pelas leituras antes de medir o resultado, em segundos",
+    )
+    preload_parser.add_argument("--install-unit", action="store_true", help="instala o serviço que aquece o cache no boot")
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="mede métricas antes e depois de aplicar um perfil ou ajuste",
+    )
+    bench_parser.add_argument("--profile", dest="bench_profile", metavar="ARQUIVO", help="perfil a aplicar")
+    bench_parser.add_argument(
+        "--sysctl", action="append", default=[], metavar="PARAM=VALOR", help="ajuste de sysctl a aplicar (repetível)",
+    )
+    bench_parser.add_argument("--duration", type=float, default=30, help="duração de cada medição em segundos")
+    bench_parser.add_argument("--interval", type=float, default=1.0, help="intervalo entre observações em segundos")
+    bench_parser.add_argument("--settle", type=float, default=5, help="espera após aplicar, em segundos")
+    bench_parser.add_argument("--output", metavar="ARQUIVO", help="arquivo JSON de resultados")
+    bench_parser.add_argument("--label", help="rótulo livre gravado nos resultados")
+    bench_parser.add_argument(
+        "--compare", nargs=2, metavar=("A.json", "B.json"), help="compara dois resultados salvos",
+    )
+    args = parser.parse_args(argv)
+    if args.root and not args.profile:
+        parser.error("--root exige --profile")
+    if args.root and args.command:
+        parser.error(f"o subcomando '{args.command}' não pode ser usado com --root")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.root:
+        if not args.dry_run:
+            check_root()
+        sys.exit(0 if apply_profile_to_roots(
+            args.profile, args.root, dry_run=args.dry_run, jobs=args.jobs, report_dir=args.report_dir,
+        ) else 1)
+
+    if args.profile:
+        if not args.dry_run:
+            check_root()
+        sys.exit(0 if apply_profile(args.profile, dry_run=args.dry_run) else 1)
+
+    if args.command == "autotune":
+        if args.apply:
+            check_root()
+        sys.exit(0 if autotune(args.window, args.interval, args.record, args.replay, args.apply) else 1)
+
+    if args.command == "boot":
+        sys.exit(0 if boot_command(args) else 1)
+
+    if args.command == "units":
+        sys.exit(0 if units_command(args) else 1)
+
+    if args.command == "zram":
+        sys.exit(0 if zram_command(args) else 1)
+
+    if args.command == "check":
+        if args.install_timer:
+            check_root()
+            sys.exit(0 if install_check_timer(args.install_timer) else 1)
+        sys.exit(check_command(args))
+
+    if args.command == "daemon":
+        sys.exit(0 if daemon_command(args) else 1)
+
+    if args.command == "rollback":
+        if args.list:
+            print_backup_runs(list_backup_runs())
+            sys.exit(0)
+        check_root()
+        sys.exit(0 if rollback_run(args.run_id) else 1)
+
+    if args.command == "compact":
+        check_root()
+        sys.exit(0 if compact_backups(args.keep) else 1)
+
+    if args.command == "reclaim":
+        sys.exit(0 if reclaim_command(args) else 1)
+
+    if args.command == "block":
+        sys.exit(0 if block_command(args) else 1)
+
+    if args.command == "cpu":
+        sys.exit(0 if cpu_command(args) else 1)
+
+    if args.command == "memory":
+        sys.exit(0 if memory_command(args) else 1)
+
+    if args.command == "network":
+        sys.exit(0 if network_command(args) else 1)
+
+    if args.command == "preload":
+        sys.exit(0 if preload_command(args) else 1)
+
+    if args.command == "bench":
+        sys.exit(0 if bench_command(args) else 1)
+
     check_root()
     
     os.makedirs(BACKUP_BASE_DIR, exist_ok=True)
@@ -483,6 +6028,14 @@ def main():
             configure_zram()
         elif choice == 8:
             show_info_link()    
+        elif choice == 9:
+            optimize_block_devices()
+        elif choice == 10:
+            optimize_cpu()
+        elif choice == 11:
+            optimize_memory()
+        elif choice == 12:
+            optimize_network()
         elif choice == 0:
             print("Saindo do GhenoTweaks. Obrigado por usar!")
             break